@@ -0,0 +1,97 @@
+#!/usr/bin/env python
+"""Time the import of lsst.faro on top of the LSST stack packages it uses.
+
+Each import is done in a fresh interpreter, ``--repeat`` times, and the
+best time is kept; the overhead of lsst.faro is the difference between the
+time to import the stack packages together with lsst.faro and the time to
+import the stack packages alone.  The results are written as JSON so that
+runs before and after a change can be compared::
+
+    python benchmarks/benchmark_import.py --output before.json
+
+With ``--max-overhead``, the script exits with a non-zero status if the
+overhead exceeds that fraction of the stack import time::
+
+    python benchmarks/benchmark_import.py --max-overhead 0.5
+"""
+import argparse
+import json
+import platform
+import subprocess
+import sys
+import time
+
+# LSST stack packages imported by lsst.faro.
+STACK_MODULES = ['lsst.afw.table', 'lsst.daf.butler', 'lsst.pex.config', 'lsst.pipe.base', 'lsst.verify',
+                 'lsst.verify.tasks']
+
+FARO_MODULES = ['lsst.faro.base', 'lsst.faro.measurement', 'lsst.faro.preparation', 'lsst.faro.scripts']
+
+IMPORT_SCRIPT = """
+import importlib
+import sys
+import time
+start = time.perf_counter()
+for name in sys.argv[1:]:
+    importlib.import_module(name)
+print(time.perf_counter() - start)
+"""
+
+
+def timeImport(modules, repeat):
+    """Return the best time to import modules in a fresh interpreter.
+
+    Parameters
+    ----------
+    modules : `list` [`str`]
+        Names of the modules to import.
+    repeat : `int`
+        Number of fresh interpreters to time the imports in.
+
+    Returns
+    -------
+    times : `list` [`float`]
+        Time taken by the imports in each interpreter [seconds].
+    """
+    times = []
+    for _ in range(repeat):
+        output = subprocess.run([sys.executable, '-c', IMPORT_SCRIPT] + modules, check=True,
+                                stdout=subprocess.PIPE, universal_newlines=True).stdout
+        times.append(float(output))
+    return times
+
+
+def main(output, repeat, maxOverhead=None):
+    stack = timeImport(STACK_MODULES, repeat)
+    faro = timeImport(STACK_MODULES + FARO_MODULES, repeat)
+    overhead = min(faro) - min(stack)
+    fraction = overhead / min(stack)
+    print(f"{'stack':50s} {min(stack)*1e3:10.2f} ms")
+    print(f"{'stack + lsst.faro':50s} {min(faro)*1e3:10.2f} ms")
+    print(f"{'lsst.faro overhead':50s} {overhead*1e3:10.2f} ms {fraction:8.1%}")
+
+    report = {'metadata': {'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+                           'python': sys.version.split()[0],
+                           'platform': platform.platform(),
+                           'repeat': repeat},
+              'benchmarks': {'stack': {'wall_min': min(stack), 'wall': stack},
+                             'faro': {'wall_min': min(faro), 'wall': faro},
+                             'overhead': {'wall': overhead, 'fraction': fraction}}}
+    with open(output, 'w') as fh:
+        json.dump(report, fh, indent=2, sort_keys=True)
+
+    if maxOverhead is not None and fraction > maxOverhead:
+        sys.exit(f"lsst.faro import overhead {fraction:.1%} exceeds {maxOverhead:.1%}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Time the import of lsst.faro.')
+    parser.add_argument('--output', type=str, default='benchmark_import.json',
+                        help='JSON file to write the results to.')
+    parser.add_argument('--repeat', type=int, default=5,
+                        help='Number of fresh interpreters each import is timed in.')
+    parser.add_argument('--max-overhead', type=float, default=None,
+                        help=('Fail if the lsst.faro import overhead exceeds this fraction of the '
+                              'stack import time.'))
+    args = parser.parse_args()
+    main(args.output, args.repeat, args.max_overhead)
@@ -0,0 +1,207 @@
+#!/usr/bin/env python
+"""Time the metric kernels on the catalogs shipped in tests/data.
+
+Each benchmark is run ``--repeat`` times after one untimed warm-up call.
+Wall-clock and CPU times come from `time.perf_counter` and
+`time.process_time`; the peak memory is the peak of the allocations traced
+by `tracemalloc` (which includes numpy arrays but not memory allocated by
+C++ code such as afw tables) during one extra call.  The results are
+written as JSON so that runs before and after a change can be compared::
+
+    python benchmarks/benchmark_metrics.py --output before.json
+
+With ``--synthetic``, the kernels that take a matched catalog are also run on
+synthetic catalogs of the given numbers of objects, to measure how they
+scale::
+
+    python benchmarks/benchmark_metrics.py --synthetic 1000 10000 100000
+"""
+import argparse
+import json
+import os
+import platform
+import resource
+import statistics
+import sys
+import time
+import tracemalloc
+
+import astropy.units as u
+import numpy as np
+
+from lsst.utils import getPackageDir
+from lsst.afw.table import SimpleCatalog, SourceCatalog
+from lsst.afw.image import PhotoCalib
+
+from lsst.faro.utils.filtermatches import filterMatches
+from lsst.faro.utils.phot_repeat import calcPhotRepeat
+from lsst.faro.utils.separations import calcRmsDistances, calcSepOutliers, calcRmsDistancesVsRef
+from lsst.faro.utils.tex import correlation_function_ellipticity_from_matches
+from lsst.faro.utils.stellar_locus import stellarLocusResid
+from lsst.faro.utils.matcher import make_matched_photom
+from lsst.faro.utils.synthetic import makeSyntheticMatchedCatalog
+
+
+DATADIR = os.path.join(getPackageDir('metric_pipeline_tasks'), 'tests', 'data')
+
+# The AM1 annulus and the default magnitude range of the AMx tasks.
+ANNULUS = (5.0 + np.array([-1., 1.])) * u.arcmin
+MAG_RANGE = np.array([17.0, 21.5]) * u.mag
+
+# Benchmarks whose only input is a single-band matched catalog.
+SYNTHETIC_BENCHMARKS = ('filterMatches', 'calcPhotRepeat', 'calcRmsDistances', 'calcSepOutliers',
+                        'correlation_function_ellipticity_from_matches')
+
+
+def loadInputs():
+    """Read the test catalogs and build the inputs of every benchmark."""
+    from astropy.table import Table
+
+    tract = SimpleCatalog.readFits(os.path.join(DATADIR, 'matchedCatalogTract_0_i.fits.gz'))
+    multi = SimpleCatalog.readFits(os.path.join(DATADIR, 'matchedCatalogMulti_0_70.fits.gz'))
+    locus = Table.read(os.path.join(DATADIR, 'tract9813_patches55to72_gri_filtered.fits.gz'))
+
+    filtered = filterMatches(tract)
+    filteredMulti = filterMatches(multi)
+    magKey = filtered.schema.find('slot_PsfFlux_mag').key
+    # As in AB1Task: an r-band reference visit (filt 3), measured in i (filt 4).
+    refVisit = next(visit for objId in filteredMulti.ids
+                    for visit, filt in zip(filteredMulti[objId]['visit'], filteredMulti[objId]['filt'])
+                    if filt == 3)
+
+    # make_matched_photom expects per-band SourceCatalogs and PhotoCalibs; use
+    # the i-band tract catalog as a stand-in for each of g, r and i.
+    sources = SourceCatalog(tract.schema)
+    sources.extend(tract, deep=True)
+    bands = ['g', 'r', 'i']
+
+    return {'tract': tract, 'filtered': filtered, 'filteredMulti': filteredMulti, 'magKey': magKey,
+            'refVisit': refVisit, 'locus': locus,
+            'photomIds': [{'band': band} for band in bands],
+            'photomCatalogs': [sources for band in bands],
+            'photomCalibs': [PhotoCalib(1.0) for band in bands]}
+
+
+def loadSyntheticInputs(nObjects, randomSeed=12345):
+    """Build the inputs of the matched-catalog benchmarks from a synthetic
+    catalog of ``nObjects`` objects.
+    """
+    tract = makeSyntheticMatchedCatalog(nObjects, randomSeed=randomSeed)
+    filtered = filterMatches(tract)
+    return {'tract': tract, 'filtered': filtered, 'magKey': filtered.schema.find('slot_PsfFlux_mag').key}
+
+
+def makeBenchmarks(inputs):
+    """Return the benchmarks as a dict of name: zero-argument callable."""
+    locus = inputs['locus']
+    return {
+        'filterMatches': lambda: filterMatches(inputs['tract']),
+        'calcPhotRepeat': lambda: calcPhotRepeat(inputs['filtered'], inputs['magKey'],
+                                                 numRandomShuffles=50, randomSeed=12345),
+        'calcPhotRepeat_spawn': lambda: calcPhotRepeat(inputs['filtered'], inputs['magKey'],
+                                                       numRandomShuffles=50, randomSeed=12345,
+                                                       randomStreams='spawn'),
+        'calcRmsDistances': lambda: calcRmsDistances(inputs['filtered'], ANNULUS, magRange=MAG_RANGE),
+        'calcRmsDistances_sampled': lambda: calcRmsDistances(inputs['filtered'], ANNULUS, magRange=MAG_RANGE,
+                                                             maxPairs=1000,
+                                                             rng=np.random.default_rng(12345)),
+        'calcSepOutliers': lambda: calcSepOutliers(inputs['filtered'], ANNULUS, magRange=MAG_RANGE),
+        'calcRmsDistancesVsRef': lambda: calcRmsDistancesVsRef(inputs['filteredMulti'], inputs['refVisit'],
+                                                               MAG_RANGE, band=4),
+        'correlation_function_ellipticity_from_matches':
+            lambda: correlation_function_ellipticity_from_matches(inputs['filtered']),
+        'stellarLocusResid': lambda: stellarLocusResid(np.asarray(locus['base_PsfFlux_mag_g']),
+                                                       np.asarray(locus['base_PsfFlux_mag_r']),
+                                                       np.asarray(locus['base_PsfFlux_mag_i'])),
+        'make_matched_photom': lambda: make_matched_photom(inputs['photomIds'], inputs['photomCatalogs'],
+                                                           inputs['photomCalibs']),
+    }
+
+
+def runBenchmark(func, repeat):
+    """Time one benchmark.
+
+    Parameters
+    ----------
+    func : callable
+        Zero-argument function to time.
+    repeat : `int`
+        Number of timed calls.
+
+    Returns
+    -------
+    result : `dict`
+        Minimum, median and per-call wall-clock times and the median CPU time
+        [s], and the peak traced memory of one call [bytes].
+    """
+    func()
+    wall = []
+    cpu = []
+    for i in range(repeat):
+        cpuStart = time.process_time()
+        start = time.perf_counter()
+        func()
+        wall.append(time.perf_counter() - start)
+        cpu.append(time.process_time() - cpuStart)
+
+    tracemalloc.start()
+    try:
+        func()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return {'wall_min': min(wall), 'wall_median': statistics.median(wall), 'wall': wall,
+            'cpu_median': statistics.median(cpu), 'peak_traced_bytes': peak}
+
+
+def main(output, repeat, select=None, synthetic=()):
+    start = time.perf_counter()
+    inputs = loadInputs()
+    loadTime = time.perf_counter() - start
+
+    results = {}
+    for name, func in makeBenchmarks(inputs).items():
+        if select and not any(pattern in name for pattern in select):
+            continue
+        results[name] = runBenchmark(func, repeat)
+        print(f"{name:50s} {results[name]['wall_median']*1e3:10.2f} ms "
+              f"{results[name]['peak_traced_bytes']/2**20:8.1f} MiB")
+
+    for nObjects in synthetic:
+        syntheticInputs = loadSyntheticInputs(nObjects)
+        benchmarks = makeBenchmarks(syntheticInputs)
+        for name in SYNTHETIC_BENCHMARKS:
+            if select and not any(pattern in name for pattern in select):
+                continue
+            key = f'{name}[{nObjects}]'
+            results[key] = runBenchmark(benchmarks[name], repeat)
+            results[key]['rows'] = len(syntheticInputs['tract'])
+            print(f"{key:50s} {results[key]['wall_median']*1e3:10.2f} ms "
+                  f"{results[key]['peak_traced_bytes']/2**20:8.1f} MiB")
+
+    report = {'metadata': {'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+                           'python': sys.version.split()[0],
+                           'numpy': np.__version__,
+                           'platform': platform.platform(),
+                           'repeat': repeat,
+                           'load_seconds': loadTime,
+                           'maxrss_kb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss},
+              'benchmarks': results}
+    with open(output, 'w') as fh:
+        json.dump(report, fh, indent=2, sort_keys=True)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Time the metric kernels on the test catalogs.')
+    parser.add_argument('--output', type=str, default='benchmark_metrics.json',
+                        help='JSON file to write the results to.')
+    parser.add_argument('--repeat', type=int, default=5,
+                        help='Number of timed calls of each benchmark.')
+    parser.add_argument('--select', type=str, nargs='*', default=None,
+                        help='Only run benchmarks whose name contains one of these strings.')
+    parser.add_argument('--synthetic', type=int, nargs='*', default=(),
+                        help=('Also run the matched-catalog benchmarks on synthetic catalogs '
+                              'with these numbers of objects.'))
+    args = parser.parse_args()
+    main(args.output, args.repeat, args.select, args.synthetic)
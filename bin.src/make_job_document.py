@@ -1,20 +1,41 @@
 #!/usr/bin/env python
 import argparse
+import gzip
 import time
 import json
 
-from metric_pipeline_scripts import JobReporter
+from lsst.faro.scripts import JobReporter
 
 
-def main(repository, collection, metrics_package, spec, dataset_name):
-    jr = JobReporter(repository, collection, metrics_package, spec, dataset_name)
-    jobs = jr.run()
-    if len(jobs) == 0:
+def open_output(filename, use_gzip):
+    if use_gzip:
+        return gzip.open(filename, 'wt')
+    return open(filename, 'w')
+
+
+def main(repository, collection, metrics_package, spec, dataset_name, max_workers=1,
+         compact=False, use_gzip=False, ndjson=None):
+    jr = JobReporter(repository, collection, metrics_package, spec, dataset_name, max_workers=max_workers)
+    # Jobs are written as soon as they are assembled, so only one is held
+    # in memory at a time.
+    dump_args = {'separators': (',', ':')} if compact else {'indent': 2}
+    suffix = '.json.gz' if use_gzip else '.json'
+    n_jobs = 0
+    if ndjson is not None:
+        # One job per line, in a single file that can be read as a stream.
+        with open_output(ndjson, use_gzip or ndjson.endswith('.gz')) as fh:
+            for k, v in jr.run_iter():
+                json.dump(v.json, fh, sort_keys=True, separators=(',', ':'))
+                fh.write('\n')
+                n_jobs += 1
+    else:
+        for k, v in jr.run_iter():
+            filename = f"{metrics_package}_{spec}_{k}_{time.time()}{suffix}"
+            with open_output(filename, use_gzip) as fh:
+                json.dump(v.json, fh, sort_keys=True, **dump_args)
+            n_jobs += 1
+    if n_jobs == 0:
         raise RuntimeError('Job reporter returned no jobs.')
-    for k, v in jobs.items():
-        filename = f"{metrics_package}_{spec}_{k}_{time.time()}.json"
-        with open(filename, 'w') as fh:
-            json.dump(v.json, fh, indent=2, sort_keys=True)
 
 
 if __name__ == "__main__":
@@ -30,6 +51,16 @@ if __name__ == "__main__":
                         help='Spec level to apply: minimum, design, or stretch')
     parser.add_argument('--dataset_name', type=str, default="validation_data_hsc",
                         help='Name of the dataset for which the report is being generated.')
+    parser.add_argument('--max_workers', type=int, default=1,
+                        help='Number of threads used to read measurements from the repository.')
+    parser.add_argument('--compact', action='store_true',
+                        help='Write compact JSON without indentation.')
+    parser.add_argument('--gzip', action='store_true',
+                        help='Compress the output with gzip.')
+    parser.add_argument('--ndjson', type=str, default=None,
+                        help=('Write all jobs to this single newline-delimited JSON file, '
+                              'one job per line, instead of one file per job.'))
 
     args = parser.parse_args()
-    main(args.repository, args.collection, args.metrics_package, args.spec, args.dataset_name)
+    main(args.repository, args.collection, args.metrics_package, args.spec, args.dataset_name,
+         max_workers=args.max_workers, compact=args.compact, use_gzip=args.gzip, ndjson=args.ndjson)
@@ -1,14 +1,16 @@
 import astropy.units as u
 import numpy as np
 from lsst.pipe.base import Struct, Task
-from lsst.pex.config import Config, Field
-from lsst.verify import Measurement
+from lsst.pex.config import Config, Field, ListField
+from lsst.verify import Measurement, Datum
 
 
 class NumSourcesTask(Task):
 
     ConfigClass = Config
     _DefaultName = "numSourcesTask"
+    # Only the number of rows is needed, not the catalog contents.
+    requiredColumns = ()
 
     def run(self, catalog, metric_name, vIds=None):
         self.log.info(f"Measuring {metric_name}")
@@ -20,6 +22,10 @@ class NumSourcesTask(Task):
 class NumpyAggTaskConfig(Config):
     summary = Field(dtype=str, default="median",
                     doc="Aggregation to use for summary metrics")
+    extraStats = ListField(dtype=str, default=[],
+                           doc="Additional statistics to compute from the same input values and "
+                               "store in the measurement extras.  Each entry is the name of a numpy "
+                               "reduction (e.g. 'mean', 'std') or 'pNN' for the NN-th percentile.")
 
 
 class NumpyAggTask(Task):
@@ -33,6 +39,7 @@ class NumpyAggTask(Task):
             agg = self.config.summary
         self.log.info(f"Computing the {agg} of {package}_{metric} values")
 
+        extras = None
         if len(measurements) == 0:
             self.log.info('Recieved zero length measurments list.  Returning NaN.')
             # In the case of an empty list, there is nothing we can do other than
@@ -40,9 +47,63 @@ class NumpyAggTask(Task):
             value = u.Quantity(np.nan)
         else:
             unit = measurements[0].quantity.unit
-            value = getattr(np, agg)(u.Quantity([x.quantity for x in measurements
-                                                 if np.isfinite(x.quantity)]))
+            values = self.extractValues(measurements, unit)
+            value = getattr(np, agg)(values)
             # Make sure return has same unit as inputs
-            # In some cases numpy can return a NaN and the unit gets dropped
-            value = value.value*unit
-        return Struct(measurement=Measurement(f"metricvalue_{agg_name.lower()}_{package}_{metric}", value))
+            value = value*unit
+            if self.config.extraStats:
+                extras = self.computeExtraStats(values, unit)
+        return Struct(measurement=Measurement(f"metricvalue_{agg_name.lower()}_{package}_{metric}", value,
+                                              extras=extras))
+
+    @staticmethod
+    def extractValues(measurements, unit):
+        """Extract the finite measurement values as a plain float array.
+
+        Parameters
+        ----------
+        measurements : `list` of `lsst.verify.Measurement`
+            Measurements to aggregate.
+        unit : `astropy.units.Unit`
+            Unit of the returned values.  Measurements in this unit are read
+            directly; any others are converted.
+
+        Returns
+        -------
+        values : `numpy.ndarray` of `float`
+            Finite measurement values, in ``unit``.
+        """
+        values = np.empty(len(measurements), dtype=float)
+        for i, m in enumerate(measurements):
+            quantity = m.quantity
+            values[i] = quantity.value if quantity.unit == unit else quantity.to_value(unit)
+        return values[np.isfinite(values)]
+
+    def computeExtraStats(self, values, unit):
+        """Compute the statistics listed in ``config.extraStats``.
+
+        Parameters
+        ----------
+        values : `numpy.ndarray` of `float`
+            Finite measurement values.
+        unit : `astropy.units.Unit`
+            Unit of ``values``.
+
+        Returns
+        -------
+        extras : `dict` [`str`, `lsst.verify.Datum`]
+            One entry per requested statistic.
+        """
+        extras = {}
+        percentiles = [stat for stat in self.config.extraStats if stat.startswith('p') and stat[1:].isdigit()]
+        if percentiles:
+            # All percentiles come from a single partition of the data.
+            results = np.percentile(values, [float(stat[1:]) for stat in percentiles]) if len(values) \
+                else np.full(len(percentiles), np.nan)
+            for stat, result in zip(percentiles, results):
+                extras[stat] = Datum(result*unit, label=stat, description=f'{stat[1:]}th percentile')
+        quantity = u.Quantity(values, unit, copy=False)
+        for stat in self.config.extraStats:
+            if stat not in percentiles:
+                extras[stat] = Datum(getattr(np, stat)(quantity), label=stat, description=stat)
+        return extras
@@ -1,8 +1,16 @@
-from lsst.verify.tasks import MetricTask, MetricConfig, MetricConnections
+import os
+import traceback
+
+import astropy.units as u
+import numpy as np
+from lsst.verify import Measurement, Datum
+from lsst.verify.tasks import MetricTask, MetricConfig, MetricConnections, MetricComputationError
 import lsst.pipe.base as pipeBase
 import lsst.pex.config as pexConfig
 
 from .BaseSubTasks import NumpyAggTask
+from lsst.faro.utils.agg_state import (aggStateStatistics, makeAggState, updateAggState,
+                                       aggStateSummary, readAggState, writeAggState)
 
 
 # Dimentions of the Connections class define the iterations of runQuantum
@@ -26,6 +34,30 @@ class CatalogAggregationBaseTaskConfig(MetricConfig,
         # definition in most cases.
         target=NumpyAggTask,
         doc="Numpy aggregation task")
+    doIncremental = pexConfig.Field(
+        dtype=bool, default=False,
+        doc="Keep a running aggregation state per output data ID in stateDir and fold in only "
+            "the input measurements not seen by a previous invocation, instead of reloading "
+            "every input.  The summary is computed from the state rather than by the agg subtask, "
+            "so agg must be a NumpyAggTask without extraStats; a median is a t-digest estimate, "
+            "also stored in the approximate_median extra.")
+    stateDir = pexConfig.Field(
+        dtype=str, optional=True, default=None,
+        doc="Directory holding the incremental aggregation state files; required if doIncremental.")
+
+    def validate(self):
+        super().validate()
+        if self.doIncremental:
+            if not self.stateDir:
+                raise ValueError("stateDir must be set when doIncremental is True.")
+            if self.agg.target is not NumpyAggTask or self.agg.extraStats:
+                raise ValueError("doIncremental requires agg to be a NumpyAggTask without extraStats.")
+            agg = self.connections.agg_name.lower()
+            if agg == "summary":
+                agg = self.agg.summary
+            if agg not in aggStateStatistics:
+                raise ValueError(f"Aggregation {agg} is not supported with doIncremental; "
+                                 f"use one of {', '.join(aggStateStatistics)}.")
 
 
 class CatalogsAggregationBaseTask(MetricTask):
@@ -40,3 +72,110 @@ class CatalogsAggregationBaseTask(MetricTask):
     def run(self, measurements):
         return self.agg.run(measurements, self.config.connections.agg_name, self.config.connections.package,
                             self.config.connections.metric)
+
+    def runQuantum(self, butlerQC, inputRefs, outputRefs):
+        if not self.config.doIncremental:
+            return super().runQuantum(butlerQC, inputRefs, outputRefs)
+
+        try:
+            filename = self.stateFilename(outputRefs.measurement)
+            state = readAggState(filename)
+            keys = {self.refKey(ref) for ref in inputRefs.measurements}
+            if state is not None and not set(state['seen']) <= keys:
+                # Some folded-in measurements are no longer inputs, e.g. they
+                # were reprocessed; their values cannot be removed from the
+                # state.
+                self.log.warning(f"Aggregation state {filename} includes measurements that are not "
+                                 "inputs of this quantum; rebuilding it from all inputs.")
+                state = None
+            seen = set() if state is None else set(state['seen'])
+            newRefs = [ref for ref in inputRefs.measurements if self.refKey(ref) not in seen]
+            self.log.info(f"Folding {len(newRefs)} new of {len(inputRefs.measurements)} "
+                          "measurements into the aggregation state")
+            measurements = [butlerQC.get(ref) for ref in newRefs]
+            outputs = self.runIncremental(measurements, [self.refKey(ref) for ref in newRefs], state)
+            butlerQC.put(pipeBase.Struct(measurement=outputs.measurement), outputRefs)
+            # Only once the measurement is written, so that a failed quantum
+            # does not leave its inputs marked as seen.
+            if outputs.state is not None:
+                writeAggState(outputs.state, filename)
+        except MetricComputationError:
+            self.log.errorf(
+                "Measurement of {!r} failed on {}->{}\n{}",
+                self, inputRefs, outputRefs, traceback.format_exc())
+
+    def runIncremental(self, measurements, keys, state=None):
+        """Fold new measurements into an aggregation state and summarize it.
+
+        Parameters
+        ----------
+        measurements : `list` of `lsst.verify.Measurement`
+            Measurements not yet folded into ``state``.
+        keys : `list` of `str`
+            Identifiers of ``measurements``.
+        state : `dict`, optional
+            Aggregation state from a previous invocation; see
+            `lsst.faro.utils.agg_state`.
+
+        Returns
+        -------
+        result : `lsst.pipe.base.Struct`
+            A `~lsst.pipe.base.Struct` containing the following attributes:
+
+            - ``measurement``: the aggregated measurement.
+            - ``state``: the updated state; None if there is neither a
+              previous state nor new measurements, as the unit of the
+              state is taken from the first measurement.
+        """
+        connections = self.config.connections
+        agg = connections.agg_name.lower()
+        if agg == "summary":
+            agg = self.agg.config.summary
+        name = f"metricvalue_{connections.agg_name.lower()}_{connections.package}_{connections.metric}"
+
+        if state is None and not measurements:
+            # Nothing to take the unit from; wait for the first measurement
+            # before creating a state.
+            value = (0. if agg == 'count' else np.nan)*u.dimensionless_unscaled
+            extras = {'count': Datum(0*u.count, label='count', description='number of aggregated values')}
+            return pipeBase.Struct(measurement=Measurement(name, value, extras=extras), state=None)
+        if state is None:
+            state = makeAggState(measurements[0].quantity.unit.to_string())
+        unit = u.Unit(state['unit'])
+        values = NumpyAggTask.extractValues(measurements, unit)
+        state = updateAggState(state, keys, values)
+
+        value = aggStateSummary(state, agg)*(u.count if agg == 'count' else unit)
+        extras = {'count': Datum(state['count']*u.count, label='count',
+                                 description='number of aggregated values')}
+        if agg == 'median':
+            extras['approximate_median'] = Datum(value, label='approximate_median',
+                                                 description='t-digest estimate of the median, '
+                                                             'which is the measurement value')
+        return pipeBase.Struct(measurement=Measurement(name, value, extras=extras), state=state)
+
+    def stateFilename(self, ref):
+        """Return the name of the aggregation state file for an output.
+
+        Parameters
+        ----------
+        ref : `lsst.daf.butler.DatasetRef`
+            Reference to the output measurement.  The state is specific to
+            its data ID but not to its run, so that it is reused by
+            invocations into new runs, e.g. with ``--replace-run``; inputs
+            that are no longer part of the quantum cause it to be rebuilt.
+        """
+        connections = self.config.connections
+        dataIdString = '_'.join(f'{key}{value}' for key, value in sorted(ref.dataId.byName().items()))
+        return os.path.join(self.config.stateDir,
+                            f'{connections.agg_name}_{connections.package}_{connections.metric}_'
+                            f'{dataIdString}.json')
+
+    @staticmethod
+    def refKey(ref):
+        """Return the key identifying an input measurement in the state.
+
+        Inputs are identified by dataset ID, so a reprocessed measurement is
+        a new input even if its data ID was already folded in.
+        """
+        return str(ref.id)
@@ -1,7 +1,14 @@
+import traceback
+
 import lsst.pex.config as pexConfig
-from lsst.verify.tasks import MetricTask, MetricConfig, MetricConnections
+import lsst.pipe.base as pipeBase
+from lsst.verify.tasks import MetricTask, MetricConfig, MetricConnections, MetricComputationError
 
 from .BaseSubTasks import NumSourcesTask
+from lsst.faro.utils.catalog_view import RowCountCatalog, readRowCount, readCatalog
+from lsst.faro.utils.instrumentation import StageTimer
+from lsst.faro.utils.result_cache import (codeVersion, configDigest, datasetDigest, makeResultCacheKey,
+                                          readCachedResult, writeCachedResult)
 
 
 class CatalogAnalysisBaseTaskConfig(MetricConfig,
@@ -13,16 +20,201 @@ class CatalogAnalysisBaseTaskConfig(MetricConfig,
         # definition in most cases.
         target=NumSourcesTask,
         doc="Measure task")
+    doInstrument = pexConfig.Field(
+        doc="Record the wall time, CPU time, peak RSS growth and row counts of each stage "
+            "(reading, and the stages of the measure task) in the task metadata.",
+        dtype=bool, default=False)
+    doInstrumentExtras = pexConfig.Field(
+        doc="Also attach the stage records to the measurement extras; requires doInstrument.",
+        dtype=bool, default=False)
+    resultCacheDir = pexConfig.Field(
+        doc="Directory of a local cache of measurements, keyed by the contents of the input "
+            "datasets, the task and measure task configs and the package code.  A cached measurement is "
+            "written out without reading the input catalogs.  No caching if not set.",
+        dtype=str, optional=True, default=None)
 
 
 class CatalogAnalysisBaseTask(MetricTask):
 
     ConfigClass = CatalogAnalysisBaseTaskConfig
     _DefaultName = "catalogAnalysisBaseTask"
+    # Name of the deferred catalog input read with loadCatalog.
+    catalogConnection = 'cat'
+    # Config fields that do not affect the measurement, left out of the
+    # result cache key.
+    resultCacheIgnoredFields = ('doInstrument', 'doInstrumentExtras', 'resultCacheDir')
 
     def __init__(self, config, *args, **kwargs):
         super().__init__(*args, config=config, **kwargs)
         self.makeSubtask('measure')
+        # Shared with the measure task, which records its own stages.
+        self.timer = StageTimer(enabled=self.config.doInstrument)
+        self.measure.timer = self.timer
 
     def run(self, cat):
         return self.measure.run(cat, self.config.connections.metric)
+
+    def runQuantum(self, butlerQC, inputRefs, outputRefs):
+        """Do Butler I/O to provide in-memory objects for run.
+
+        The input named by ``catalogConnection`` is deferred and loaded with
+        `loadCatalog`, so only the columns the measure task needs are kept in
+        memory.  Subclasses add the data ID arguments of their ``run`` with
+        `getDataIdInputs`.
+        """
+        self.timer.reset()
+        try:
+            inputs = butlerQC.get(inputRefs)
+            cacheKey = self.resultCacheKey(inputRefs, inputs, outputRefs)
+            if self.putCachedResult(cacheKey, butlerQC, outputRefs):
+                return
+            with self.timer.stage('read') as stage:
+                inputs[self.catalogConnection] = self.loadCatalog(inputs[self.catalogConnection])
+                rows = self.countRows(inputs[self.catalogConnection])
+                if rows is not None:
+                    stage['rows'] = rows
+            inputs.update(self.getDataIdInputs(butlerQC, inputRefs, outputRefs))
+            with self.timer.stage('measure'):
+                outputs = self.run(**inputs)
+            # Before the stage extras are added, so that a cached measurement
+            # does not carry the timings of the run that produced it.
+            self.cacheResult(cacheKey, outputs.measurement)
+            self.recordStages(outputs.measurement)
+            if outputs.measurement is not None:
+                butlerQC.put(outputs, outputRefs)
+            else:
+                self.log.debugf("Skipping measurement of {!r} on {} "
+                                "as not applicable.", self, inputRefs)
+        except MetricComputationError:
+            self.log.errorf(
+                "Measurement of {!r} failed on {}->{}\n{}",
+                self, inputRefs, outputRefs, traceback.format_exc())
+
+    def getDataIdInputs(self, butlerQC, inputRefs, outputRefs):
+        """Return the data ID arguments of ``run``.
+
+        Returns
+        -------
+        inputs : `dict`
+            Arguments of ``run`` in addition to the input datasets; none by
+            default.
+        """
+        return {}
+
+    def loadCatalog(self, handle):
+        """Load an input catalog, reading only what the measure task needs.
+
+        Measure tasks may set a ``requiredColumns`` class attribute: `None`
+        (the default) means the full catalog is needed, an empty tuple means
+        only the number of rows is needed, in which case only the catalog
+        header is read, and otherwise the catalog is read with only the
+        listed columns where that saves memory (see
+        `lsst.faro.utils.catalog_view.readCatalog`).
+        Measure tasks with a true ``readsCatalogs`` attribute are given the
+        deferred handles, and read the catalogs themselves.
+
+        Parameters
+        ----------
+        handle : `lsst.daf.butler.DeferredDatasetHandle` or `list`
+            Handle to the catalog, or a list of handles.
+
+        Returns
+        -------
+        catalog : `lsst.afw.table.BaseCatalog`, `RowCountCatalog` or `list`
+            The catalog, or a stand-in supporting only ``len``; a list if
+            ``handle`` is a list.
+        """
+        if getattr(self.measure, 'readsCatalogs', False):
+            return handle
+        if isinstance(handle, (list, tuple)):
+            return [self.loadCatalog(h) for h in handle]
+        columns = getattr(self.measure, 'requiredColumns', None)
+        if columns is not None and len(columns) == 0:
+            return RowCountCatalog(readRowCount(handle))
+        return readCatalog(handle, columns)
+
+    def recordStages(self, measurement):
+        """Write the stages recorded by ``self.timer`` to the task metadata
+        and, if ``doInstrumentExtras``, to the measurement extras.
+        """
+        if not self.timer.enabled:
+            return
+        self.timer.toMetadata(self.metadata)
+        if self.config.doInstrumentExtras and measurement is not None:
+            for name, datum in self.timer.toExtras().items():
+                measurement.extras[name] = datum
+
+    @staticmethod
+    def countRows(cat):
+        """Return the number of rows of a catalog or list of catalogs; `None`
+        for catalogs that are not read yet.
+        """
+        if isinstance(cat, (list, tuple)):
+            counts = [CatalogAnalysisBaseTask.countRows(c) for c in cat]
+            return None if None in counts else sum(counts)
+        if hasattr(cat, 'ref'):
+            # A deferred handle.
+            return None
+        return len(cat)
+
+    def resultCacheKey(self, inputRefs, inputs, outputRefs):
+        """Return the key of the measurement in the result cache.
+
+        Parameters
+        ----------
+        inputRefs : `lsst.pipe.base.InputQuantizedConnection`
+            References to the inputs.
+        inputs : `dict`
+            Inputs from ``butlerQC.get(inputRefs)``; catalogs are still
+            deferred.  Every input is identified by the digest of its file,
+            found through the butler of the deferred handles.
+        outputRefs : `lsst.pipe.base.OutputQuantizedConnection`
+            References to the outputs.
+
+        Returns
+        -------
+        key : `str` or `None`
+            The key, or `None` if ``resultCacheDir`` is not set.  The config
+            fields listed in ``resultCacheIgnoredFields`` are not part of it.
+        """
+        if not self.config.resultCacheDir:
+            return None
+        connections = self.config.connections
+        taskConfig = {name: value for name, value in self.config.toDict().items()
+                      if name not in self.resultCacheIgnoredFields + ('measure',)}
+        parts = [type(self).__name__, codeVersion(), configDigest(self.config.measure),
+                 repr(sorted(taskConfig.items())),
+                 connections.package, connections.metric, str(outputRefs.measurement.dataId)]
+        handles = [value for values in inputs.values()
+                   for value in (values if isinstance(values, (list, tuple)) else [values])
+                   if hasattr(value, 'ref')]
+        butler = handles[0].butler if handles else None
+        for name in sorted(inputs):
+            refs = getattr(inputRefs, name)
+            if not isinstance(refs, (list, tuple)):
+                refs = [refs]
+            for ref in refs:
+                parts.append(f'{name}:{datasetDigest(ref, butler)}')
+        return makeResultCacheKey(*parts)
+
+    def putCachedResult(self, cacheKey, butlerQC, outputRefs):
+        """Write out the cached measurement for a key, if there is one.
+
+        Returns
+        -------
+        found : `bool`
+            `True` if a cached measurement was written out.
+        """
+        if cacheKey is None:
+            return False
+        measurement = readCachedResult(self.config.resultCacheDir, cacheKey)
+        if measurement is None:
+            return False
+        self.log.info(f"Using cached measurement {cacheKey}")
+        butlerQC.put(pipeBase.Struct(measurement=measurement), outputRefs)
+        return True
+
+    def cacheResult(self, cacheKey, measurement):
+        """Store a measurement in the result cache."""
+        if cacheKey is not None and measurement is not None:
+            writeCachedResult(self.config.resultCacheDir, cacheKey, measurement)
@@ -3,6 +3,7 @@ import lsst.pex.config as pexConfig
 import lsst.geom as geom
 
 from lsst.faro.utils.matcher import match_catalogs
+from lsst.faro.utils.instrumentation import StageTimer
 
 
 # The first thing to do is to define a Connections class. This will define all
@@ -44,6 +45,9 @@ class MatchedBaseTaskConfig(pipeBase.PipelineTaskConfig,
     match_radius = pexConfig.Field(doc="Match radius in arcseconds.", dtype=float, default=1)
     apply_external_wcs = pexConfig.Field(doc="Apply correction to coordinates with e.g. a jointcal WCS.",
                                          dtype=bool, default=False)
+    doInstrument = pexConfig.Field(doc="Record the wall time, CPU time, peak RSS growth and row counts "
+                                       "of reading, matching and trimming in the task metadata.",
+                                   dtype=bool, default=False)
 
 
 class MatchedBaseTask(pipeBase.PipelineTask):
@@ -55,18 +59,21 @@ class MatchedBaseTask(pipeBase.PipelineTask):
         super().__init__(*args, config=config, **kwargs)
         self.radius = self.config.match_radius
         self.level = "patch"
+        self.timer = StageTimer(enabled=self.config.doInstrument)
 
     def run(self, source_catalogs, photo_calibs, astrom_calibs, vIds, wcs, box, apply_external_wcs):
         self.log.info("Running catalog matching")
         radius = geom.Angle(self.radius, geom.arcseconds)
-        srcvis, matched = match_catalogs(source_catalogs, photo_calibs, astrom_calibs, vIds, radius,
-                                         apply_external_wcs, logger=self.log)
+        with self.timer.stage('match', rows=sum(len(cat) for cat in source_catalogs)):
+            srcvis, matched = match_catalogs(source_catalogs, photo_calibs, astrom_calibs, vIds, radius,
+                                             apply_external_wcs, logger=self.log)
         # Trim the output to the patch bounding box
         out_matched = type(matched)(matched.schema)
         self.log.info(f"{len(matched)} sources in matched catalog.")
-        for record in matched:
-            if box.contains(wcs.skyToPixel(record.getCoord())):
-                out_matched.append(record)
+        with self.timer.stage('trim', rows=len(matched)):
+            for record in matched:
+                if box.contains(wcs.skyToPixel(record.getCoord())):
+                    out_matched.append(record)
         self.log.info(f"{len(out_matched)} sources when trimmed to {self.level} boundaries.")
         return pipeBase.Struct(outputCatalog=out_matched)
 
@@ -81,7 +88,9 @@ class MatchedBaseTask(pipeBase.PipelineTask):
     def runQuantum(self, butlerQC,
                    inputRefs,
                    outputRefs):
-        inputs = butlerQC.get(inputRefs)
+        self.timer.reset()
+        with self.timer.stage('read', catalogs=len(inputRefs.source_catalogs)):
+            inputs = butlerQC.get(inputRefs)
         oid = outputRefs.outputCatalog.dataId.byName()
         skymap = inputs['skyMap']
         del inputs['skyMap']
@@ -97,6 +106,7 @@ class MatchedBaseTask(pipeBase.PipelineTask):
         if not inputs['astrom_calibs']:  # Fill with None if jointcal wcs doesn't exist
             inputs['astrom_calibs'] = [None for el in inputs['photo_calibs']]
         outputs = self.run(**inputs)
+        self.timer.toMetadata(self.metadata)
         butlerQC.put(outputs, outputRefs)
 
 
@@ -1,29 +1,190 @@
+import astropy.units as u
 import numpy as np
 from lsst.pipe.base import Struct, Task
-from lsst.pex.config import Config
-from lsst.verify import Measurement
+from lsst.pex.config import Config, Field, ListField
+from lsst.verify import Measurement, Datum
+from lsst.faro.utils.quantile_sketch import (makeTDigest, mergeTDigests, tdigestQuantile,
+                                             tdigestToExtras, tdigestFromExtras)
+
+
+class HistMedianTaskConfig(Config):
+    quantile = Field(doc="Quantile of the merged histogram to report, between 0 and 1.",
+                     dtype=float, default=0.5)
+    extraQuantiles = ListField(doc="Additional quantiles to compute from the merged histogram and "
+                                   "store in the measurement extras.",
+                               dtype=float, default=[])
 
 
 class HistMedianTask(Task):
+    """Aggregate histograms from measurement extras and report quantiles.
 
-    ConfigClass = Config
+    Each input measurement carries a histogram in its ``values`` and ``bins``
+    extras.  Histograms sharing the same bin edges are summed in place into a
+    single array, so memory use is set by the number of bins rather than the
+    number of inputs.  Histograms with differing edges are rebinned onto the
+    union of all edges, assuming counts are spread uniformly within each
+    input bin.  Quantiles are linearly interpolated within the bin that
+    contains them.
+    """
+
+    ConfigClass = HistMedianTaskConfig
     _DefaultName = "histMedianTask"
 
     def run(self, measurements, agg_name, package, metric):
         self.log.info(f"Computing the {agg_name} of {package}_{metric} values")
-        values = measurements[0].extras['values'].quantity
-        bins = measurements[0].extras['bins'].quantity
-        for m in measurements[1:]:
-            values += m.extras['values'].quantity
-        c = np.cumsum(values)
-        idx = np.searchsorted(c, c[-1]/2.)
+        unit = measurements[0].extras['bins'].quantity.unit
+        bins, counts = self.mergeHistograms(measurements, unit)
+
+        quantiles = [self.config.quantile] + list(self.config.extraQuantiles)
+        results = self.histogramQuantiles(bins, counts, quantiles)*unit
+
+        extras = None
+        if self.config.extraQuantiles:
+            extras = {f'q{q:g}': Datum(value, label=f'q{q:g}', description=f'{q:g} quantile')
+                      for q, value in zip(self.config.extraQuantiles, results[1:])}
+        return Struct(measurement=Measurement(f"metricvalue_{agg_name}_{package}_{metric}", results[0],
+                                              extras=extras))
+
+    @staticmethod
+    def mergeHistograms(measurements, unit):
+        """Sum the histograms of a list of measurements.
+
+        Parameters
+        ----------
+        measurements : `list` of `lsst.verify.Measurement`
+            Measurements with ``values`` and ``bins`` extras.
+        unit : `astropy.units.Unit`
+            Unit of the returned bin edges.
+
+        Returns
+        -------
+        bins : `numpy.ndarray` of `float`
+            Bin edges of the merged histogram, in ``unit``.
+        counts : `numpy.ndarray` of `float`
+            Merged counts in each bin.
+        """
+        # Sum histograms with identical edges first, so rebinning is done
+        # once per distinct set of edges rather than once per input.
+        sums = {}
+        for m in measurements:
+            edges = m.extras['bins'].quantity.to_value(unit)
+            key = edges.tobytes()
+            if key in sums:
+                np.add(sums[key][1], m.extras['values'].quantity.value, out=sums[key][1])
+            else:
+                sums[key] = (edges, np.array(m.extras['values'].quantity.value, dtype=float))
+
+        if len(sums) == 1:
+            return next(iter(sums.values()))
+
+        bins = np.unique(np.concatenate([edges for edges, _ in sums.values()]))
+        counts = np.zeros(len(bins) - 1)
+        for edges, values in sums.values():
+            counts += HistMedianTask.rebinHistogram(edges, values, bins)
+        return bins, counts
+
+    @staticmethod
+    def rebinHistogram(edges, values, bins):
+        """Rebin a histogram onto new bin edges by fractional bin overlap.
+
+        Parameters
+        ----------
+        edges : `numpy.ndarray` of `float`
+            Bin edges of the input histogram.
+        values : `numpy.ndarray` of `float`
+            Counts in each input bin.
+        bins : `numpy.ndarray` of `float`
+            New bin edges.
+
+        Returns
+        -------
+        counts : `numpy.ndarray` of `float`
+            Counts in each new bin.  Counts outside the new edges are dropped.
+        """
+        # Interpolate the cumulative distribution at the new edges.
+        cumulative = np.concatenate([[0.], np.cumsum(values)])
+        return np.diff(np.interp(bins, edges, cumulative))
+
+    @staticmethod
+    def histogramQuantiles(bins, counts, quantiles):
+        """Interpolate quantiles from a histogram.
+
+        Parameters
+        ----------
+        bins : `numpy.ndarray` of `float`
+            Bin edges.
+        counts : `numpy.ndarray` of `float`
+            Counts in each bin.
+        quantiles : `list` of `float`
+            Quantiles to compute, between 0 and 1.
+
+        Returns
+        -------
+        values : `numpy.ndarray` of `float`
+            The quantiles; NaN if the histogram is empty.
+        """
+        c = np.cumsum(counts)
+        if len(c) == 0 or c[-1] <= 0:
+            return np.full(len(quantiles), np.nan)
+        target = c[-1]*np.asarray(quantiles)
+        idx = np.minimum(np.searchsorted(c, target), len(c) - 1)
+        # Cumulative count below each bin; zero below the first bin.
+        below = np.concatenate([[0.], c])[idx]
         # This is the bin lower bound
         lower = bins[idx]
         # This is the bin upper bound
         upper = bins[idx+1]
 
-        # Linear interpolation of median value within the bin
-        frac = (c[-1]/2. - c[idx-1])/(c[idx] - c[idx-1])
-        interp = lower + (upper - lower)*frac
+        # Linear interpolation of the quantile within the bin
+        width = c[idx] - below
+        frac = np.divide(target - below, width, out=np.zeros_like(target), where=width > 0)
+        return lower + (upper - lower)*frac
+
+
+class TDigestAggTaskConfig(Config):
+    quantile = Field(doc="Quantile of the merged distribution to report, between 0 and 1.",
+                     dtype=float, default=0.5)
+    compression = Field(doc="Compression parameter of the merged t-digest.",
+                        dtype=float, default=100.)
+
+
+class TDigestAggTask(Task):
+    """Aggregate measurements by merging t-digest quantile sketches.
+
+    Measurements carrying a sketch in their extras (see
+    `lsst.faro.utils.quantile_sketch.tdigestToExtras`) contribute the full
+    distribution they summarize; any other finite measurement contributes its
+    value as a single point, with a warning.  The merged sketch is attached
+    to the output measurement, so aggregates can themselves be aggregated
+    further.
+
+    Sketches are attached with ``doSketch`` by the AMx, ADx, AFx, AB1, PA2
+    and PF1 tasks, and by this task; the other measure tasks summarize no
+    per-object distribution and emit none.
+    """
+
+    ConfigClass = TDigestAggTaskConfig
+    _DefaultName = "tDigestAggTask"
+
+    def run(self, measurements, agg_name, package, metric):
+        self.log.info(f"Computing the {self.config.quantile} quantile of {package}_{metric} values")
+        name = f"metricvalue_{agg_name.lower()}_{package}_{metric}"
+        if len(measurements) == 0:
+            self.log.info('Recieved zero length measurments list.  Returning NaN.')
+            return Struct(measurement=Measurement(name, u.Quantity(np.nan)))
 
-        return Struct(measurement=Measurement(f"metricvalue_{agg_name}_{package}_{metric}", interp))
+        unit = measurements[0].quantity.unit
+        digests = []
+        numUnsketched = 0
+        for m in measurements:
+            if 'sketch_means' in m.extras:
+                digests.append(tdigestFromExtras(m.extras, unit))
+            else:
+                digests.append(makeTDigest([m.quantity.to_value(unit)]))
+                numUnsketched += 1
+        if numUnsketched > 0:
+            self.log.warning(f"{numUnsketched} of {len(measurements)} measurements carry no sketch and "
+                             "contribute their value as a single point; set doSketch in the measure task.")
+        digest = mergeTDigests(digests, compression=self.config.compression)
+        value = tdigestQuantile(digest, self.config.quantile)*unit
+        return Struct(measurement=Measurement(name, value, extras=tdigestToExtras(digest, unit)))
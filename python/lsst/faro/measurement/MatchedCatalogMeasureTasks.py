@@ -1,12 +1,16 @@
+import contextlib
+
 import astropy.units as u
 import numpy as np
 from lsst.pipe.base import Struct, Task
-from lsst.pex.config import Config, Field, ListField
+from lsst.pex.config import Config, Field, ListField, ChoiceField
 from lsst.verify import Measurement, ThresholdSpecification, Datum
-from lsst.faro.utils.filtermatches import filterMatches
+from lsst.faro.utils.filtermatches import filterMatches, filterMatchesColumns, filterStatsToMetadata
 from lsst.faro.utils.separations import (calcRmsDistances, calcRmsDistancesVsRef,
-                                         astromResiduals)
-from lsst.faro.utils.phot_repeat import photRepeat
+                                         astromResiduals, bootstrapMedianInterval)
+from lsst.faro.utils.phot_repeat import photRepeat, photRepeatCurve
+from lsst.faro.utils.quantile_sketch import makeTDigest, tdigestToExtras
+from lsst.faro.utils.instrumentation import getStageTimer
 from lsst.faro.utils.tex import (correlation_function_ellipticity_from_matches,
                                  select_bin_from_corr)
 
@@ -15,7 +19,77 @@ filter_dict = {'u': 1, 'g': 2, 'r': 3, 'i': 4, 'z': 5, 'y': 6,
                'HSC-U': 1, 'HSC-G': 2, 'HSC-R': 3, 'HSC-I': 4, 'HSC-Z': 5, 'HSC-Y': 6}
 
 
-class PA1TaskConfig(Config):
+class FilterMatchesTaskConfig(Config):
+    """Config of the tasks that select matched objects with `filterMatches`.
+    """
+    adaptiveFilterOrder = Field(doc="Order the filterMatches criteria by their measured cost per "
+                                    "rejected object; the selection is unchanged.",
+                                dtype=bool, default=False)
+
+
+@contextlib.contextmanager
+def _filterMatchesArgs(task):
+    """Yield the instrumentation arguments of `filterMatches` for a task,
+    and add the counts it fills in to the task metadata on exit.
+
+    The counts are only collected if the task's timer is enabled.
+    """
+    stats = {} if getStageTimer(task).enabled else None
+    yield {'stats': stats, 'adaptiveOrder': task.config.adaptiveFilterOrder}
+    if stats:
+        filterStatsToMetadata(stats, task.metadata)
+
+
+class SketchTaskConfig(Config):
+    """Config of the tasks that can attach a t-digest sketch of the
+    per-object values their measurement summarizes.
+    """
+    doSketch = Field(doc="Attach a t-digest sketch of the per-object values the measurement summarizes, "
+                         "so that it can be aggregated with TDigestAggTask.",
+                     dtype=bool, default=False)
+    sketchCompression = Field(doc="Compression parameter of the t-digest sketch.",
+                              dtype=float, default=100.)
+
+
+def _sketchExtras(task, values, unit, weights=None):
+    """Return the t-digest sketch extras of a task's values; none unless
+    ``doSketch`` is set.
+    """
+    if not task.config.doSketch:
+        return {}
+    return tdigestToExtras(makeTDigest(values, compression=task.config.sketchCompression, weights=weights),
+                           unit)
+
+
+def _absMagDiffSketchExtras(task, photRepeatResult):
+    """Return the sketch extras of the absolute magnitude differences of
+    `photRepeat`, exact or streamed.
+    """
+    if 'absMagDiffHist' in photRepeatResult:
+        histogram = photRepeatResult['absMagDiffHist']
+        nonEmpty = histogram.counts > 0
+        centers = (np.flatnonzero(nonEmpty) + 0.5)*histogram.binWidth
+        return _sketchExtras(task, np.concatenate([centers, histogram.overflow]), u.mmag,
+                             weights=np.concatenate([histogram.counts[nonEmpty],
+                                                     np.ones(len(histogram.overflow))]))
+    return _sketchExtras(task, np.abs(photRepeatResult['magDiff'].to_value(u.mmag)).ravel(), u.mmag)
+
+
+def _filterMatchesInstrumented(task, matchedCatalog, **filterargs):
+    """Select the groups of a matched catalog with `filterMatches`, timing
+    it in the ``filterMatches`` stage of the task's timer.
+    """
+    with getStageTimer(task).stage('filterMatches', rows=len(matchedCatalog)) as stage, \
+            _filterMatchesArgs(task) as instrumentArgs:
+        filteredCat = filterMatches(matchedCatalog, **filterargs, **instrumentArgs)
+        stage['groups'] = filteredCat.count
+    return filteredCat
+
+
+class PhotRepeatTaskConfig(FilterMatchesTaskConfig):
+    """Config of the tasks measuring photometric repeatability with
+    `photRepeat`.
+    """
     brightSnrMin = Field(doc="Minimum median SNR for a source to be considered bright.",
                          dtype=float, default=50)
     brightSnrMax = Field(doc="Maximum median SNR for a source to be considered bright.",
@@ -24,12 +98,56 @@ class PA1TaskConfig(Config):
                               dtype=int, default=50)
     randomSeed = Field(doc="Random seed for sampling.",
                        dtype=int, default=12345)
+    randomStreams = ChoiceField(doc="How the random pairs of observations are drawn.",
+                                dtype=str, default="serial",
+                                allowed={"serial": "All shuffles draw from one generator, in turn.",
+                                         "spawn": "Each shuffle (and object chunk) draws from its own "
+                                                  "stream spawned from randomSeed, independently of "
+                                                  "the order of computation."})
+    shuffleChunkSize = Field(doc="Number of objects per random stream with randomStreams='spawn'; "
+                                 "0 for one stream per shuffle.",
+                             dtype=int, default=0, check=lambda x: x >= 0)
+    numProcesses = Field(doc="Number of processes computing the shuffles; requires "
+                             "randomStreams='spawn'.",
+                         dtype=int, default=1, check=lambda x: x >= 1)
+
+    def validate(self):
+        super().validate()
+        if self.numProcesses > 1 and self.randomStreams != 'spawn':
+            raise ValueError("numProcesses > 1 requires randomStreams='spawn'.")
+
+
+class PA1TaskConfig(PhotRepeatTaskConfig):
+    doRepeatabilityCurve = Field(doc="Also compute the repeatability in bins of median SNR or magnitude, "
+                                     "and store it in the measurement extras.  PA1 is then computed "
+                                     "from the same shuffles as the curve, so it is a different, but "
+                                     "statistically equivalent, sample.",
+                                 dtype=bool, default=False)
+    curveBinBy = ChoiceField(doc="Quantity by which the objects of the repeatability curve are binned.",
+                             dtype=str, default="snr",
+                             allowed={"snr": "Median PSF flux SNR.",
+                                      "mag": "Median PSF magnitude."})
+    curveBinEdges = ListField(doc="Increasing bin edges of the repeatability curve, in SNR or mag "
+                                  "according to curveBinBy.",
+                              dtype=float, default=[10., 20., 50., 100., 200., 500., 1000.])
+    curveSnrMin = Field(doc="Minimum median SNR of the objects of the repeatability curve with "
+                            "curveBinBy='mag'.",
+                        dtype=float, default=10.)
+    curveMinObjects = Field(doc="Minimum number of objects in a bin of the repeatability curve.",
+                            dtype=int, default=10)
+
+    def validate(self):
+        super().validate()
+        if self.doRepeatabilityCurve and (len(self.curveBinEdges) < 2
+                                          or np.any(np.diff(self.curveBinEdges) <= 0)):
+            raise ValueError("curveBinEdges must be at least two increasing values.")
 
 
 class PA1Task(Task):
 
     ConfigClass = PA1TaskConfig
     _DefaultName = "PA1Task"
+    requiredColumns = filterMatchesColumns
 
     def __init__(self, config: PA1TaskConfig, *args, **kwargs):
         super().__init__(*args, config=config, **kwargs)
@@ -41,34 +159,93 @@ class PA1Task(Task):
     def run(self, matchedCatalog, metric_name):
         self.log.info("Measuring PA1")
 
-        pa1 = photRepeat(matchedCatalog, snrMax=self.brightSnrMax, snrMin=self.brightSnrMin,
-                         numRandomShuffles=self.numRandomShuffles, randomSeed=self.randomSeed)
-
-        if 'magDiff' in pa1.keys():
-            return Struct(measurement=Measurement("PA1", pa1['repeatability']))
+        timer = getStageTimer(self)
+        extras = None
+        if self.config.doRepeatabilityCurve:
+            with timer.stage('photRepeatCurve', rows=len(matchedCatalog)), \
+                    _filterMatchesArgs(self) as filterArgs:
+                pa1, extras = self.measureCurve(matchedCatalog, **filterArgs)
         else:
-            return Struct(measurement=Measurement("PA1", np.nan*u.mmag))
-
-
-class PA2TaskConfig(Config):
-    brightSnrMin = Field(doc="Minimum median SNR for a source to be considered bright.",
-                         dtype=float, default=50)
-    brightSnrMax = Field(doc="Maximum median SNR for a source to be considered bright.",
-                         dtype=float, default=np.Inf)
+            with timer.stage('photRepeat', rows=len(matchedCatalog)), \
+                    _filterMatchesArgs(self) as filterArgs:
+                # Only the widths are needed, so the magnitude differences are
+                # not kept.
+                pa1 = photRepeat(matchedCatalog, snrMax=self.brightSnrMax, snrMin=self.brightSnrMin,
+                                 numRandomShuffles=self.numRandomShuffles, randomSeed=self.randomSeed,
+                                 randomStreams=self.config.randomStreams,
+                                 chunkSize=self.config.shuffleChunkSize,
+                                 numProcesses=self.config.numProcesses, returnMagDiffs=False,
+                                 **filterArgs)
+
+        if 'repeatability' in pa1.keys():
+            return Struct(measurement=Measurement("PA1", pa1['repeatability'], extras=extras))
+        else:
+            return Struct(measurement=Measurement("PA1", np.nan*u.mmag, extras=extras))
+
+    def measureCurve(self, matchedCatalog, **filterargs):
+        """Compute PA1 and the repeatability curve from the same shuffles.
+
+        Parameters
+        ----------
+        matchedCatalog : `lsst.afw.table.SimpleCatalog`
+            Matched catalog, sorted by ``object``.
+        **filterargs
+            Additional arguments of `filterMatches`.
+
+        Returns
+        -------
+        pa1 : `dict`
+            The repeatability of the bright objects, as from `photRepeat`.
+        extras : `dict` [`str`, `lsst.verify.Datum`]
+            The ``curve_bins`` edges, the ``curve_count`` of objects and the
+            ``curve_rms`` and ``curve_repeatability`` (mean scaled IQR) of
+            each bin.
+        """
+        if self.config.curveBinBy == 'snr':
+            binUnit = u.dimensionless_unscaled
+        else:
+            filterargs = dict(filterargs, snrMin=self.config.curveSnrMin)
+            binUnit = u.mag
+        curve = photRepeatCurve(matchedCatalog, self.config.curveBinEdges, binBy=self.config.curveBinBy,
+                                numRandomShuffles=self.numRandomShuffles, randomSeed=self.randomSeed,
+                                randomStreams=self.config.randomStreams,
+                                chunkSize=self.config.shuffleChunkSize,
+                                numProcesses=self.config.numProcesses,
+                                minObjects=self.config.curveMinObjects,
+                                brightSnrRange=(self.brightSnrMin, self.brightSnrMax), **filterargs)
+        extras = {'curve_bins': Datum(curve['binEdges']*binUnit, label='curve_bins',
+                                      description=f'bin edges in median {self.config.curveBinBy}'),
+                  'curve_count': Datum(curve['count']*u.count, label='curve_count',
+                                       description='number of objects in each bin'),
+                  'curve_rms': Datum(np.mean(curve['rms'], axis=0), label='curve_rms',
+                                     description='mean RMS of the shuffles in each bin'),
+                  'curve_repeatability': Datum(curve['repeatability'], label='curve_repeatability',
+                                               description='mean scaled IQR of the shuffles in each bin')}
+        return curve['bright'], extras
+
+
+class PA2TaskConfig(PhotRepeatTaskConfig, SketchTaskConfig):
     # The defaults for threshPA2 and threshPF1 correspond to the SRD "design" thresholds.
     threshPA2 = Field(doc="Threshold in mmag for PF1 calculation.", dtype=float, default=15.0)
     threshPF1 = Field(doc="Percentile of differences that can vary by more than threshPA2.",
                       dtype=float, default=10.0)
-    numRandomShuffles = Field(doc="Number of trials used for random sampling of observation pairs.",
-                              dtype=int, default=50)
-    randomSeed = Field(doc="Random seed for sampling.",
-                       dtype=int, default=12345)
+    doStreaming = Field(doc="Reduce the magnitude differences of each shuffle to a histogram of their "
+                            "absolute values instead of keeping them all.  PF1 is unchanged up to "
+                            "rounding and PA2 is accurate to streamingBinWidth.",
+                        dtype=bool, default=False)
+    streamingBinWidth = Field(doc="Bin width of the histogram of absolute magnitude differences in "
+                                  "mmag, with doStreaming.",
+                              dtype=float, default=0.1)
+    streamingMax = Field(doc="Upper edge of the histogram in mmag; larger differences are kept "
+                             "exactly.",
+                         dtype=float, default=500.)
 
 
 class PA2Task(Task):
 
     ConfigClass = PA2TaskConfig
     _DefaultName = "PA2Task"
+    requiredColumns = filterMatchesColumns
 
     def __init__(self, config: PA2TaskConfig, *args, **kwargs):
         super().__init__(*args, config=config, **kwargs)
@@ -83,17 +260,32 @@ class PA2Task(Task):
         self.log.info("Measuring PA2")
         pf1_thresh = self.threshPF1 * u.percent
 
-        pa2 = photRepeat(matchedCatalog,
-                         numRandomShuffles=self.numRandomShuffles, randomSeed=self.randomSeed)
-
-        if 'magDiff' in pa2.keys():
+        timer = getStageTimer(self)
+        with timer.stage('photRepeat', rows=len(matchedCatalog)), \
+                _filterMatchesArgs(self) as filterArgs:
+            pa2 = photRepeat(matchedCatalog,
+                             numRandomShuffles=self.numRandomShuffles, randomSeed=self.randomSeed,
+                             randomStreams=self.config.randomStreams,
+                             chunkSize=self.config.shuffleChunkSize,
+                             numProcesses=self.config.numProcesses,
+                             streaming=self.config.doStreaming,
+                             histBinWidth=self.config.streamingBinWidth,
+                             histMax=self.config.streamingMax, threshold=self.threshPA2,
+                             **filterArgs)
+
+        pf1Percentile = 100.*u.percent - pf1_thresh
+        if 'absMagDiffHist' in pa2.keys():
+            return Struct(measurement=Measurement(
+                "PA2", pa2['absMagDiffHist'].percentile(pf1Percentile.value) * u.mmag,
+                extras=_absMagDiffSketchExtras(self, pa2)))
+        elif 'magDiff' in pa2.keys():
             # Previously, validate_drp used the first random sample from PA1 measurement
             # Now, use all of them.
             magDiffs = pa2['magDiff']
 
-            pf1Percentile = 100.*u.percent - pf1_thresh
             return Struct(measurement=Measurement("PA2", np.percentile(np.abs(magDiffs.value),
-                          pf1Percentile.value) * magDiffs.unit))
+                          pf1Percentile.value) * magDiffs.unit,
+                          extras=_absMagDiffSketchExtras(self, pa2)))
         else:
             return Struct(measurement=Measurement("PA2", np.nan*u.mmag))
 
@@ -102,6 +294,7 @@ class PF1Task(Task):
 
     ConfigClass = PA2TaskConfig
     _DefaultName = "PF1Task"
+    requiredColumns = filterMatchesColumns
 
     def __init__(self, config: PA2TaskConfig, *args, **kwargs):
         super().__init__(*args, config=config, **kwargs)
@@ -116,22 +309,37 @@ class PF1Task(Task):
         self.log.info("Measuring PF1")
         pa2_thresh = self.threshPA2 * u.mmag
 
-        pf1 = photRepeat(matchedCatalog,
-                         numRandomShuffles=self.numRandomShuffles, randomSeed=self.randomSeed)
-
-        if 'magDiff' in pf1.keys():
+        timer = getStageTimer(self)
+        with timer.stage('photRepeat', rows=len(matchedCatalog)), \
+                _filterMatchesArgs(self) as filterArgs:
+            pf1 = photRepeat(matchedCatalog,
+                             numRandomShuffles=self.numRandomShuffles, randomSeed=self.randomSeed,
+                             randomStreams=self.config.randomStreams,
+                             chunkSize=self.config.shuffleChunkSize,
+                             numProcesses=self.config.numProcesses,
+                             streaming=self.config.doStreaming,
+                             histBinWidth=self.config.streamingBinWidth,
+                             histMax=self.config.streamingMax, threshold=self.threshPA2,
+                             **filterArgs)
+
+        if 'absMagDiffHist' in pf1.keys():
+            histogram = pf1['absMagDiffHist']
+            return Struct(measurement=Measurement("PF1", 100*histogram.numAbove/histogram.count*u.percent,
+                                                  extras=_absMagDiffSketchExtras(self, pf1)))
+        elif 'magDiff' in pf1.keys():
             # Previously, validate_drp used the first random sample from PA1 measurement
             # Now, use all of them.
             magDiffs = pf1['magDiff']
 
             percentileAtPA2 = 100 * np.mean(np.abs(magDiffs.value) > pa2_thresh.value) * u.percent
 
-            return Struct(measurement=Measurement("PF1", percentileAtPA2))
+            return Struct(measurement=Measurement("PF1", percentileAtPA2,
+                                                  extras=_absMagDiffSketchExtras(self, pf1)))
         else:
             return Struct(measurement=Measurement("PF1", np.nan*u.percent))
 
 
-class TExTaskConfig(Config):
+class TExTaskConfig(FilterMatchesTaskConfig):
     annulus_r = Field(doc="Radial size of the annulus in arcmin",
                       dtype=float, default=1.)
     comparison_operator = Field(doc="String representation of the operator to use in comparisons",
@@ -141,17 +349,20 @@ class TExTaskConfig(Config):
 class TExTask(Task):
     ConfigClass = TExTaskConfig
     _DefaultName = "TExTask"
+    requiredColumns = filterMatchesColumns + ('e1', 'e2', 'psf_e1', 'psf_e2')
 
     def run(self, matchedCatalog, metric_name):
         self.log.info(f"Measuring {metric_name}")
 
+        timer = getStageTimer(self)
         D = self.config.annulus_r * u.arcmin
-        filteredCat = filterMatches(matchedCatalog)
+        filteredCat = _filterMatchesInstrumented(self, matchedCatalog)
         nMinTEx = 50
         if filteredCat.count <= nMinTEx:
             return Struct(measurement=Measurement(metric_name, np.nan*u.Unit('')))
 
-        radius, xip, xip_err = correlation_function_ellipticity_from_matches(filteredCat)
+        with timer.stage('correlation'):
+            radius, xip, xip_err = correlation_function_ellipticity_from_matches(filteredCat)
         operator = ThresholdSpecification.convert_operator_str(self.config.comparison_operator)
         corr, corr_err = select_bin_from_corr(radius, xip, xip_err, radius=D, operator=operator)
         return Struct(measurement=Measurement(metric_name, np.abs(corr)*u.Unit('')))
@@ -166,7 +377,7 @@ def bins(window, n):
     return [i*delta for i in range(n+1)]
 
 
-class AMxTaskConfig(Config):
+class AMxTaskConfig(FilterMatchesTaskConfig, SketchTaskConfig):
     annulus_r = Field(doc="Radial distance of the annulus in arcmin (5, 20, or 200 for AM1, AM2, AM3)",
                       dtype=float, default=5.)
     width = Field(doc="Width of annulus in arcmin",
@@ -182,30 +393,69 @@ class AMxTaskConfig(Config):
     bins = ListField(doc="Bins for histogram.",
                      dtype=float, minLength=2, maxLength=1500,
                      listCheck=isSorted, default=bins(30, 200))
+    doApproximate = Field(doc="Compute AMx from at most maxPairs pairs of objects in the annulus, "
+                              "sampled uniformly at random, and store a bootstrap confidence interval "
+                              "of the median in the extras.  Not used by ADx and AFx.",
+                          dtype=bool, default=False)
+    maxPairs = Field(doc="Maximum number of pairs of objects used with doApproximate.",
+                     dtype=int, default=100000)
+    randomSeed = Field(doc="Random seed for sampling pairs and bootstrap resamples with doApproximate.",
+                       dtype=int, default=12345)
+    numBootstrap = Field(doc="Number of bootstrap resamples of the median with doApproximate.",
+                         dtype=int, default=200)
+    bootstrapConfidence = Field(doc="Confidence level of the bootstrap interval of the median.",
+                                dtype=float, default=0.95)
 
 
 class AMxTask(Task):
     ConfigClass = AMxTaskConfig
     _DefaultName = "AMxTask"
+    requiredColumns = filterMatchesColumns + ('visit', 'filt', 'base_PsfFlux_mag')
 
     def run(self, matchedCatalog, metric_name):
         self.log.info(f"Measuring {metric_name}")
+        timer = getStageTimer(self)
 
-        filteredCat = filterMatches(matchedCatalog)
+        filteredCat = _filterMatchesInstrumented(self, matchedCatalog)
 
         magRange = np.array([self.config.bright_mag_cut, self.config.faint_mag_cut]) * u.mag
         D = self.config.annulus_r * u.arcmin
         width = self.config.width * u.arcmin
         annulus = D + (width/2)*np.array([-1, +1])
 
-        rmsDistances = calcRmsDistances(
-            filteredCat,
-            annulus,
-            magRange=magRange)
+        rng = None
+        pairStats = {}
+        if self.config.doApproximate:
+            rng = np.random.default_rng(self.config.randomSeed)
+        with timer.stage('calcRmsDistances') as stage:
+            rmsDistances = calcRmsDistances(
+                filteredCat,
+                annulus,
+                magRange=magRange,
+                maxPairs=self.config.maxPairs if self.config.doApproximate else None,
+                rng=rng, stats=pairStats)
+            stage['objects'] = len(rmsDistances)
 
         values, bins = np.histogram(rmsDistances.to(u.marcsec), bins=self.config.bins*u.marcsec)
+        if self.config.doApproximate and pairStats['pairsSampled'] > 0:
+            # Scale the counts to the full set of pairs, so that histograms
+            # aggregated across tracts keep their relative weights.
+            values = values*(pairStats['pairsTotal']/pairStats['pairsSampled'])
         extras = {'bins': Datum(bins, label='binvalues', description='bins'),
                   'values': Datum(values*u.count, label='counts', description='icounts in bins')}
+        if self.config.doApproximate:
+            low, high = bootstrapMedianInterval(rmsDistances.to_value(u.marcsec),
+                                                confidence=self.config.bootstrapConfidence,
+                                                numBootstrap=self.config.numBootstrap, rng=rng)
+            extras.update({
+                'median_ci': Datum(np.array([low, high])*u.marcsec, label='median_ci',
+                                   description=f'{self.config.bootstrapConfidence:g} bootstrap '
+                                               'confidence interval of the median'),
+                'pairs_total': Datum(pairStats['pairsTotal']*u.count, label='pairs_total',
+                                     description='number of pairs of objects in the annulus'),
+                'pairs_sampled': Datum(pairStats['pairsSampled']*u.count, label='pairs_sampled',
+                                       description='number of pairs of objects used')})
+        extras.update(_sketchExtras(self, rmsDistances.to_value(u.marcsec), u.marcsec))
 
         if len(rmsDistances) == 0:
             return Struct(measurement=Measurement(metric_name, np.nan*u.marcsec, extras=extras))
@@ -217,13 +467,18 @@ class AMxTask(Task):
 class ADxTask(Task):
     ConfigClass = AMxTaskConfig
     _DefaultName = "ADxTask"
+    requiredColumns = filterMatchesColumns + ('visit', 'filt', 'base_PsfFlux_mag')
 
     def run(self, matchedCatalog, metric_name):
         self.log.info(f"Measuring {metric_name}")
 
-        sepDistances = astromResiduals(matchedCatalog, self.config.bright_mag_cut,
-                                       self.config.faint_mag_cut, self.config.annulus_r,
-                                       self.config.width)
+        timer = getStageTimer(self)
+        with timer.stage('astromResiduals', rows=len(matchedCatalog)) as stage, \
+                _filterMatchesArgs(self) as filterArgs:
+            sepDistances = astromResiduals(matchedCatalog, self.config.bright_mag_cut,
+                                           self.config.faint_mag_cut, self.config.annulus_r,
+                                           self.config.width, **filterArgs)
+            stage['objects'] = len(sepDistances)
 
         afThresh = self.config.threshAF * u.percent
         afPercentile = 100.0*u.percent - afThresh
@@ -236,19 +491,25 @@ class ADxTask(Task):
             # absRmsDiffs = np.abs(rmsDistances - np.median(rmsDistances)).to(u.marcsec)
             absDiffsMarcsec = (sepDistances-np.median(sepDistances)).to(u.marcsec)
             return Struct(measurement=Measurement(metric_name, np.percentile(absDiffsMarcsec.value,
-                          afPercentile.value)*u.marcsec))
+                          afPercentile.value)*u.marcsec,
+                          extras=_sketchExtras(self, absDiffsMarcsec.value, u.marcsec)))
 
 
 class AFxTask(Task):
     ConfigClass = AMxTaskConfig
     _DefaultName = "AFxTask"
+    requiredColumns = filterMatchesColumns + ('visit', 'filt', 'base_PsfFlux_mag')
 
     def run(self, matchedCatalog, metric_name):
         self.log.info(f"Measuring {metric_name}")
 
-        sepDistances = astromResiduals(matchedCatalog, self.config.bright_mag_cut,
-                                       self.config.faint_mag_cut, self.config.annulus_r,
-                                       self.config.width)
+        timer = getStageTimer(self)
+        with timer.stage('astromResiduals', rows=len(matchedCatalog)) as stage, \
+                _filterMatchesArgs(self) as filterArgs:
+            sepDistances = astromResiduals(matchedCatalog, self.config.bright_mag_cut,
+                                           self.config.faint_mag_cut, self.config.annulus_r,
+                                           self.config.width, **filterArgs)
+            stage['objects'] = len(sepDistances)
 
         adxThresh = self.config.threshAD * u.marcsec
 
@@ -260,10 +521,12 @@ class AFxTask(Task):
             # absRmsDiffs = np.abs(rmsDistances - np.median(rmsDistances)).to(u.marcsec)
             absDiffsMarcsec = (sepDistances-np.median(sepDistances)).to(u.marcsec)
             percentileAtADx = 100 * np.mean(np.abs(absDiffsMarcsec.value) > adxThresh.value) * u.percent
-            return Struct(measurement=Measurement(metric_name, percentileAtADx))
+            return Struct(measurement=Measurement(metric_name, percentileAtADx,
+                                                  extras=_sketchExtras(self, np.abs(absDiffsMarcsec.value),
+                                                                       u.marcsec)))
 
 
-class AB1TaskConfig(Config):
+class AB1TaskConfig(FilterMatchesTaskConfig, SketchTaskConfig):
     bright_mag_cut = Field(doc="Bright limit of catalog entries to include",
                            dtype=float, default=17.0)
     faint_mag_cut = Field(doc="Faint limit of catalog entries to include",
@@ -275,6 +538,7 @@ class AB1TaskConfig(Config):
 class AB1Task(Task):
     ConfigClass = AB1TaskConfig
     _DefaultName = "AB1Task"
+    requiredColumns = filterMatchesColumns + ('visit', 'filt', 'base_PsfFlux_mag')
 
     def run(self, matchedCatalogMulti, metric_name, in_id, out_id):
         self.log.info(f"Measuring {metric_name}")
@@ -282,7 +546,8 @@ class AB1Task(Task):
         if self.config.ref_filter not in filter_dict:
             raise Exception('Reference filter supplied for AB1 not in dictionary.')
 
-        filteredCat = filterMatches(matchedCatalogMulti)
+        timer = getStageTimer(self)
+        filteredCat = _filterMatchesInstrumented(self, matchedCatalogMulti)
         rmsDistancesAll = []
 
         if len(filteredCat) > 0:
@@ -300,11 +565,12 @@ class AB1Task(Task):
 
             magRange = np.array([self.config.bright_mag_cut, self.config.faint_mag_cut]) * u.mag
             for rv in refVisits:
-                rmsDistances = calcRmsDistancesVsRef(
-                    filteredCat,
-                    rv,
-                    magRange=magRange,
-                    band=filter_dict[out_id['band']])
+                with timer.stage('calcRmsDistancesVsRef', visits=1):
+                    rmsDistances = calcRmsDistancesVsRef(
+                        filteredCat,
+                        rv,
+                        magRange=magRange,
+                        band=filter_dict[out_id['band']])
                 finiteEntries = np.where(np.isfinite(rmsDistances))[0]
                 if len(finiteEntries) > 0:
                     rmsDistancesAll.append(rmsDistances[finiteEntries])
@@ -313,7 +579,10 @@ class AB1Task(Task):
                 return Struct(measurement=Measurement(metric_name, np.nan*u.marcsec))
             else:
                 rmsDistancesAll = np.concatenate(rmsDistancesAll)
-                return Struct(measurement=Measurement(metric_name, np.mean(rmsDistancesAll)*u.marcsec))
+                return Struct(measurement=Measurement(metric_name, np.mean(rmsDistancesAll)*u.marcsec,
+                                                      extras=_sketchExtras(
+                                                          self, u.Quantity(rmsDistancesAll, u.marcsec).value,
+                                                          u.marcsec)))
 
         else:
             return Struct(measurement=Measurement(metric_name, np.nan*u.marcsec))
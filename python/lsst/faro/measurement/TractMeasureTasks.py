@@ -1,11 +1,16 @@
+import os
+from collections import defaultdict
+
 import astropy.units as u
 import numpy as np
 from lsst.pipe.base import Struct, Task
 from lsst.verify import Measurement, Datum
 from lsst.pex.config import Config, Field
-from lsst.faro.utils.stellar_locus import stellarLocusResid, calcQuartileClippedStats
+from lsst.faro.utils.stellar_locus import (stellarLocusResid, calcQuartileClippedStats,
+                                           stellarLocusResidStreaming, stellarLocusBootstrap)
 from lsst.faro.utils.matcher import make_matched_photom
-from lsst.faro.utils.extinction_corr import extinction_corr
+from lsst.faro.utils.extinction_corr import extinction_corr, EbvHealpixTable, ebvTableFilename
+from lsst.faro.utils.instrumentation import getStageTimer
 
 
 class WPerpTaskConfig(Config):
@@ -14,32 +19,186 @@ class WPerpTaskConfig(Config):
                             dtype=float, default=17.0)
     faint_rmag_cut = Field(doc="Faint limit of catalog entries to include",
                            dtype=float, default=23.0)
+    ebvTableDir = Field(doc="Directory of precomputed per-tract HEALPix E(B-V) tables. If set, extinction "
+                            "corrections are looked up in these tables, and a missing table is built "
+                            "from the SFD maps and written here; if None, the SFD maps are queried directly.",
+                        dtype=str, default=None, optional=True)
+    ebvTableNside = Field(doc="HEALPix nside of the per-tract E(B-V) tables.",
+                          dtype=int, default=EbvHealpixTable.defaultNside)
+    doStreamingFit = Field(doc="Read the catalogs and fit the stellar locus patch by patch from merged "
+                               "fit statistics, instead of reading every catalog and building one "
+                               "matched gri table for the whole tract.  Only the extinction-corrected "
+                               "gri magnitudes of the selected stars are kept between patches.",
+                           dtype=bool, default=False)
+    nBootstrap = Field(doc="Number of bootstrap resamples used to estimate the uncertainty on wPerp; "
+                           "0 disables the bootstrap, otherwise at least 2 are needed.",
+                       dtype=int, default=0, check=lambda x: x == 0 or x >= 2)
+    bootstrapSeed = Field(doc="Random seed for drawing the bootstrap resamples.",
+                          dtype=int, default=12345)
+    bootstrapChunkSize = Field(doc="Number of bootstrap resamples evaluated together.",
+                               dtype=int, default=20, check=lambda x: x >= 1)
+    bootstrapProcesses = Field(doc="Number of processes used to evaluate the bootstrap resamples.",
+                               dtype=int, default=1, check=lambda x: x >= 1)
 
 
 class WPerpTask(Task):
     ConfigClass = WPerpTaskConfig
     _DefaultName = "WPerpTask"
+    # make_matched_photom calibrates and matches whole catalogs.
+    requiredColumns = None
+
+    @property
+    def readsCatalogs(self):
+        """Whether ``run`` is given deferred handles to the catalogs, which
+        it reads one patch at a time; true with ``doStreamingFit``.
+        """
+        return self.config.doStreamingFit
 
     def run(self, catalogs, photo_calibs, metric_name, vIds):
         self.log.info(f"Measuring {metric_name}")
         bands = set([f['band'] for f in vIds])
 
         if ('g' in bands) & ('r' in bands) & ('i' in bands):
+            if self.config.doStreamingFit:
+                return self.calc_wPerp_streaming(catalogs, photo_calibs, metric_name, vIds)
+
             rgicat_all = make_matched_photom(vIds, catalogs, photo_calibs)
             magcut = ((rgicat_all['base_PsfFlux_mag_r'] < self.config.faint_rmag_cut)
                       & (rgicat_all['base_PsfFlux_mag_r'] > self.config.bright_rmag_cut))
             rgicat = rgicat_all[magcut]
-            ext_vals = extinction_corr(rgicat, bands)
+            ebvTable = None
+            if self.config.ebvTableDir is not None:
+                band = list(bands)[0]
+                ebvTable = self.getEbvTable(vIds[0]['tract'], rgicat_all['coord_ra_'+band],
+                                            rgicat_all['coord_dec_'+band])
+            ext_vals = extinction_corr(rgicat, bands, ebvTable=ebvTable)
 
             wPerp = self.calc_wPerp(rgicat, ext_vals, metric_name)
             return wPerp
         else:
             return Struct(measurement=Measurement(metric_name, np.nan*u.mmag))
 
+    def getEbvTable(self, tract, ra, dec):
+        """Read the E(B-V) table for a tract, building or extending it so that
+        it covers a set of positions.
+
+        ``ra`` and ``dec`` [radians] are the positions the table must cover.
+        A table written by a run with other coverage of the tract is extended
+        with the pixels around the positions it does not cover.
+        """
+        filename = ebvTableFilename(self.config.ebvTableDir, tract, self.config.ebvTableNside)
+        ebvTable = EbvHealpixTable.read(filename) if os.path.exists(filename) else None
+        coveringTable = self.coverEbvTable(ebvTable, ra, dec, filename)
+        if coveringTable is not ebvTable:
+            os.makedirs(self.config.ebvTableDir, exist_ok=True)
+            coveringTable.write(filename)
+        return coveringTable
+
+    def coverEbvTable(self, ebvTable, ra, dec, filename):
+        """Return an E(B-V) table covering a set of positions.
+
+        ``ebvTable`` itself is returned if it covers all the positions;
+        otherwise, a new table is built, or ``ebvTable`` is extended, from
+        the SFD maps.  ``filename`` is only used in log messages.
+        """
+        ra = np.asarray(ra, dtype=float)
+        dec = np.asarray(dec, dtype=float)
+        if ebvTable is None:
+            self.log.info(f"Building E(B-V) table {filename}")
+            return EbvHealpixTable.fromCoords(ra, dec, nside=self.config.ebvTableNside)
+        missing = ~ebvTable.covers(ra, dec)
+        if not np.any(missing):
+            return ebvTable
+        self.log.info(f"Extending E(B-V) table {filename} to {np.count_nonzero(missing)} "
+                      "positions it does not cover")
+        return ebvTable.merge(EbvHealpixTable.fromCoords(ra[missing], dec[missing],
+                                                         nside=self.config.ebvTableNside))
+
+    def calc_wPerp_streaming(self, catalogs, photo_calibs, metric_name, vIds):
+        """Measure wPerp from per-patch extinction-corrected gri magnitudes.
+
+        ``catalogs`` are deferred handles, read one patch at a time.  Only
+        the extinction-corrected g, r and i magnitudes of the stars of each
+        patch passing the cuts are kept, for the passes of
+        `stellarLocusResidStreaming` over them.
+        """
+        timer = getStageTimer(self)
+        ebvTable = None
+        if self.config.ebvTableDir is not None:
+            ebvFilename = ebvTableFilename(self.config.ebvTableDir, vIds[0]['tract'],
+                                           self.config.ebvTableNside)
+            if os.path.exists(ebvFilename):
+                ebvTable = EbvHealpixTable.read(ebvFilename)
+        ebvTableRead = ebvTable
+
+        patches = defaultdict(list)
+        for idx, vId in enumerate(vIds):
+            patches[vId['patch']].append(idx)
+
+        chunks = []
+        for patch in sorted(patches):
+            idxs = patches[patch]
+            patchIds = [vIds[idx] for idx in idxs]
+            patchBands = set([f['band'] for f in patchIds])
+            if not set(['g', 'r', 'i']) <= patchBands:
+                continue
+            with timer.stage('read') as stage:
+                patchCatalogs = [catalogs[idx].get() for idx in idxs]
+                stage['rows'] = sum(len(cat) for cat in patchCatalogs)
+            phot = make_matched_photom(patchIds, patchCatalogs, [photo_calibs[idx] for idx in idxs])
+            del patchCatalogs
+            magcut = ((phot['base_PsfFlux_mag_r'] < self.config.faint_rmag_cut)
+                      & (phot['base_PsfFlux_mag_r'] > self.config.bright_rmag_cut))
+            phot = phot[magcut]
+            if len(phot) == 0:
+                continue
+            if self.config.ebvTableDir is not None:
+                # The coordinates used by extinction_corr.
+                band = list(patchBands)[0]
+                ebvTable = self.coverEbvTable(ebvTable, phot['coord_ra_'+band], phot['coord_dec_'+band],
+                                              ebvFilename)
+            ext_vals = extinction_corr(phot, patchBands, ebvTable=ebvTable)
+            chunks.append(tuple(np.asarray(phot[f'base_PsfFlux_mag_{band}'] - ext_vals[f'A_{band}'])
+                                for band in ('g', 'r', 'i')))
+
+        if ebvTable is not ebvTableRead:
+            os.makedirs(self.config.ebvTableDir, exist_ok=True)
+            ebvTable.write(ebvFilename)
+
+        if len(chunks) == 0:
+            return Struct(measurement=Measurement(metric_name, np.nan*u.mmag))
+        fit = stellarLocusResidStreaming(chunks)
+
+        if fit.count > 2:
+            p2_rms = fit.p2Stats.rms*u.mag
+            extras = {'p1_coeffs': Datum(fit.p1Coeffs*u.Unit(''), label='p1_coefficients',
+                                         description='p1 coeffs from wPerp fit'),
+                      'p2_coeffs': Datum(fit.p2Coeffs*u.Unit(''), label='p2_coefficients',
+                                         description='p2_coeffs from wPerp fit')}
+            if self.config.nBootstrap > 0:
+                extras.update(self.bootstrapExtras(*[np.concatenate(mags) for mags in zip(*chunks)]))
+
+            return Struct(measurement=Measurement(metric_name, p2_rms.to(u.mmag), extras=extras))
+        else:
+            return Struct(measurement=Measurement(metric_name, np.nan*u.mmag))
+
+    def bootstrapExtras(self, gmags, rmags, imags):
+        """Bootstrap the wPerp uncertainty and return it as measurement extras.
+        """
+        p2_rms = stellarLocusBootstrap(gmags, rmags, imags, nBoot=self.config.nBootstrap,
+                                       randomSeed=self.config.bootstrapSeed,
+                                       chunkSize=self.config.bootstrapChunkSize,
+                                       nProcesses=self.config.bootstrapProcesses)*u.mag
+        return {'wPerp_err': Datum(np.std(p2_rms, ddof=1).to(u.mmag), label='wPerp_err',
+                                   description='bootstrap standard deviation of wPerp'),
+                'nBootstrap': Datum(self.config.nBootstrap*u.count, label='nBootstrap',
+                                    description='number of bootstrap resamples')}
+
     def calc_wPerp(self, phot, extinction_vals, metric_name):
-        p1, p2, p1coeffs, p2coeffs = stellarLocusResid(phot['base_PsfFlux_mag_g']-extinction_vals['A_g'],
-                                                       phot['base_PsfFlux_mag_r']-extinction_vals['A_r'],
-                                                       phot['base_PsfFlux_mag_i']-extinction_vals['A_i'])
+        gmags = phot['base_PsfFlux_mag_g']-extinction_vals['A_g']
+        rmags = phot['base_PsfFlux_mag_r']-extinction_vals['A_r']
+        imags = phot['base_PsfFlux_mag_i']-extinction_vals['A_i']
+        p1, p2, p1coeffs, p2coeffs = stellarLocusResid(gmags, rmags, imags)
 
         if np.size(p2) > 2:
             p2_rms = calcQuartileClippedStats(p2).rms*u.mag
@@ -47,6 +206,8 @@ class WPerpTask(Task):
                                          description='p1 coeffs from wPerp fit'),
                       'p2_coeffs': Datum(p2coeffs*u.Unit(''), label='p2_coefficients',
                                          description='p2_coeffs from wPerp fit')}
+            if self.config.nBootstrap > 0:
+                extras.update(self.bootstrapExtras(gmags, rmags, imags))
 
             return Struct(measurement=Measurement(metric_name, p2_rms.to(u.mmag), extras=extras))
         else:
@@ -7,6 +7,7 @@ from lsst.verify import Measurement
 class StarFracTask(Task):
     ConfigClass = Config
     _DefaultName = "starFracTask"
+    requiredColumns = ('base_ClassificationExtendedness_value', 'base_ClassificationExtendedness_flag')
 
     def run(self, catalog, metric_name, vIds):
         self.log.info(f"Measuring {metric_name}")
@@ -1,7 +1,5 @@
-import traceback
-
 import lsst.pipe.base as pipeBase
-from lsst.verify.tasks import MetricConnections, MetricComputationError
+from lsst.verify.tasks import MetricConnections
 
 from lsst.faro.base.CatalogsAnalysisBase import CatalogAnalysisBaseTaskConfig, CatalogAnalysisBaseTask
 
@@ -16,7 +14,8 @@ class MatchedCatalogAnalysisTaskConnections(MetricConnections,
                                          dimensions=("tract", "patch", "instrument",
                                                      "band"),
                                          storageClass="SimpleCatalog",
-                                         name="matchedCatalog")
+                                         name="matchedCatalog",
+                                         deferLoad=True)
     measurement = pipeBase.connectionTypes.Output(doc="Resulting matched catalog.",
                                                   dimensions=("tract", "patch",
                                                               "instrument", "band"),
@@ -41,7 +40,8 @@ class MatchedCatalogTractAnalysisTaskConnections(MatchedCatalogAnalysisTaskConne
                                          dimensions=("tract", "instrument",
                                                      "band"),
                                          storageClass="SimpleCatalog",
-                                         name="matchedCatalogTract")
+                                         name="matchedCatalogTract",
+                                         deferLoad=True)
     measurement = pipeBase.connectionTypes.Output(doc="Resulting matched catalog.",
                                                   dimensions=("tract",
                                                               "instrument", "band"),
@@ -65,7 +65,8 @@ class MatchedMultiCatalogAnalysisTaskConnections(MetricConnections,
     cat = pipeBase.connectionTypes.Input(doc="Input matched catalog.",
                                          dimensions=("tract", "patch", "instrument"),
                                          storageClass="SimpleCatalog",
-                                         name="matchedCatalogMulti")
+                                         name="matchedCatalogMulti",
+                                         deferLoad=True)
     measurement = pipeBase.connectionTypes.Output(doc="Resulting matched catalog.",
                                                   dimensions=("tract", "patch",
                                                               "instrument", "band"),
@@ -85,26 +86,6 @@ class MatchedMultiCatalogAnalysisTask(CatalogAnalysisBaseTask):
     def run(self, cat, in_id, out_id):
         return self.measure.run(cat, self.config.connections.metric, in_id, out_id)
 
-    def runQuantum(self, butlerQC, inputRefs, outputRefs):
-        """Do Butler I/O to provide in-memory objects for run.
-        This specialization of runQuantum performs error-handling specific to
-        MetricTasks. Most or all of this functionality may be moved to
-        activators in the future.
-        """
-        try:
-            in_id = butlerQC.registry.expandDataId(inputRefs.cat.dataId)
-            out_id = butlerQC.registry.expandDataId(outputRefs.measurement.dataId)
-            inputs = butlerQC.get(inputRefs)
-            inputs['in_id'] = in_id
-            inputs['out_id'] = out_id
-            outputs = self.run(**inputs)
-            if outputs.measurement is not None:
-                butlerQC.put(outputs, outputRefs)
-            else:
-                self.log.debugf("Skipping measurement of {!r} on {} "
-                                "as not applicable.", self, inputRefs)
-        except MetricComputationError:
-            # Apparently lsst.log doesn't have built-in exception support?
-            self.log.errorf(
-                "Measurement of {!r} failed on {}->{}\n{}",
-                self, inputRefs, outputRefs, traceback.format_exc())
+    def getDataIdInputs(self, butlerQC, inputRefs, outputRefs):
+        return {'in_id': butlerQC.registry.expandDataId(inputRefs.cat.dataId),
+                'out_id': butlerQC.registry.expandDataId(outputRefs.measurement.dataId)}
@@ -12,7 +12,8 @@ class PatchAnalysisTaskConnections(MetricConnections,
                                          dimensions=("tract", "patch", "skymap",
                                                      "band"),
                                          storageClass="SourceCatalog",
-                                         name="deepCoadd_forced_src")
+                                         name="deepCoadd_forced_src",
+                                         deferLoad=True)
 
     measurement = pipeBase.connectionTypes.Output(doc="Per-patch measurement.",
                                                   dimensions=("tract", "patch", "skymap",
@@ -34,12 +35,5 @@ class PatchAnalysisTask(CatalogAnalysisBaseTask):
     def run(self, cat, vIds):
         return self.measure.run(cat, self.config.connections.metric, vIds)
 
-    def runQuantum(self, butlerQC, inputRefs, outputRefs):
-        inputs = butlerQC.get(inputRefs)
-        inputs['vIds'] = inputRefs.cat.dataId
-        outputs = self.run(**inputs)
-        if outputs.measurement is not None:
-            butlerQC.put(outputs, outputRefs)
-        else:
-            self.log.debugf("Skipping measurement of {!r} on {} "
-                            "as not applicable.", self, inputRefs)
+    def getDataIdInputs(self, butlerQC, inputRefs, outputRefs):
+        return {'vIds': inputRefs.cat.dataId}
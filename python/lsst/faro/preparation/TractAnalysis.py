@@ -14,7 +14,8 @@ class TractAnalysisTaskConnections(MetricConnections,
                                          dimensions=("tract", "skymap",
                                                      "band"),
                                          storageClass="SourceCatalog",
-                                         name="deepCoadd_forced_src")
+                                         name="deepCoadd_forced_src",
+                                         deferLoad=True)
 
     photo_calibs = pipeBase.connectionTypes.Input(doc="Photometric calibration object.",
                                                   dimensions=("tract", "skymap",
@@ -43,15 +44,8 @@ class TractAnalysisTask(CatalogAnalysisBaseTask):
     def run(self, cat, photo_calibs, vIds):
         return self.measure.run(cat, photo_calibs, self.config.connections.metric, vIds)
 
-    def runQuantum(self, butlerQC, inputRefs, outputRefs):
-        inputs = butlerQC.get(inputRefs)
-        inputs['vIds'] = [butlerQC.registry.expandDataId(el.dataId) for el in inputRefs.cat]
-        outputs = self.run(**inputs)
-        if outputs.measurement is not None:
-            butlerQC.put(outputs, outputRefs)
-        else:
-            self.log.debugf("Skipping measurement of {!r} on {} "
-                            "as not applicable.", self, inputRefs)
+    def getDataIdInputs(self, butlerQC, inputRefs, outputRefs):
+        return {'vIds': [butlerQC.registry.expandDataId(el.dataId) for el in inputRefs.cat]}
 
 
 class TractAnalysisMultiFiltTaskConnections(TractAnalysisTaskConnections,
@@ -64,7 +58,8 @@ class TractAnalysisMultiFiltTaskConnections(TractAnalysisTaskConnections,
                                                      "band"),
                                          storageClass="SourceCatalog",
                                          name="deepCoadd_forced_src",
-                                         multiple=True)
+                                         multiple=True,
+                                         deferLoad=True)
 
     photo_calibs = pipeBase.connectionTypes.Input(doc="Photometric calibration object.",
                                                   dimensions=("tract", "skymap",
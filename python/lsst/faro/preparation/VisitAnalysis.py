@@ -1,8 +1,10 @@
 import lsst.pipe.base as pipeBase
+import lsst.pex.config as pexConfig
 from lsst.verify.tasks import MetricConnections
 from lsst.afw.table import SourceCatalog
 
 from lsst.faro.base.CatalogsAnalysisBase import CatalogAnalysisBaseTaskConfig, CatalogAnalysisBaseTask
+from lsst.faro.utils.catalog_view import MultiCatalogView
 
 
 # The first thing to do is to define a Connections class. This will define all
@@ -15,7 +17,8 @@ class VisitAnalysisTaskConnections(MetricConnections,
                                                                  "detector", "band"),
                                                      storageClass="SourceCatalog",
                                                      name="src",
-                                                     multiple=True)
+                                                     multiple=True,
+                                                     deferLoad=True)
 
     measurement = pipeBase.connectionTypes.Output(doc="Per-visit measurement.",
                                                   dimensions=("instrument", "visit", "band"),
@@ -25,15 +28,24 @@ class VisitAnalysisTaskConnections(MetricConnections,
 
 class VisitAnalysisTaskConfig(CatalogAnalysisBaseTaskConfig,
                               pipelineConnections=VisitAnalysisTaskConnections):
-    pass
+    doConcatenate = pexConfig.Field(
+        dtype=bool, default=False,
+        doc="Concatenate the detector catalogs into a single SourceCatalog before measuring. "
+            "By default the measure task receives a MultiCatalogView of the detector catalogs, "
+            "which supports len, iteration and column access without copying; set this for "
+            "measure tasks that need a real SourceCatalog.")
 
 
 class VisitAnalysisTask(CatalogAnalysisBaseTask):
     ConfigClass = VisitAnalysisTaskConfig
     _DefaultName = "visitAnalysisTask"
+    catalogConnection = 'source_catalogs'
 
     def run(self, source_catalogs, vIds):
 
+        if not self.config.doConcatenate:
+            return self.measure.run(MultiCatalogView(source_catalogs), self.config.connections.metric, vIds)
+
         # Concatenate catalogs
         schema = source_catalogs[0].schema
         size = sum([len(cat) for cat in source_catalogs])
@@ -44,12 +56,11 @@ class VisitAnalysisTask(CatalogAnalysisBaseTask):
 
         return self.measure.run(source_catalog, self.config.connections.metric, vIds)
 
-    def runQuantum(self, butlerQC, inputRefs, outputRefs):
-        inputs = butlerQC.get(inputRefs)
-        inputs['vIds'] = [butlerQC.registry.expandDataId(el.dataId) for el in inputRefs.source_catalogs]
-        outputs = self.run(**inputs)
-        if outputs.measurement is not None:
-            butlerQC.put(outputs, outputRefs)
-        else:
-            self.log.debugf("Skipping measurement of {!r} on {} "
-                            "as not applicable.", self, inputRefs)
+    def loadCatalog(self, handle):
+        if self.config.doConcatenate:
+            # The full detector catalogs are concatenated in run.
+            return [h.get() for h in handle]
+        return super().loadCatalog(handle)
+
+    def getDataIdInputs(self, butlerQC, inputRefs, outputRefs):
+        return {'vIds': [butlerQC.registry.expandDataId(el.dataId) for el in inputRefs.source_catalogs]}
@@ -1,9 +1,13 @@
+import itertools
+import re
+from concurrent.futures import ThreadPoolExecutor
+
 from lsst.verify import Job, MetricSet
 from lsst.daf.butler import Butler
 
 
 class JobReporter:
-    def __init__(self, repository, collection, metrics_package, spec, dataset_name):
+    def __init__(self, repository, collection, metrics_package, spec, dataset_name, max_workers=1):
         # Hard coding verify_metrics as the packager for now.
         # It would be easy to pass this in as an argument, if necessary.
         self.metrics = MetricSet.load_metrics_package(package_name_or_path='verify_metrics',
@@ -13,35 +17,95 @@ class JobReporter:
         self.spec = spec
         self.collection = collection
         self.dataset_name = dataset_name
+        self.metric_names = {f'metricvalue_{metric.package}_{metric.metric}': metric
+                             for metric in self.metrics}
+        # Number of threads used to read measurements from the butler.
+        self.max_workers = max_workers
+        # Physical filter of each (instrument, band), filled on first use.
+        self._physical_filters = {}
 
     def run(self):
-        jobs = {}
-        for metric in self.metrics:
-            data_ids = list(self.registry.queryDatasets((f'metricvalue_{metric.package}'
-                                                         f'_{metric.metric}'),
-                            collections=self.collection))
-            for did in data_ids:
-                m = self.butler.get(did, collections=self.collection)
-                # make the name the same as what SQuaSH Expects
-                m.metric_name = metric
-                # Grab the physical filter associated with the abstract filter
-                # In general there may be more than one.  Take the shortest assuming
-                # it is the most generic.
-                pfilts = [el.name for el in self.butler.registry.queryDimensionRecords('physical_filter',
-                                                                                       dataId=did.dataId)]
-                pfilt = min(pfilts, key=len)
-
-                tract = did.dataId['tract']
-                afilt = did.dataId['band']
-                key = f"{tract}_{afilt}"
-                if key not in jobs.keys():
-                    job_metadata = {'instrument': did.dataId['instrument'],
-                                    'filter': pfilt,
-                                    'band': afilt,
-                                    'tract': tract,
-                                    'butler_generation': 'Gen3',
-                                    'ci_dataset': self.dataset_name}
-                    # Get dataset_repo_url from repository somehow?
-                    jobs[key] = Job(meta=job_metadata, metrics=self.metrics)
-                jobs[key].measurements.insert(m)
-        return jobs
+        return dict(self.run_iter())
+
+    def run_iter(self):
+        """Assemble the jobs one at a time.
+
+        Measurements are read and inserted into a job only when that job is
+        reached, so at most one job is held in memory.
+
+        Yields
+        ------
+        key : `str`
+            The ``{tract}_{band}`` key of the job.
+        job : `lsst.verify.Job`
+            The job holding every measurement for that tract and band.
+        """
+        refs = self.query_refs()
+        executor = ThreadPoolExecutor(max_workers=self.max_workers) if self.max_workers > 1 else None
+        try:
+            # The refs are sorted by tract and band, so each job's refs are
+            # contiguous.
+            for (tract, afilt), group in itertools.groupby(refs, key=self.job_key):
+                group = list(group)
+                if executor is not None:
+                    measurements = executor.map(self.get_measurement, group)
+                else:
+                    measurements = map(self.get_measurement, group)
+                instrument = group[0].dataId['instrument']
+                job_metadata = {'instrument': instrument,
+                                'filter': self.physical_filter(instrument, afilt),
+                                'band': afilt,
+                                'tract': tract,
+                                'butler_generation': 'Gen3',
+                                'ci_dataset': self.dataset_name}
+                # Get dataset_repo_url from repository somehow?
+                job = Job(meta=job_metadata, metrics=self.metrics)
+                for m in measurements:
+                    job.measurements.insert(m)
+                yield f"{tract}_{afilt}", job
+        finally:
+            if executor is not None:
+                executor.shutdown()
+
+    def query_refs(self):
+        """Find the measurements of every metric in a single registry query.
+
+        Returns
+        -------
+        refs : `list` of `lsst.daf.butler.DatasetRef`
+            References to the measurements, sorted by tract, band, dataset
+            type and data ID so that the jobs are always assembled in the
+            same order.
+        """
+        # Only query dataset types that exist in the repository; metrics
+        # that were never computed have nothing to report.
+        registered = [dataset_type.name for dataset_type
+                      in self.registry.queryDatasetTypes(re.compile('^metricvalue_'))
+                      if dataset_type.name in self.metric_names]
+        if not registered:
+            return []
+        refs = set(self.registry.queryDatasets(registered, collections=self.collection))
+        return sorted(refs, key=lambda ref: (ref.dataId['tract'], ref.dataId['band'],
+                                             ref.datasetType.name, str(ref.dataId)))
+
+    @staticmethod
+    def job_key(ref):
+        return ref.dataId['tract'], ref.dataId['band']
+
+    def get_measurement(self, ref):
+        m = self.butler.get(ref, collections=self.collection)
+        # make the name the same as what SQuaSH Expects
+        m.metric_name = self.metric_names[ref.datasetType.name]
+        return m
+
+    def physical_filter(self, instrument, band):
+        # Grab the physical filter associated with the abstract filter
+        # In general there may be more than one.  Take the shortest assuming
+        # it is the most generic.
+        key = (instrument, band)
+        if key not in self._physical_filters:
+            pfilts = [el.name for el in self.registry.queryDimensionRecords('physical_filter',
+                                                                            dataId={'instrument': instrument,
+                                                                                    'band': band})]
+            self._physical_filters[key] = min(pfilts, key=len)
+        return self._physical_filters[key]
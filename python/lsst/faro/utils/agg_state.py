@@ -0,0 +1,148 @@
+import json
+import os
+import tempfile
+
+import numpy as np
+
+from lsst.pipe.base import Struct
+from lsst.faro.utils.quantile_sketch import makeTDigest, mergeTDigests, tdigestQuantile
+
+# Statistics that aggStateSummary computes from a state.
+aggStateStatistics = ('mean', 'std', 'var', 'min', 'max', 'sum', 'count', 'median')
+
+
+def makeAggState(unit):
+    """Create an empty incremental aggregation state.
+
+    Parameters
+    ----------
+    unit : `str`
+        Unit of the aggregated values, as a string.
+
+    Returns
+    -------
+    state : `dict`
+        JSON-serializable state, with the keys of the inputs already folded
+        in, the running count, mean, sum of squared deviations, minimum and
+        maximum, and a t-digest of the values.
+    """
+    return {'unit': unit, 'seen': [], 'count': 0, 'mean': 0., 'm2': 0.,
+            'min': None, 'max': None,
+            'sketch': {'means': [], 'weights': [], 'minimum': None, 'maximum': None}}
+
+
+def updateAggState(state, keys, values, compression=100):
+    """Fold new values into an incremental aggregation state.
+
+    Parameters
+    ----------
+    state : `dict`
+        State from `makeAggState` or `readAggState`; updated in place.
+    keys : `list` of `str`
+        Identifiers of the new inputs; they are recorded so that later
+        invocations can skip them.
+    values : `numpy.ndarray` of `float`
+        Finite values of the new inputs, in ``state['unit']``.
+    compression : `float`, optional
+        Compression parameter of the t-digest.
+
+    Returns
+    -------
+    state : `dict`
+        The updated state.
+    """
+    state['seen'].extend(keys)
+    values = np.asarray(values, dtype=float)
+    if len(values) == 0:
+        return state
+
+    # Combine the running moments with those of the new values (Chan et al.).
+    count = len(values)
+    mean = np.mean(values)
+    m2 = np.sum((values - mean)**2)
+    total = state['count'] + count
+    delta = mean - state['mean']
+    state['mean'] = state['mean'] + delta*count/total
+    state['m2'] = state['m2'] + m2 + delta**2*state['count']*count/total
+    state['count'] = total
+    state['min'] = float(np.min(values) if state['min'] is None else min(state['min'], np.min(values)))
+    state['max'] = float(np.max(values) if state['max'] is None else max(state['max'], np.max(values)))
+
+    sketch = state['sketch']
+    digests = [makeTDigest(values, compression=compression)]
+    if sketch['weights']:
+        digests.append(Struct(means=np.array(sketch['means']), weights=np.array(sketch['weights']),
+                              minimum=sketch['minimum'], maximum=sketch['maximum']))
+    digest = mergeTDigests(digests, compression=compression)
+    state['sketch'] = {'means': digest.means.tolist(), 'weights': digest.weights.tolist(),
+                       'minimum': float(digest.minimum), 'maximum': float(digest.maximum)}
+    return state
+
+
+def aggStateSummary(state, agg):
+    """Compute a summary statistic from an incremental aggregation state.
+
+    Parameters
+    ----------
+    state : `dict`
+        State from `updateAggState`.
+    agg : `str`
+        One of ``mean``, ``std``, ``var``, ``min``, ``max``, ``sum``,
+        ``count`` or ``median``.  The median comes from the t-digest and is
+        approximate; ``std`` and ``var`` are population statistics, as from
+        `numpy.std` and `numpy.var`.
+
+    Returns
+    -------
+    value : `float`
+        The statistic; NaN if no values have been folded in.
+    """
+    count = state['count']
+    if agg == 'count':
+        return float(count)
+    if count == 0:
+        return np.nan
+    if agg == 'mean':
+        return state['mean']
+    if agg == 'var':
+        return state['m2']/count
+    if agg == 'std':
+        return np.sqrt(state['m2']/count)
+    if agg == 'sum':
+        return state['mean']*count
+    if agg in ('min', 'max'):
+        return state[agg]
+    if agg == 'median':
+        sketch = state['sketch']
+        digest = Struct(means=np.array(sketch['means']), weights=np.array(sketch['weights']),
+                        minimum=sketch['minimum'], maximum=sketch['maximum'])
+        return float(tdigestQuantile(digest, 0.5))
+    raise ValueError(f"Aggregation {agg} is not supported in incremental mode.")
+
+
+def readAggState(filename):
+    """Read a state written by `writeAggState`; None if the file does not
+    exist.
+    """
+    if not os.path.exists(filename):
+        return None
+    with open(filename) as f:
+        return json.load(f)
+
+
+def writeAggState(state, filename):
+    """Write a state to a JSON file.
+
+    The file is written under a temporary name and renamed into place, so
+    concurrent readers never see a partially written state.
+    """
+    directory = os.path.dirname(os.path.abspath(filename))
+    os.makedirs(directory, exist_ok=True)
+    fd, tmpName = tempfile.mkstemp(dir=directory, suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'w') as f:
+            json.dump(state, f)
+        os.replace(tmpName, filename)
+    except BaseException:
+        os.unlink(tmpName)
+        raise
@@ -0,0 +1,253 @@
+import itertools
+
+import numpy as np
+
+
+class MultiCatalogView:
+    """Read-only view of several catalogs sharing a schema, as if they were
+    concatenated.
+
+    Length, iteration and record access go through to the underlying
+    catalogs without copying them.  Column access concatenates only the
+    requested column, and a full concatenated catalog is built only on an
+    explicit ``copy``.
+
+    Parameters
+    ----------
+    catalogs : `list` of `lsst.afw.table.SourceCatalog`
+        Catalogs to view, e.g. the per-detector catalogs of one visit.  They
+        must all share the same schema.
+    """
+
+    def __init__(self, catalogs):
+        self._catalogs = list(catalogs)
+        if len(self._catalogs) == 0:
+            raise ValueError("MultiCatalogView needs at least one catalog.")
+        self._offsets = np.cumsum([0] + [len(cat) for cat in self._catalogs])
+
+    @property
+    def schema(self):
+        return self._catalogs[0].schema
+
+    @property
+    def catalogs(self):
+        """The underlying catalogs (`list`)."""
+        return self._catalogs
+
+    def __len__(self):
+        return int(self._offsets[-1])
+
+    def __iter__(self):
+        return itertools.chain.from_iterable(self._catalogs)
+
+    def __getitem__(self, key):
+        if isinstance(key, (int, np.integer)):
+            index = key + len(self) if key < 0 else key
+            if index < 0 or index >= len(self):
+                raise IndexError(f"Index {key} out of range for view of length {len(self)}")
+            which = np.searchsorted(self._offsets, index, side='right') - 1
+            return self._catalogs[which][int(index - self._offsets[which])]
+        return self.get(key)
+
+    def get(self, key):
+        """Return one column of the concatenated catalogs.
+
+        Parameters
+        ----------
+        key : `str` or `lsst.afw.table.Key`
+            Field name or key.
+
+        Returns
+        -------
+        column : `numpy.ndarray`
+            The column values of every catalog, in order.
+        """
+        columns = []
+        for cat in self._catalogs:
+            if not cat.isContiguous():
+                cat = cat.copy(deep=True)
+            columns.append(cat.get(key))
+        return np.concatenate(columns)
+
+    def isContiguous(self):
+        """Return `True`: columns can always be read with `get`, even though
+        the records are not stored in a single block of memory.
+        """
+        return True
+
+    def copy(self, deep=False):
+        """Concatenate the viewed catalogs into a single new catalog.
+
+        Parameters
+        ----------
+        deep : `bool`, optional
+            If `True`, copy the records; otherwise the new catalog shares them
+            with the viewed catalogs.
+
+        Returns
+        -------
+        catalog : `lsst.afw.table.SourceCatalog`
+            The concatenated catalog, of the same type as the first viewed
+            catalog.
+        """
+        catalog = type(self._catalogs[0])(self.schema)
+        catalog.reserve(len(self))
+        for cat in self._catalogs:
+            catalog.extend(cat, deep=deep)
+        return catalog
+
+
+class RowCountCatalog:
+    """Stand-in for a catalog whose length is all that is needed.
+
+    Parameters
+    ----------
+    length : `int`
+        Number of rows in the catalog.
+    """
+
+    def __init__(self, length):
+        self._length = int(length)
+
+    def __len__(self):
+        return self._length
+
+
+def readRowCount(handle):
+    """Return the number of rows of a catalog without reading its records.
+
+    Parameters
+    ----------
+    handle : `lsst.daf.butler.DeferredDatasetHandle`
+        Handle to an `lsst.afw.table` catalog dataset.
+
+    Returns
+    -------
+    length : `int`
+        Number of rows, from the ``NAXIS2`` header keyword of the binary
+        table HDU of a local FITS file.  Datasets that are not local FITS
+        files are read in full.
+    """
+    from astropy.io import fits
+
+    path = _localFitsPath(handle)
+    if path is not None:
+        try:
+            return fits.getheader(path, 1)['NAXIS2']
+        except (KeyError, IndexError, OSError):
+            pass
+    return len(handle.get())
+
+
+def readCatalog(handle, columns=None):
+    """Read a catalog, keeping only the columns a measurement needs where
+    that saves memory.
+
+    Parameters
+    ----------
+    handle : `lsst.daf.butler.DeferredDatasetHandle`
+        Handle to an `lsst.afw.table` catalog dataset.
+    columns : iterable of `str`, optional
+        Names (or aliases) of the fields to keep, in addition to the minimal
+        schema of the catalog type; see `projectCatalog`.  If `None`, the
+        full catalog is returned.
+
+    Returns
+    -------
+    catalog : `lsst.afw.table.BaseCatalog`
+        The catalog; it may have more than the requested columns.
+
+    Notes
+    -----
+    When columns are given, `~lsst.afw.table.SourceCatalog` datasets stored
+    as local FITS files are read without their footprints, which are
+    usually the largest part of a ``src`` file, and projected onto the
+    columns.  The FITS binary tables of `lsst.afw.table` are stored row by
+    row and cannot be read column by column, so other datasets, such as the
+    ``SimpleCatalog`` matched catalogs, are returned in full: projecting
+    them would not read any less, and would only add a copy to the peak
+    memory.
+    """
+    if columns is None:
+        return handle.get()
+
+    from lsst.afw.table import SourceCatalog, SOURCE_IO_NO_FOOTPRINTS
+
+    path = _localFitsPath(handle)
+    if path is not None and handle.ref.datasetType.storageClass.name == 'SourceCatalog':
+        catalog = SourceCatalog.readFits(path, flags=SOURCE_IO_NO_FOOTPRINTS)
+        return projectCatalog(catalog, columns)
+    return handle.get()
+
+
+def projectCatalog(catalog, columns):
+    """Copy a catalog, keeping only some of its columns.
+
+    Parameters
+    ----------
+    catalog : `lsst.afw.table.BaseCatalog`
+        Catalog to project.
+    columns : iterable of `str`
+        Names of the fields to keep.  Aliases are resolved, and the alias map
+        is copied, so aliased names such as ``slot_PsfFlux_mag`` still work
+        on the projected catalog.  The fields of the minimal schema of the
+        catalog type (e.g. ``id``, ``coord_ra`` and ``coord_dec``) are always
+        kept; names missing from the catalog are ignored.
+
+    Returns
+    -------
+    projected : `lsst.afw.table.BaseCatalog`
+        A contiguous catalog of the same type with only the requested
+        columns, in the same row order.
+    """
+    from lsst.afw.table import SchemaMapper
+
+    schema = catalog.schema
+    mapper = SchemaMapper(schema)
+    mapper.addMinimalSchema(type(catalog.getTable()).makeMinimalSchema(), True)
+    names = set(mapper.getOutputSchema().getNames())
+    for column in columns:
+        try:
+            item = schema.find(column)
+        except KeyError:
+            continue
+        if item.field.getName() not in names:
+            mapper.addMapping(item.key)
+            names.add(item.field.getName())
+    mapper.editOutputSchema().setAliasMap(schema.getAliasMap())
+
+    projected = type(catalog)(mapper.getOutputSchema())
+    projected.reserve(len(catalog))
+    projected.extend(catalog, mapper=mapper)
+    return projected
+
+
+def _localFitsPath(handle):
+    """Return the local path of a FITS dataset, or `None`."""
+    path = localDatasetPath(handle)
+    if path is not None and '.fits' in path:
+        return path
+    return None
+
+
+def localDatasetPath(handle):
+    """Return the path of a dataset stored in a local file.
+
+    Parameters
+    ----------
+    handle : `lsst.daf.butler.DeferredDatasetHandle`
+        Handle to the dataset.
+
+    Returns
+    -------
+    path : `str` or `None`
+        The local path, or `None` if the dataset is not stored in a local
+        file.
+    """
+    try:
+        uri = handle.butler.getURI(handle.ref)
+    except (AttributeError, LookupError, ValueError):
+        return None
+    if getattr(uri, 'isLocal', False):
+        return uri.ospath
+    return None
@@ -1,11 +1,55 @@
+import time
+
 import numpy as np
 from lsst.afw.table import GroupView
 
+# Catalog fields read by filterMatches with its default arguments, in addition
+# to the minimal schema (id and coordinates).
+filterMatchesColumns = ('object', 'slot_PsfFlux_mag', 'base_PsfFlux_snr',
+                        'base_ClassificationExtendedness_value',
+                        'base_PixelFlags_flag_saturated', 'base_PixelFlags_flag_cr',
+                        'base_PixelFlags_flag_bad', 'base_PixelFlags_flag_edge',
+                        'detect_isPrimary')
+
 
 def filterMatches(matchedCatalog, snrMin=None, snrMax=None,
                   extended=None, doFlags=None, isPrimary=None,
                   psfStars=None, photoCalibStars=None,
-                  astromCalibStars=None):
+                  astromCalibStars=None, stats=None, adaptiveOrder=False):
+    """Select the groups of a matched catalog passing all selection
+    criteria.
+
+    Parameters
+    ----------
+    matchedCatalog : `lsst.afw.table.SimpleCatalog`
+        Matched catalog, sorted by ``object``.
+    snrMin, snrMax : `float`, optional
+        Range of the median PSF flux SNR of a group.
+    extended : `bool`, optional
+        Select extended (`True`) or point-like (`False`) objects.
+    doFlags : `bool`, optional
+        Reject groups with any pixel flag set.
+    isPrimary : `bool`, optional
+        Reject groups with any observation that is not primary.
+    psfStars, photoCalibStars, astromCalibStars : `bool`, optional
+        Not used.
+    stats : `dict`, optional
+        If given, filled with one entry per criterion (``nMatch``, ``snr``,
+        ``ptsrc``, ``flag`` and ``isPrimary``), each a `dict` with the
+        number of groups ``evaluated`` and ``rejected`` by the criterion and
+        the ``time`` spent evaluating it [s]; see `filterStatsToMetadata`.
+    adaptiveOrder : `bool`, optional
+        If `True`, evaluate every criterion on the first
+        ``adaptiveSampleSize`` groups, then evaluate the criteria in order
+        of increasing cost per rejected group, so that most groups are
+        rejected by a cheap criterion.  The selection does not depend on
+        the order.
+
+    Returns
+    -------
+    filtered : `lsst.afw.table.GroupView`
+        The groups passing all criteria.
+    """
 
     if snrMin is None:
         snrMin = 50.0
@@ -70,4 +114,88 @@ def filterMatches(matchedCatalog, snrMin=None, snrMax=None,
         return nMatchFilter(cat) and snrFilter(cat) and ptsrcFilter(cat)\
             and flagFilter(cat) and isPrimaryFilter(cat)
 
-    return matchedCat.where(fullFilter)
+    if stats is None and not adaptiveOrder:
+        return matchedCat.where(fullFilter)
+
+    criteria = [('nMatch', nMatchFilter), ('snr', snrFilter), ('ptsrc', ptsrcFilter)]
+    if doFlags:
+        criteria.append(('flag', flagFilter))
+    if isPrimary:
+        criteria.append(('isPrimary', isPrimaryFilter))
+    return matchedCat.where(_CountingFilter(criteria, stats, adaptiveOrder))
+
+
+# Number of groups on which every criterion is evaluated before filterMatches
+# reorders them when adaptiveOrder is set.
+adaptiveSampleSize = 200
+
+
+class _CountingFilter:
+    """Conjunction of selection criteria that counts how many groups each
+    criterion evaluates and rejects, and how long it takes.
+
+    Parameters
+    ----------
+    criteria : `list` [`tuple` [`str`, callable]]
+        Names and predicates of the criteria, in their default order.
+    stats : `dict` or `None`
+        Dictionary to fill with the counts of each criterion.
+    adaptiveOrder : `bool`
+        Reorder the criteria by cost per rejection after
+        ``adaptiveSampleSize`` groups.
+    """
+
+    def __init__(self, criteria, stats, adaptiveOrder):
+        self.criteria = list(criteria)
+        self.stats = {} if stats is None else stats
+        for name, _ in self.criteria:
+            self.stats[name] = {'evaluated': 0, 'rejected': 0, 'time': 0.0}
+        # While sampling, every criterion is evaluated, so that the
+        # rejection rates are not biased by the criteria before them.
+        self.nSample = adaptiveSampleSize if adaptiveOrder else 0
+        self.nGroups = 0
+
+    def __call__(self, cat):
+        self.nGroups += 1
+        sampling = self.nGroups <= self.nSample
+        passed = True
+        for name, predicate in self.criteria:
+            record = self.stats[name]
+            start = time.perf_counter()
+            ok = predicate(cat)
+            record['time'] += time.perf_counter() - start
+            record['evaluated'] += 1
+            if not ok:
+                record['rejected'] += 1
+                passed = False
+                if not sampling:
+                    break
+        if self.nGroups == self.nSample:
+            self.reorder()
+        return passed
+
+    def reorder(self):
+        """Sort the criteria by increasing time per rejected group."""
+        def costPerRejection(criterion):
+            record = self.stats[criterion[0]]
+            return record['time']/max(record['rejected'], 0.5)
+        self.criteria.sort(key=costPerRejection)
+
+
+def filterStatsToMetadata(stats, metadata, prefix='filter'):
+    """Add the counts filled in by `filterMatches` to task metadata.
+
+    Parameters
+    ----------
+    stats : `dict`
+        The ``stats`` argument of `filterMatches`.
+    metadata : `lsst.daf.base.PropertyList`
+        Task metadata; the counts are added under
+        ``{prefix}{Criterion}{Evaluated,Rejected,Time}``, e.g.
+        ``filterSnrRejected``.
+    prefix : `str`, optional
+        Prefix of the metadata keys.
+    """
+    for name, record in stats.items():
+        for key, value in record.items():
+            metadata.add(prefix + name[0].upper() + name[1:] + key[0].upper() + key[1:], value)
@@ -0,0 +1,130 @@
+import contextlib
+import resource
+import sys
+import time
+
+import astropy.units as u
+from lsst.verify import Datum
+
+
+def _maxRssBytes():
+    """Return the peak resident set size of this process [bytes]."""
+    maxRss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in kilobytes on Linux but in bytes on macOS.
+    return maxRss if sys.platform == 'darwin' else maxRss*1024
+
+
+class StageTimer:
+    """Record the cost of the named stages of a task.
+
+    For each stage, the wall-clock time, the CPU time, the growth of the
+    peak resident set size and any counts supplied by the caller (e.g. the
+    number of rows or groups processed) are recorded.  A stage entered
+    several times accumulates its times and counts.
+
+    Parameters
+    ----------
+    enabled : `bool`, optional
+        If `False`, `stage` records nothing, so instrumented code costs no
+        more than entering an empty context manager.
+
+    Examples
+    --------
+    >>> timer = StageTimer()
+    >>> with timer.stage('filterMatches', rows=len(catalog)) as stage:
+    ...     filtered = filterMatches(catalog)
+    ...     stage['groups'] = filtered.count
+    >>> timer.toMetadata(task.metadata)
+    """
+
+    def __init__(self, enabled=True):
+        self.enabled = enabled
+        self.stages = {}
+
+    def reset(self):
+        """Forget the stages recorded so far."""
+        self.stages = {}
+
+    @contextlib.contextmanager
+    def stage(self, name, **counts):
+        """Time a stage.
+
+        Parameters
+        ----------
+        name : `str`
+            Name of the stage.
+        **counts
+            Counts to record for the stage.
+
+        Yields
+        ------
+        counts : `dict`
+            Dictionary of the counts of the stage, to which more counts can be
+            added inside the ``with`` block.
+        """
+        if not self.enabled:
+            yield counts
+            return
+        maxRssStart = _maxRssBytes()
+        cpuStart = time.process_time()
+        wallStart = time.perf_counter()
+        try:
+            yield counts
+        finally:
+            record = self.stages.setdefault(name, {'wallTime': 0.0, 'cpuTime': 0.0, 'maxRssDelta': 0})
+            record['wallTime'] += time.perf_counter() - wallStart
+            record['cpuTime'] += time.process_time() - cpuStart
+            record['maxRssDelta'] += _maxRssBytes() - maxRssStart
+            for key, value in counts.items():
+                record[key] = record.get(key, 0) + value
+
+    def toMetadata(self, metadata):
+        """Add the recorded stages to task metadata.
+
+        Parameters
+        ----------
+        metadata : `lsst.daf.base.PropertyList`
+            Task metadata; each value is added under ``{stage}{Quantity}``,
+            e.g. ``filterMatchesWallTime`` [s], ``filterMatchesMaxRssDelta``
+            [bytes] or ``filterMatchesGroups``.
+        """
+        for name, record in self.stages.items():
+            for key, value in record.items():
+                metadata.add(name + key[0].upper() + key[1:], value)
+
+    def toExtras(self):
+        """Return the recorded stages as `lsst.verify.Measurement` extras.
+
+        Returns
+        -------
+        extras : `dict` [`str`, `lsst.verify.Datum`]
+            Extras named ``stage_{stage}_{quantity}``.
+        """
+        units = {'wallTime': u.s, 'cpuTime': u.s, 'maxRssDelta': u.byte}
+        extras = {}
+        for name, record in self.stages.items():
+            for key, value in record.items():
+                extras[f'stage_{name}_{key}'] = Datum(value*units.get(key, u.count),
+                                                      label=f'{name} {key}',
+                                                      description=f'{key} of stage {name}')
+        return extras
+
+
+_disabledTimer = StageTimer(enabled=False)
+
+
+def getStageTimer(task):
+    """Return the `StageTimer` a parent task attached to a subtask.
+
+    Parameters
+    ----------
+    task : `lsst.pipe.base.Task`
+        The task; its ``timer`` attribute is used if it has one.
+
+    Returns
+    -------
+    timer : `StageTimer`
+        The task's timer, or a disabled timer.
+    """
+    timer = getattr(task, 'timer', None)
+    return _disabledTimer if timer is None else timer
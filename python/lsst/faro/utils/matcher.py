@@ -3,11 +3,12 @@ from lsst.afw.table import (SchemaMapper, Field,
                             SourceCatalog, updateSourceCoords)
 
 import numpy as np
-from astropy.table import join, Table
 
 
 def match_catalogs(inputs, photoCalibs, astromCalibs, vIds, matchRadius,
                    apply_external_wcs=False, logger=None):
+    from astropy.table import Table
+
     schema = inputs[0].schema
     mapper = SchemaMapper(schema)
     mapper.addMinimalSchema(schema)
@@ -151,6 +152,7 @@ def ellipticity(i_xx, i_xy, i_yy):
 
 def make_matched_photom(vIds, catalogs, photo_calibs):
     # inputs: vIds, catalogs, photo_calibs
+    from astropy.table import join
 
     # Match all input bands:
     bands = list(set([f['band'] for f in vIds]))
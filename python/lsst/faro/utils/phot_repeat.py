@@ -1,27 +1,36 @@
 import functools
 import math
 import numpy as np
-from scipy.stats import norm
 import astropy.units as u
 
 import lsst.pipe.base as pipeBase
 from lsst.faro.utils.filtermatches import filterMatches
 
+# Minimum number of objects required to calculate the repeatability.
+nMinPhotRepeat = 50
 
-def photRepeat(matchedCatalog, numRandomShuffles=50, randomSeed=None, **filterargs):
+
+def photRepeat(matchedCatalog, numRandomShuffles=50, randomSeed=None, randomStreams='serial',
+               chunkSize=None, executor=None, numProcesses=1, returnMagDiffs=True, streaming=False,
+               histBinWidth=0.1, histMax=500., threshold=None, **filterargs):
     filteredCat = filterMatches(matchedCatalog, **filterargs)
     magKey = filteredCat.schema.find('slot_PsfFlux_mag').key
 
-    # Require at least nMinPhotRepeat objects to calculate the repeatability:
-    nMinPhotRepeat = 50
     if filteredCat.count > nMinPhotRepeat:
-        phot_resid_meas = calcPhotRepeat(filteredCat, magKey, numRandomShuffles=50, randomSeed=randomSeed)
+        phot_resid_meas = calcPhotRepeat(filteredCat, magKey, numRandomShuffles=numRandomShuffles,
+                                         randomSeed=randomSeed, randomStreams=randomStreams,
+                                         chunkSize=chunkSize, executor=executor,
+                                         numProcesses=numProcesses, returnMagDiffs=returnMagDiffs,
+                                         streaming=streaming, histBinWidth=histBinWidth, histMax=histMax,
+                                         threshold=threshold)
         return phot_resid_meas
     else:
         return {'nomeas': np.nan*u.mmag}
 
 
-def calcPhotRepeat(matches, magKey, numRandomShuffles=50, randomSeed=None):
+def calcPhotRepeat(matches, magKey, numRandomShuffles=50, randomSeed=None, randomStreams='serial',
+                   chunkSize=None, executor=None, numProcesses=1, returnMagDiffs=True, streaming=False,
+                   histBinWidth=0.1, histMax=500., threshold=None):
     """Calculate the photometric repeatability of measurements across a set
     of randomly selected pairs of visits.
     Parameters
@@ -39,6 +48,39 @@ def calcPhotRepeat(matches, magKey, numRandomShuffles=50, randomSeed=None):
         Number of times to draw random pairs from the different observations.
     randomSeed : int
         Seed for random number generation when choosing samples.
+    randomStreams : {'serial', 'spawn'}, optional
+        How the random pairs are drawn.  With ``'serial'``, all shuffles draw
+        from a single generator, one object after the other, so the result
+        depends on the order in which everything is computed.  With
+        ``'spawn'``, each shuffle draws from its own stream, spawned from
+        ``randomSeed`` with `numpy.random.SeedSequence`, and the pairs of
+        all objects are drawn at once; see `calcPhotRepeatSpawned`.  The two
+        schemes give statistically equivalent but different samples.
+    chunkSize : int, optional
+        With ``randomStreams='spawn'``, split the objects into chunks of this
+        many and give each shuffle and chunk its own stream.
+    executor : `concurrent.futures.Executor`, optional
+        With ``randomStreams='spawn'``, compute the shuffles with
+        ``executor.map``; the result does not depend on the executor.
+    numProcesses : int, optional
+        With ``randomStreams='spawn'`` and no ``executor``, compute the
+        shuffles in a pool of this many processes; the result does not
+        depend on the number of processes.
+    returnMagDiffs : bool, optional
+        If `False`, ``magDiff`` has no columns; use this when only the
+        widths are needed, in particular with ``numProcesses``.
+    streaming : bool, optional
+        If `True`, reduce the magnitude differences of each shuffle to a
+        histogram of their absolute values as soon as they are computed,
+        instead of keeping them all; see *Notes*.
+    histBinWidth : float, optional
+        With ``streaming``, bin width of the histogram [mmag].
+    histMax : float, optional
+        With ``streaming``, upper edge of the histogram [mmag]; larger
+        absolute differences are kept exactly.
+    threshold : float, optional
+        With ``streaming``, also count the absolute differences larger than
+        this [mmag].
     Returns
     -------
     statistics : `dict`
@@ -55,8 +97,20 @@ def calcPhotRepeat(matches, magKey, numRandomShuffles=50, randomSeed=None):
           between pairs of sources. Shape: ``(nRandomSamples, nMatches)``.
         - ``magMean``: `~astropy.unit.Quantity` array of mean magnitudes of
           each pair of sources. Shape: ``(nRandomSamples, nMatches)``.
+        With ``streaming``, ``magDiff`` and ``magMean`` are replaced by:
+        - ``absMagDiffHist``: `AbsDiffHistogram` of the absolute magnitude
+          differences of all shuffles, in mmag; its ``numAbove`` is the number
+          of them larger than ``threshold``.
     Notes
     -----
+    In streaming mode, memory no longer grows with the number of shuffles
+    times the number of objects.  ``rms``, ``iqr`` and ``repeatability``
+    are the same as in the exact mode, and the fraction of differences
+    larger than ``threshold``, ``absMagDiffHist.numAbove /
+    absMagDiffHist.count``, is the same up to rounding.  Percentiles of the absolute differences from
+    ``absMagDiffHist.percentile`` are within ``histBinWidth`` of
+    `numpy.percentile` of ``abs(magDiff)``.
+
     We calculate differences for ``numRandomShuffles`` different random
     realizations of the measurement pairs, to provide some estimate of the
     uncertainty on our RMS estimates due to the random shuffling.  This
@@ -113,18 +167,190 @@ def calcPhotRepeat(matches, magKey, numRandomShuffles=50, randomSeed=None):
     >>>     return np.isfinite(cat.get(magKey)).all()
     >>> repeat = calcPhotRepeat(allMatches.where(matchFilter), magKey)
     """
-    rng = np.random.default_rng(randomSeed)
-    mprSamples = [calcPhotRepeatSample(matches, magKey, rng=rng)
-                  for _ in range(numRandomShuffles)]
+    reduceMagDiffs = None
+    if streaming:
+        reduceMagDiffs = functools.partial(histogramAbsDiffs, binWidth=histBinWidth, maxValue=histMax,
+                                           threshold=threshold)
+
+    if randomStreams == 'spawn':
+        mprSamples = calcPhotRepeatSpawned(matches, magKey, numRandomShuffles, randomSeed=randomSeed,
+                                           chunkSize=chunkSize, executor=executor,
+                                           numProcesses=numProcesses, returnMagDiffs=returnMagDiffs,
+                                           reduceMagDiffs=reduceMagDiffs)
+    elif randomStreams == 'serial':
+        if numProcesses > 1:
+            raise ValueError("numProcesses > 1 requires randomStreams='spawn'.")
+        rng = np.random.default_rng(randomSeed)
+        if streaming:
+            # Lazily, so that only one shuffle is held at a time.
+            mprSamples = (_reduceSample(calcPhotRepeatSample(matches, magKey, rng=rng), reduceMagDiffs)
+                          for _ in range(numRandomShuffles))
+        else:
+            mprSamples = [calcPhotRepeatSample(matches, magKey, rng=rng)
+                          for _ in range(numRandomShuffles)]
+    else:
+        raise ValueError(f"Unknown randomStreams {randomStreams!r}; use 'serial' or 'spawn'.")
+
+    if streaming:
+        rms = []
+        iqr = []
+        absMagDiffHist = AbsDiffHistogram(histBinWidth, histMax, threshold=threshold)
+        for mpr in mprSamples:
+            rms.append(mpr.rms)
+            iqr.append(mpr.iqr)
+            absMagDiffHist.merge(mpr.magDiffs)
+        iqr = np.array(iqr) * u.mmag
+        return {'rms': np.array(rms) * u.mmag, 'iqr': iqr, 'absMagDiffHist': absMagDiffHist,
+                'repeatability': np.mean(iqr)}
 
     rms = np.array([mpr.rms for mpr in mprSamples]) * u.mmag
     iqr = np.array([mpr.iqr for mpr in mprSamples]) * u.mmag
-    magDiff = np.array([mpr.magDiffs for mpr in mprSamples]) * u.mmag
+    magDiff = np.array([mpr.magDiffs if returnMagDiffs else np.empty(0) for mpr in mprSamples]) * u.mmag
     magMean = np.array([mpr.magMean for mpr in mprSamples]) * u.mag
     repeat = np.mean(iqr)
     return {'rms': rms, 'iqr': iqr, 'magDiff': magDiff, 'magMean': magMean, 'repeatability': repeat}
 
 
+def _reduceSample(sample, reduceMagDiffs):
+    """Replace the magnitude differences of a sample by their reduction."""
+    sample.magDiffs = reduceMagDiffs(sample.magDiffs)
+    sample.magMean = None
+    return sample
+
+
+def photRepeatCurve(matchedCatalog, binEdges, binBy='snr', numRandomShuffles=50, randomSeed=None,
+                    randomStreams='serial', chunkSize=None, executor=None, numProcesses=1, minObjects=10,
+                    brightSnrRange=None, **filterargs):
+    """Compute the photometric repeatability in bins of median SNR or
+    magnitude, filtering the matched catalog once.
+
+    Parameters
+    ----------
+    matchedCatalog : `lsst.afw.table.SimpleCatalog`
+        Matched catalog, sorted by ``object``.
+    binEdges : sequence of `float`
+        Increasing bin edges, in SNR or mag.
+    binBy : {'snr', 'mag'}, optional
+        Bin the objects by their median PSF flux SNR or PSF magnitude.  With
+        ``'snr'``, the SNR range of the curve is that of the bins; with
+        ``'mag'``, it is the ``snrMin`` and ``snrMax`` of ``filterargs``.
+    numRandomShuffles, randomSeed, randomStreams, chunkSize, executor, numProcesses
+        How the random pairs of observations are drawn; see
+        `calcPhotRepeat`.
+    minObjects : int, optional
+        Minimum number of objects for the widths of a bin to be computed.
+    brightSnrRange : `tuple` [`float`, `float`], optional
+        If given, also compute the repeatability of the objects with a median
+        SNR in this range, as `photRepeat` would with the same ``snrMin``
+        and ``snrMax``, but from the same shuffles as the curve.
+    **filterargs
+        Arguments of `filterMatches`.
+
+    Returns
+    -------
+    curve : `dict`
+        See `calcPhotRepeatCurve`.  With ``brightSnrRange``, ``bright`` is
+        the ``rms``, ``iqr`` and ``repeatability`` of the objects in that
+        range, or only ``nomeas`` if there are too few of them.
+
+    Notes
+    -----
+    The catalog is filtered once, with the loosest of the SNR cuts of the
+    curve and of ``brightSnrRange``, and the pairs of all the selected
+    objects are drawn once, so the cost is about that of one `photRepeat`.
+    """
+    snrMin = filterargs.pop('snrMin', None)
+    snrMax = filterargs.pop('snrMax', None)
+    if binBy == 'snr':
+        curveRange = (binEdges[0], binEdges[-1])
+    elif binBy == 'mag':
+        curveRange = (50. if snrMin is None else snrMin, np.Inf if snrMax is None else snrMax)
+    else:
+        raise ValueError(f"Unknown binBy {binBy!r}; use 'snr' or 'mag'.")
+    snrRange = curveRange
+    if brightSnrRange is not None:
+        snrRange = (min(curveRange[0], brightSnrRange[0]), max(curveRange[1], brightSnrRange[1]))
+    filteredCat = filterMatches(matchedCatalog, snrMin=snrRange[0], snrMax=snrRange[1], **filterargs)
+    magKey = filteredCat.schema.find('slot_PsfFlux_mag').key
+    snrKey = filteredCat.schema.find('base_PsfFlux_snr').key
+    # The median SNR as computed by filterMatches.
+    medianSnr = filteredCat.aggregate(lambda snr: np.median(snr[np.isfinite(snr)]), field=snrKey)
+    binValues = medianSnr if binBy == 'snr' else filteredCat.aggregate(np.median, field=magKey)
+
+    if filteredCat.count > 0:
+        magDiffs = calcPhotRepeat(filteredCat, magKey, numRandomShuffles=numRandomShuffles,
+                                  randomSeed=randomSeed, randomStreams=randomStreams, chunkSize=chunkSize,
+                                  executor=executor, numProcesses=numProcesses)['magDiff'].to_value(u.mmag)
+    else:
+        magDiffs = np.empty((numRandomShuffles, 0))
+
+    inCurve = (medianSnr >= curveRange[0]) & (medianSnr <= curveRange[1])
+    curve = calcPhotRepeatCurve(magDiffs[:, inCurve], binValues[inCurve], binEdges, minObjects=minObjects)
+    if brightSnrRange is not None:
+        bright = (medianSnr >= brightSnrRange[0]) & (medianSnr <= brightSnrRange[1])
+        if np.count_nonzero(bright) > nMinPhotRepeat:
+            rms, iqr = np.array([computeWidths(diffs) for diffs in magDiffs[:, bright]]).T*u.mmag
+            curve['bright'] = {'rms': rms, 'iqr': iqr, 'repeatability': np.mean(iqr)}
+        else:
+            curve['bright'] = {'nomeas': np.nan*u.mmag}
+    return curve
+
+
+def calcPhotRepeatCurve(magDiffs, binValues, binEdges, minObjects=10):
+    """Compute the photometric repeatability of several bins of objects
+    from the same shuffles.
+
+    Parameters
+    ----------
+    magDiffs : `numpy.ndarray`
+        Magnitude differences of a random pair of observations of each
+        object in each shuffle [mmag], as the ``magDiff`` of
+        `calcPhotRepeat`.  Shape: ``(numRandomShuffles, nObjects)``.
+    binValues : `numpy.ndarray`
+        Value by which each object is binned, e.g. its median SNR.
+    binEdges : sequence of `float`
+        Increasing bin edges; each bin includes its lower edge, and the
+        last bin also its upper edge.
+    minObjects : int, optional
+        Minimum number of objects for the widths of a bin to be computed;
+        they are NaN in bins with fewer objects.
+
+    Returns
+    -------
+    curve : `dict`
+        - ``binEdges``: the bin edges, as an array.
+        - ``count``: number of objects in each bin.
+        - ``rms``, ``iqr``: `~astropy.unit.Quantity` arrays in mmag of the
+          RMS and scaled IQR of each shuffle in each bin.  Shape:
+          ``(numRandomShuffles, nBins)``.
+        - ``repeatability``: `~astropy.unit.Quantity` array in mmag of the
+          mean ``iqr`` of each bin.
+    """
+    from scipy.stats import norm
+
+    binEdges = np.asarray(binEdges, dtype=float)
+    nBins = len(binEdges) - 1
+    numRandomShuffles = len(magDiffs)
+
+    binIndex = np.searchsorted(binEdges, binValues, side='right') - 1
+    binIndex[binValues == binEdges[-1]] = nBins - 1
+    rms = np.full((numRandomShuffles, nBins), np.nan)
+    iqr = np.full((numRandomShuffles, nBins), np.nan)
+    binCounts = np.zeros(nBins, dtype=np.int64)
+    for b in range(nBins):
+        inBin = binIndex == b
+        binCounts[b] = np.count_nonzero(inBin)
+        if binCounts[b] < max(minObjects, 1):
+            continue
+        binDiffs = magDiffs[:, inBin]
+        rms[:, b] = np.sqrt(np.mean(binDiffs**2, axis=1))
+        iqr[:, b] = np.subtract.reduce(np.percentile(binDiffs, [75, 25], axis=1)) / (norm.ppf(0.75)*2)
+
+    iqr = iqr * u.mmag
+    return {'binEdges': binEdges, 'count': binCounts, 'rms': rms * u.mmag, 'iqr': iqr,
+            'repeatability': np.mean(iqr, axis=0)}
+
+
 def calcPhotRepeatSample(matches, magKey, rng=None):
     """Compute one realization of repeatability by randomly sampling pairs of
     visits.
@@ -165,6 +391,275 @@ def calcPhotRepeatSample(matches, magKey, rng=None):
     return pipeBase.Struct(rms=rms, iqr=iqr, magDiffs=magDiffs, magMean=magMean,)
 
 
+def calcPhotRepeatSpawned(matches, magKey, numRandomShuffles, randomSeed=None, chunkSize=None,
+                          executor=None, numProcesses=1, returnMagDiffs=True, reduceMagDiffs=None):
+    """Compute realizations of repeatability, each from its own random
+    stream.
+
+    Parameters
+    ----------
+    matches : `lsst.afw.table.GroupView`
+        `~lsst.afw.table.GroupView` of sources matched between visits.
+    magKey : `lsst.afw.table` schema key
+        Magnitude column key in the ``groupView``.
+    numRandomShuffles : int
+        Number of realizations.
+    randomSeed : int, optional
+        Seed of the `numpy.random.SeedSequence` the streams are spawned
+        from.
+    chunkSize : int, optional
+        If given, the objects are split into consecutive chunks of this many,
+        and each chunk of each shuffle gets its own stream.
+    executor : `concurrent.futures.Executor`, optional
+        Executor with which to compute the shuffles.
+    numProcesses : int, optional
+        If greater than 1, and no ``executor`` is given, compute the
+        shuffles in blocks in a pool of this many processes; see Notes.
+    returnMagDiffs : bool, optional
+        If `False`, the ``magDiffs`` of the samples are empty arrays, which
+        saves sending them back from the worker processes.
+    reduceMagDiffs : callable, optional
+        If given, it is applied to the magnitude differences of each shuffle
+        where they are computed, in the worker processes if any, and its
+        result is returned as the ``magDiffs`` of the sample.  It must be
+        picklable to be used with ``numProcesses``.
+
+    Returns
+    -------
+    samples : `list` of `lsst.pipe.base.Struct`
+        One `~lsst.pipe.base.Struct` per shuffle, with the fields returned by
+        `calcPhotRepeatSample`.
+
+    Notes
+    -----
+    Shuffle ``i`` draws from the stream of
+    ``SeedSequence(randomSeed).spawn(numRandomShuffles)[i]`` and chunk ``j``
+    of that shuffle from the ``j``-th stream spawned from it, so every
+    stream depends only on the seed and on its indices.  The shuffles and
+    chunks can therefore be computed in any order, by any number of workers,
+    with the same result.
+
+    In the process pool, the magnitudes of all objects, sorted by object,
+    are put in shared memory, so they are not pickled for every worker;
+    each worker computes a contiguous block of shuffles and returns only
+    their ``rms``, ``iqr`` and, optionally, ``magDiffs``.
+    """
+    entropy = np.random.SeedSequence(randomSeed).entropy
+    counts = np.array([len(group) for group in matches.groups], dtype=np.int64)
+    offsets = np.cumsum(counts) - counts
+    mags = np.concatenate([group.get(magKey) for group in matches.groups] or [np.empty(0)])
+    magMean = matches.aggregate(np.mean, field=magKey)
+    shuffles = range(numRandomShuffles)
+
+    if executor is None and numProcesses > 1 and numRandomShuffles > 1:
+        results = _calcShufflesInProcesses(mags, offsets, counts, entropy, chunkSize, shuffles,
+                                           numProcesses, returnMagDiffs, reduceMagDiffs)
+    else:
+        sample = functools.partial(_calcSpawnedShuffle, mags, offsets, counts, entropy, chunkSize,
+                                   returnMagDiffs=returnMagDiffs, reduceMagDiffs=reduceMagDiffs)
+        results = list(map(sample, shuffles) if executor is None else executor.map(sample, shuffles))
+
+    return [pipeBase.Struct(rms=rms, iqr=iqr, magDiffs=magDiffs, magMean=magMean)
+            for rms, iqr, magDiffs in results]
+
+
+def _calcSpawnedShuffle(mags, offsets, counts, entropy, chunkSize, shuffle, returnMagDiffs=True,
+                        reduceMagDiffs=None):
+    """Compute one shuffle of `calcPhotRepeatSpawned`; return its rms, iqr
+    and magnitude differences.
+    """
+    if chunkSize is not None and chunkSize < 0:
+        raise ValueError(f"chunkSize must not be negative, not {chunkSize}.")
+    chunkSize = max(len(counts), 1) if not chunkSize else chunkSize
+    chunkStarts = range(0, len(counts), chunkSize)
+    magDiffs = np.empty(len(counts))
+    for chunk, start in enumerate(chunkStarts):
+        spawnKey = (shuffle, chunk) if len(chunkStarts) > 1 else (shuffle,)
+        rng = np.random.default_rng(np.random.SeedSequence(entropy, spawn_key=spawnKey))
+        end = start + chunkSize
+        magDiffs[start:end] = getRandomDiffs(mags, offsets[start:end], counts[start:end], rng)
+    magDiffs *= 1000/math.sqrt(2)
+    rms, iqr = computeWidths(magDiffs)
+    if reduceMagDiffs is not None:
+        return rms, iqr, reduceMagDiffs(magDiffs)
+    return rms, iqr, magDiffs if returnMagDiffs else np.empty(0)
+
+
+def _calcShufflesInProcesses(mags, offsets, counts, entropy, chunkSize, shuffles, numProcesses,
+                             returnMagDiffs, reduceMagDiffs=None):
+    """Compute shuffles of `calcPhotRepeatSpawned` in a process pool, with
+    the input arrays in shared memory.
+    """
+    from concurrent.futures import ProcessPoolExecutor
+    from multiprocessing import shared_memory
+
+    sharedBlocks = []
+    try:
+        specs = {}
+        for name, array in (('mags', mags), ('offsets', offsets), ('counts', counts)):
+            block = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+            sharedBlocks.append(block)
+            np.ndarray(array.shape, dtype=array.dtype, buffer=block.buf)[...] = array
+            specs[name] = (block.name, array.dtype.str, array.shape)
+
+        numProcesses = min(numProcesses, len(shuffles))
+        shuffleBlocks = [list(block) for block in np.array_split(np.asarray(shuffles), numProcesses)]
+        worker = functools.partial(_calcShuffleBlock, entropy=entropy, chunkSize=chunkSize,
+                                   returnMagDiffs=returnMagDiffs, reduceMagDiffs=reduceMagDiffs)
+        with ProcessPoolExecutor(max_workers=numProcesses, initializer=_attachSharedArrays,
+                                 initargs=(specs,)) as pool:
+            return [result for blockResults in pool.map(worker, shuffleBlocks) for result in blockResults]
+    finally:
+        for block in sharedBlocks:
+            block.close()
+            block.unlink()
+
+
+# Shared memory blocks and arrays attached by each worker process of
+# _calcShufflesInProcesses.
+_sharedArrays = {}
+
+
+def _attachSharedArrays(specs):
+    """Attach a worker process to the shared input arrays."""
+    from multiprocessing import shared_memory
+
+    for name, (blockName, dtype, shape) in specs.items():
+        block = shared_memory.SharedMemory(name=blockName)
+        # Keep the block open as long as the array is in use.
+        _sharedArrays[name] = (block, np.ndarray(shape, dtype=dtype, buffer=block.buf))
+
+
+def _calcShuffleBlock(shuffles, entropy, chunkSize, returnMagDiffs, reduceMagDiffs=None):
+    """Compute a block of shuffles in a worker process."""
+    mags, offsets, counts = (_sharedArrays[name][1] for name in ('mags', 'offsets', 'counts'))
+    return [_calcSpawnedShuffle(mags, offsets, counts, entropy, chunkSize, int(shuffle),
+                                returnMagDiffs=returnMagDiffs, reduceMagDiffs=reduceMagDiffs)
+            for shuffle in shuffles]
+
+
+class AbsDiffHistogram:
+    """Fixed-resolution histogram of absolute values, for percentiles of
+    more values than can be kept in memory.
+
+    Values up to ``maxValue`` are counted in bins of width ``binWidth``;
+    larger values, which are expected to be rare outliers, are kept
+    exactly.
+
+    Parameters
+    ----------
+    binWidth : `float`
+        Width of the bins; percentiles are accurate to this width.
+    maxValue : `float`
+        Upper edge of the histogram.
+    threshold : `float`, optional
+        If given, the number of values larger than this is counted exactly
+        in ``numAbove``.
+    """
+
+    def __init__(self, binWidth, maxValue, threshold=None):
+        self.binWidth = binWidth
+        self.threshold = threshold
+        self.counts = np.zeros(int(np.ceil(maxValue/binWidth)), dtype=np.int64)
+        self.overflow = np.empty(0)
+        self.numAbove = 0
+
+    @property
+    def count(self):
+        """Number of values added (`int`)."""
+        return int(self.counts.sum()) + len(self.overflow)
+
+    def add(self, values):
+        """Add the absolute values of an array of finite values."""
+        values = np.abs(values)
+        index = np.floor(values/self.binWidth).astype(np.int64)
+        inRange = index < len(self.counts)
+        self.counts += np.bincount(index[inRange], minlength=len(self.counts))
+        self.overflow = np.concatenate([self.overflow, values[~inRange]])
+        if self.threshold is not None:
+            self.numAbove += int(np.count_nonzero(values > self.threshold))
+
+    def merge(self, other):
+        """Add the values of another histogram with the same binning."""
+        if other.binWidth != self.binWidth or len(other.counts) != len(self.counts) \
+                or other.threshold != self.threshold:
+            raise ValueError("Cannot merge histograms with different binning or thresholds.")
+        self.counts += other.counts
+        self.overflow = np.concatenate([self.overflow, other.overflow])
+        self.numAbove += other.numAbove
+
+    def percentile(self, q):
+        """Return a percentile of the values.
+
+        Parameters
+        ----------
+        q : `float`
+            Percentile, between 0 and 100.
+
+        Returns
+        -------
+        value : `float`
+            The percentile, interpolated between order statistics as by
+            `numpy.percentile`.  Each order statistic below ``maxValue`` is
+            placed within its bin, so the result is within ``binWidth`` of
+            the exact percentile; NaN if there are no values.
+        """
+        count = self.count
+        if count == 0:
+            return np.nan
+        rank = q/100*(count - 1)
+        lower = int(np.floor(rank))
+        value = self._orderStatistic(lower)
+        if rank > lower:
+            value += (rank - lower)*(self._orderStatistic(lower + 1) - value)
+        return value
+
+    def _orderStatistic(self, k):
+        """Estimate the ``k``-th smallest value (from 0)."""
+        cumulative = np.cumsum(self.counts)
+        if k >= cumulative[-1]:
+            return np.sort(self.overflow)[k - cumulative[-1]]
+        b = np.searchsorted(cumulative, k, side='right')
+        before = cumulative[b] - self.counts[b]
+        # Spread the values of the bin uniformly across it.
+        return (b + (k - before + 0.5)/self.counts[b])*self.binWidth
+
+
+def histogramAbsDiffs(magDiffs, binWidth, maxValue, threshold=None):
+    """Return an `AbsDiffHistogram` of an array of magnitude differences."""
+    histogram = AbsDiffHistogram(binWidth, maxValue, threshold=threshold)
+    histogram.add(magDiffs)
+    return histogram
+
+
+def getRandomDiffs(values, offsets, counts, rng):
+    """Get the difference between two randomly selected elements of each of
+    several groups of values.
+
+    Parameters
+    ----------
+    values : `numpy.ndarray`
+        Values of all groups, concatenated.
+    offsets : `numpy.ndarray` of int
+        Index in ``values`` of the first value of each group.
+    counts : `numpy.ndarray` of int
+        Number of values in each group; at least 2.
+    rng : `numpy.random.Generator`
+        Random number generator.
+
+    Returns
+    -------
+    diffs : `numpy.ndarray`
+        For each group, the difference between two distinct elements chosen
+        uniformly at random.
+    """
+    first = rng.integers(0, counts)
+    # Draw the second element among the others.
+    second = rng.integers(0, counts - 1)
+    second += second >= first
+    return values[offsets + first] - values[offsets + second]
+
+
 def computeWidths(array):
     """Compute the RMS and the scaled inter-quartile range of an array.
     Parameters
@@ -185,6 +680,8 @@ def computeWidths(array):
     The IQR is scaled by the IQR/RMS ratio for a Gaussian such that it
     if the array is Gaussian distributed, then the scaled IQR = RMS.
     """
+    from scipy.stats import norm
+
     # For scalars, math.sqrt is several times faster than numpy.sqrt.
     rmsSigma = math.sqrt(np.mean(array**2))
     iqrSigma = np.subtract.reduce(np.percentile(array, [75, 25])) / (norm.ppf(0.75)*2)
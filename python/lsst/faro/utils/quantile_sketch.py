@@ -0,0 +1,147 @@
+import numpy as np
+import astropy.units as u
+
+from lsst.pipe.base import Struct
+from lsst.verify import Datum
+
+
+def makeTDigest(values, compression=100, weights=None):
+    """Summarize values with a t-digest quantile sketch.
+
+    Parameters
+    ----------
+    values : `numpy.ndarray` of `float`
+        Values to summarize.  Non-finite values are ignored.
+    compression : `float`, optional
+        Compression parameter; the digest holds of order ``compression/2``
+        centroids, and quantile errors scale as ``q*(1-q)/compression``.
+    weights : `numpy.ndarray` of `float`, optional
+        Weight of each value; defaults to one.
+
+    Returns
+    -------
+    digest : `lsst.pipe.base.Struct`
+        The digest, with components:
+        - ``means`` : centroid means, in increasing order.
+        - ``weights`` : centroid weights.
+        - ``minimum``, ``maximum`` : the extreme values.
+
+    Notes
+    -----
+    This is the merging t-digest of Dunning & Ertl (2019) with the ``k1``
+    scale function.  Digests of disjoint data sets can be combined with
+    `mergeTDigests`, so a sketch can be built per quantum and merged at any
+    level of the aggregation hierarchy.
+    """
+    values = np.asarray(values, dtype=float)
+    if weights is None:
+        weights = np.ones(len(values))
+    else:
+        weights = np.asarray(weights, dtype=float)
+    finite = np.isfinite(values)
+    values = values[finite]
+    weights = weights[finite]
+    if len(values) == 0:
+        return Struct(means=np.array([]), weights=np.array([]), minimum=np.nan, maximum=np.nan)
+    return _compressTDigest(values, weights, values.min(), values.max(), compression)
+
+
+def mergeTDigests(digests, compression=100):
+    """Merge t-digests of disjoint data sets into one digest.
+
+    Parameters
+    ----------
+    digests : iterable of `lsst.pipe.base.Struct`
+        Digests from `makeTDigest` or `mergeTDigests`.
+    compression : `float`, optional
+        Compression parameter of the merged digest.
+
+    Returns
+    -------
+    digest : `lsst.pipe.base.Struct`
+        The merged digest.
+    """
+    digests = [digest for digest in digests if len(digest.weights) > 0]
+    if len(digests) == 0:
+        return Struct(means=np.array([]), weights=np.array([]), minimum=np.nan, maximum=np.nan)
+    means = np.concatenate([digest.means for digest in digests])
+    weights = np.concatenate([digest.weights for digest in digests])
+    return _compressTDigest(means, weights,
+                            min(digest.minimum for digest in digests),
+                            max(digest.maximum for digest in digests),
+                            compression)
+
+
+def tdigestQuantile(digest, q):
+    """Estimate quantiles from a t-digest.
+
+    Parameters
+    ----------
+    digest : `lsst.pipe.base.Struct`
+        Digest from `makeTDigest` or `mergeTDigests`.
+    q : `float` or `numpy.ndarray` of `float`
+        Quantiles to estimate, between 0 and 1.
+
+    Returns
+    -------
+    values : `float` or `numpy.ndarray` of `float`
+        Estimated quantiles; NaN for an empty digest.
+    """
+    if len(digest.weights) == 0:
+        return np.full(np.shape(q), np.nan) if np.ndim(q) else np.nan
+    total = np.sum(digest.weights)
+    # Each centroid sits at the middle of the weight it represents, and the
+    # extreme values sit at the ends.
+    centers = np.cumsum(digest.weights) - digest.weights/2
+    positions = np.concatenate([[0.0], centers, [total]])
+    values = np.concatenate([[digest.minimum], digest.means, [digest.maximum]])
+    return np.interp(np.asarray(q)*total, positions, values)
+
+
+def tdigestToExtras(digest, unit):
+    """Convert a t-digest to `lsst.verify.Measurement` extras.
+
+    Parameters
+    ----------
+    digest : `lsst.pipe.base.Struct`
+        Digest from `makeTDigest` or `mergeTDigests`.
+    unit : `astropy.units.Unit`
+        Unit of the summarized values.
+
+    Returns
+    -------
+    extras : `dict` [`str`, `lsst.verify.Datum`]
+        The ``sketch_means``, ``sketch_weights`` and ``sketch_range`` extras.
+    """
+    return {'sketch_means': Datum(digest.means*unit, label='sketch_means',
+                                  description='t-digest centroid means'),
+            'sketch_weights': Datum(digest.weights*u.count, label='sketch_weights',
+                                    description='t-digest centroid weights'),
+            'sketch_range': Datum(np.array([digest.minimum, digest.maximum])*unit, label='sketch_range',
+                                  description='minimum and maximum summarized value')}
+
+
+def tdigestFromExtras(extras, unit):
+    """Read a t-digest stored by `tdigestToExtras`, converting to ``unit``.
+    """
+    valueRange = extras['sketch_range'].quantity.to_value(unit)
+    return Struct(means=extras['sketch_means'].quantity.to_value(unit),
+                  weights=extras['sketch_weights'].quantity.value,
+                  minimum=valueRange[0], maximum=valueRange[1])
+
+
+def _compressTDigest(means, weights, minimum, maximum, compression):
+    """Merge sorted neighbouring centroids so each spans at most one unit of
+    the ``k1`` scale function.
+    """
+    order = np.argsort(means, kind='stable')
+    means = means[order]
+    weights = weights[order]
+    total = np.sum(weights)
+    qLeft = (np.cumsum(weights) - weights)/total
+    k = compression/(2*np.pi)*np.arcsin(2*qLeft - 1)
+    cluster = np.floor(k - k[0]).astype(np.int64)
+    starts = np.flatnonzero(np.concatenate([[True], cluster[1:] != cluster[:-1]]))
+    newWeights = np.add.reduceat(weights, starts)
+    newMeans = np.add.reduceat(means*weights, starts)/newWeights
+    return Struct(means=newMeans, weights=newWeights, minimum=minimum, maximum=maximum)
@@ -0,0 +1,129 @@
+import functools
+import hashlib
+import io
+import os
+import pickle
+import tempfile
+
+# Size of the blocks in which files are read to compute their digests.
+_BLOCK_SIZE = 2**20
+
+
+def fileDigest(filename):
+    """Return the SHA-256 digest of the contents of a file, as a hex string.
+    """
+    digest = hashlib.sha256()
+    with open(filename, 'rb') as f:
+        for block in iter(functools.partial(f.read, _BLOCK_SIZE), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def datasetDigest(ref, butler=None):
+    """Return a string identifying the contents of an input dataset.
+
+    Parameters
+    ----------
+    ref : `lsst.daf.butler.DatasetRef`
+        Reference to the dataset.
+    butler : `lsst.daf.butler.Butler`, optional
+        Butler through which the file of the dataset is found.
+
+    Returns
+    -------
+    digest : `str`
+        The SHA-256 digest of the file of the dataset, local or remote, so
+        that byte-identical inputs produced by different runs share cache
+        entries.  The dataset ID, which identifies immutable contents
+        within a repository, only for datasets without a single file, or
+        if no ``butler`` is given.
+    """
+    if butler is not None:
+        try:
+            uri = butler.getURI(ref)
+        except (LookupError, ValueError, RuntimeError):
+            # E.g. a composite dataset stored as several files.
+            uri = None
+        if uri is not None:
+            if getattr(uri, 'isLocal', False):
+                return 'sha256:' + fileDigest(uri.ospath)
+            return 'sha256:' + hashlib.sha256(uri.read()).hexdigest()
+    return f'id:{ref.id}'
+
+
+def configDigest(config):
+    """Return the SHA-256 digest of the saved form of a config."""
+    stream = io.StringIO()
+    config.saveToStream(stream)
+    return hashlib.sha256(stream.getvalue().encode()).hexdigest()
+
+
+@functools.lru_cache(maxsize=None)
+def codeVersion():
+    """Return a digest of the source code of this package.
+
+    The package has no version module, so the digest of its Python files
+    stands in for its version: any change to the code, released or not,
+    gives a new version.
+    """
+    digest = hashlib.sha256()
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames.sort()
+        for filename in sorted(filenames):
+            if filename.endswith('.py'):
+                path = os.path.join(dirpath, filename)
+                digest.update(os.path.relpath(path, root).encode())
+                digest.update(fileDigest(path).encode())
+    return digest.hexdigest()
+
+
+def makeResultCacheKey(*parts):
+    """Combine strings identifying the inputs of a computation into a
+    cache key.
+    """
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(part.encode())
+        # Separator, so that ('ab', 'c') and ('a', 'bc') differ.
+        digest.update(b'\0')
+    return digest.hexdigest()
+
+
+def resultCacheFilename(cacheDir, key):
+    """Return the name of the file holding the cached result for a key."""
+    return os.path.join(cacheDir, key[:2], f'{key}.pickle')
+
+
+def readCachedResult(cacheDir, key):
+    """Return the result cached for a key, or `None` if there is none.
+    """
+    filename = resultCacheFilename(cacheDir, key)
+    try:
+        with open(filename, 'rb') as f:
+            return pickle.load(f)
+    except FileNotFoundError:
+        return None
+    except (EOFError, pickle.UnpicklingError, AttributeError, ImportError):
+        # An entry written by an incompatible version of a dependency is
+        # treated as a miss and overwritten.
+        return None
+
+
+def writeCachedResult(cacheDir, key, result):
+    """Cache a result under a key.
+
+    The file is written under a temporary name and renamed into place, so
+    concurrent readers never see a partially written entry.
+    """
+    filename = resultCacheFilename(cacheDir, key)
+    directory = os.path.dirname(filename)
+    os.makedirs(directory, exist_ok=True)
+    fd, tmpName = tempfile.mkstemp(dir=directory, suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            pickle.dump(result, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmpName, filename)
+    except BaseException:
+        os.unlink(tmpName)
+        raise
@@ -46,7 +46,7 @@ def astromResiduals(matchedCatalog, mag_bright_cut, mag_faint_cut, annulus_r, wi
         return {'nomeas': np.nan*u.marcsec}
 
 
-def calcRmsDistances(groupView, annulus, magRange, verbose=False):
+def calcRmsDistances(groupView, annulus, magRange, verbose=False, maxPairs=None, rng=None, stats=None):
     """Calculate the RMS distance of a set of matched objects over visits.
     Parameters
     ----------
@@ -60,6 +60,15 @@ def calcRmsDistances(groupView, annulus, magRange, verbose=False):
         Magnitude range from which to select objects.
     verbose : bool, optional
         Output additional information on the analysis steps.
+    maxPairs : int, optional
+        If given, and there are more pairs of objects in the annulus, only
+        this many pairs, drawn uniformly at random without replacement, are
+        used; see `annulusPairs`.
+    rng : `numpy.random.Generator`, optional
+        Random number generator with which pairs are sampled.
+    stats : `dict`, optional
+        If given, filled with the total number of pairs in the annulus,
+        ``pairsTotal``, and the number used, ``pairsSampled``.
     Returns
     -------
     rmsDistances : `astropy.units.Quantity`
@@ -100,32 +109,130 @@ def calcRmsDistances(groupView, annulus, magRange, verbose=False):
     annulusRadians = arcminToRadians(annulus.to(u.arcmin).value)
 
     rmsDistances = list()
-    for obj1, (ra1, dec1, visit1) in enumerate(zip(meanRa, meanDec, visit)):
-        dist = sphDist(ra1, dec1, meanRa[obj1+1:], meanDec[obj1+1:])
-        objectsInAnnulus, = np.where((annulusRadians[0] <= dist)
-                                     & (dist < annulusRadians[1]))
-        for obj2 in objectsInAnnulus:
-            distances = matchVisitComputeDistance(
-                visit[obj1], ra[obj1], dec[obj1],
-                visit[obj2], ra[obj2], dec[obj2])
-            if not distances:
-                if verbose:
-                    print("No matching visits found for objs: %d and %d" %
-                          (obj1, obj2))
-                continue
-
-            finiteEntries, = np.where(np.isfinite(distances))
-            # Need at least 2 distances to get a finite sample stdev
-            if len(finiteEntries) > 1:
-                # ddof=1 to get sample standard deviation (e.g., 1/(n-1))
-                rmsDist = np.std(np.array(distances)[finiteEntries], ddof=1)
-                rmsDistances.append(rmsDist)
+    for obj1, obj2 in annulusPairs(meanRa, meanDec, annulusRadians, maxPairs=maxPairs, rng=rng,
+                                   stats=stats):
+        distances = matchVisitComputeDistance(
+            visit[obj1], ra[obj1], dec[obj1],
+            visit[obj2], ra[obj2], dec[obj2])
+        if not distances:
+            if verbose:
+                print("No matching visits found for objs: %d and %d" %
+                      (obj1, obj2))
+            continue
+
+        finiteEntries, = np.where(np.isfinite(distances))
+        # Need at least 2 distances to get a finite sample stdev
+        if len(finiteEntries) > 1:
+            # ddof=1 to get sample standard deviation (e.g., 1/(n-1))
+            rmsDist = np.std(np.array(distances)[finiteEntries], ddof=1)
+            rmsDistances.append(rmsDist)
 
     # return quantity
     rmsDistances = np.array(rmsDistances) * u.radian
     return rmsDistances
 
 
+def annulusPairs(meanRa, meanDec, annulusRadians, maxPairs=None, rng=None, stats=None):
+    """Iterate over the pairs of objects whose separation is within an
+    annulus.
+
+    Parameters
+    ----------
+    meanRa, meanDec : `numpy.ndarray`
+        Mean positions of the objects [radians].
+    annulusRadians : length-2 `numpy.ndarray`
+        Range of separations [radians].
+    maxPairs : int, optional
+        If given, and there are more pairs, yield only this many, drawn
+        uniformly at random without replacement, in the order in which all
+        pairs would be yielded.
+    rng : `numpy.random.Generator`, optional
+        Random number generator with which pairs are sampled.
+    stats : `dict`, optional
+        If given, filled with the total number of pairs, ``pairsTotal``, and
+        the number yielded, ``pairsSampled``, once all pairs are yielded.
+
+    Yields
+    ------
+    obj1, obj2 : `int`
+        Indices of the objects of each pair, as used by `calcRmsDistances`.
+
+    Notes
+    -----
+    With ``maxPairs``, the separations from every object are computed twice:
+    once to count the pairs, and once for the objects of the sampled pairs.
+    These are vectorized, so the cost is dominated by the per-pair work of
+    the caller, which is bounded by ``maxPairs``.
+    """
+    def objectsInAnnulus(obj1):
+        dist = sphDist(meanRa[obj1], meanDec[obj1], meanRa[obj1+1:], meanDec[obj1+1:])
+        inAnnulus, = np.where((annulusRadians[0] <= dist)
+                              & (dist < annulusRadians[1]))
+        return inAnnulus
+
+    stats = {} if stats is None else stats
+    nObjects = len(meanRa)
+    if maxPairs is not None:
+        nInAnnulus = np.array([len(objectsInAnnulus(obj1)) for obj1 in range(nObjects)], dtype=np.int64)
+        total = int(nInAnnulus.sum())
+        if total > maxPairs:
+            if rng is None:
+                rng = np.random.default_rng()
+            selected = np.sort(rng.choice(total, size=maxPairs, replace=False, shuffle=False))
+            starts = np.cumsum(nInAnnulus) - nInAnnulus
+            sampledObjects = np.searchsorted(starts, selected, side='right') - 1
+            # Group the sampled pairs by first object.
+            firstObjects, firstIndex = np.unique(sampledObjects, return_index=True)
+            for obj1, chosen in zip(firstObjects, np.split(selected, firstIndex[1:])):
+                inAnnulus = objectsInAnnulus(obj1)
+                for obj2 in inAnnulus[chosen - starts[obj1]]:
+                    yield int(obj1), obj2
+            stats['pairsTotal'] = total
+            stats['pairsSampled'] = maxPairs
+            return
+
+    total = 0
+    for obj1 in range(nObjects):
+        inAnnulus = objectsInAnnulus(obj1)
+        total += len(inAnnulus)
+        for obj2 in inAnnulus:
+            yield obj1, obj2
+    stats['pairsTotal'] = total
+    stats['pairsSampled'] = total
+
+
+def bootstrapMedianInterval(values, confidence=0.95, numBootstrap=200, rng=None):
+    """Compute a bootstrap confidence interval of the median of an array.
+
+    Parameters
+    ----------
+    values : `numpy.ndarray`
+        Values.
+    confidence : `float`, optional
+        Confidence level of the interval.
+    numBootstrap : int, optional
+        Number of bootstrap resamples.
+    rng : `numpy.random.Generator`, optional
+        Random number generator.
+
+    Returns
+    -------
+    low, high : `float`
+        Percentile interval of the medians of the resamples; NaN if
+        ``values`` is empty.
+    """
+    values = np.asarray(values)
+    if len(values) == 0:
+        return np.nan, np.nan
+    if rng is None:
+        rng = np.random.default_rng()
+    medians = np.array([np.median(values[rng.integers(0, len(values), len(values))])
+                        for _ in range(numBootstrap)])
+    tail = 50*(1 - confidence)
+    low, high = np.percentile(medians, [tail, 100 - tail])
+    return low, high
+
+
 def calcSepOutliers(groupView, annulus, magRange, verbose=False):
     """Calculate the RMS distance of a set of matched objects over visits.
     Parameters
@@ -1,9 +1,12 @@
+import concurrent.futures
+import functools
+
 import numpy as np
-import scipy.stats as scipyStats
 from lsst.pipe.base import Struct
 
 
 def stellarLocusResid(gmags, rmags, imags, **filterargs):
+    import scipy.stats as scipyStats
 
     gr = gmags-rmags
     ri = rmags-imags
@@ -15,18 +18,8 @@ def stellarLocusResid(gmags, rmags, imags, **filterargs):
 
     slope, intercept, r_value, p_value, std_err = scipyStats.linregress(gr[okfitcolors],
                                                                         ri[okfitcolors])
-    p2p1coeffs = p2p1CoeffsFromLinearFit(slope, intercept, 0.3, slope*0.3+intercept)
-    p1coeffs = p2p1coeffs.p1Coeffs.copy()
-    # hack to put the zeros in for u, z coeffs
-    p1coeffs.insert(0, 0.0)
-    p1coeffs.insert(4, 0.0)
-    p2coeffs = list(p2p1coeffs.p2Coeffs.copy())
-    p2coeffs.insert(0, 0.0)
-    p2coeffs.insert(4, 0.0)
-    umags = np.zeros(len(gmags))
-    zmags = np.zeros(len(gmags))
-    p1_fit = calcP1P2([umags, gmags, rmags, imags, zmags], p1coeffs)
-    p2_fit = calcP1P2([umags, gmags, rmags, imags, zmags], p2coeffs)
+    p1coeffs, p2coeffs = locusCoeffsFromLinearFit(slope, intercept)
+    p1_fit, p2_fit = calcP1P2Pair([None, gmags, rmags, imags, None], p1coeffs, p2coeffs)
     okp1_fit = (p1_fit < 0.6) & (p1_fit > -0.2)
 
     # Do a second iteration, removing large (>3 sigma) outliers in p2:
@@ -35,6 +28,27 @@ def stellarLocusResid(gmags, rmags, imags, **filterargs):
 
     slope, intercept, r_value, p_value, std_err = scipyStats.linregress(gr[okfitcolors & keep],
                                                                         ri[okfitcolors & keep])
+    p1coeffs, p2coeffs = locusCoeffsFromLinearFit(slope, intercept)
+    p1_fit, p2_fit = calcP1P2Pair([None, gmags, rmags, imags, None], p1coeffs, p2coeffs)
+    okp1_fit = (p1_fit < 0.6) & (p1_fit > -0.2)
+
+    return p1_fit[okp1_fit], p2_fit[okp1_fit], p1coeffs, p2coeffs
+
+
+def locusCoeffsFromLinearFit(slope, intercept):
+    """Convert a linear fit of r-i vs. g-r to ugriz P1 and P2 coefficients.
+
+    Parameters
+    ----------
+    slope, intercept : `float`
+        Slope and intercept of the fit of r-i against g-r.
+
+    Returns
+    -------
+    p1coeffs, p2coeffs : `list` of `float`
+        Six P1 and P2 coefficients for u, g, r, i, z and the constant term,
+        as used by `calcP1P2`.  The u and z coefficients are zero.
+    """
     p2p1coeffs = p2p1CoeffsFromLinearFit(slope, intercept, 0.3, slope*0.3+intercept)
     p1coeffs = p2p1coeffs.p1Coeffs.copy()
     # hack to put the zeros in for u, z coeffs
@@ -43,11 +57,292 @@ def stellarLocusResid(gmags, rmags, imags, **filterargs):
     p2coeffs = list(p2p1coeffs.p2Coeffs.copy())
     p2coeffs.insert(0, 0.0)
     p2coeffs.insert(4, 0.0)
-    p1_fit = calcP1P2([umags, gmags, rmags, imags, zmags], p1coeffs)
-    p2_fit = calcP1P2([umags, gmags, rmags, imags, zmags], p2coeffs)
-    okp1_fit = (p1_fit < 0.6) & (p1_fit > -0.2)
+    return p1coeffs, p2coeffs
 
-    return p1_fit[okp1_fit], p2_fit[okp1_fit], p1coeffs, p2coeffs
+
+def locusFitStats(gmags, rmags, imags, keep=None):
+    """Compute the sufficient statistics of the stellar locus linear fit.
+
+    The statistics of separate chunks of a catalog (e.g. patches) can be
+    merged with `combineLocusFitStats` and converted to the fit with
+    `locusCoeffsFromStats`, giving the same fit as `stellarLocusResid` on the
+    concatenated catalog without holding it in memory.
+
+    Parameters
+    ----------
+    gmags, rmags, imags : `numpy.ndarray` of `float`
+        Extinction-corrected g, r and i magnitudes.
+    keep : `numpy.ndarray` of `bool`, optional
+        Additional selection to apply on top of the color cuts.
+
+    Returns
+    -------
+    stats : `lsst.pipe.base.Struct`
+        Statistics of x = g-r and y = r-i for the stars used in the fit:
+        ``count``, the means ``meanX`` and ``meanY``, and the sums of
+        centered products ``sxx``, ``sxy`` and ``syy``.
+    """
+    gr = np.asarray(gmags - rmags)
+    ri = np.asarray(rmags - imags)
+    okfitcolors = ((gr < 1.1) & (gr > 0.3) & (np.abs(ri) < 1.0)
+                   & np.isfinite(gmags) & np.isfinite(rmags) & np.isfinite(imags))
+    if keep is not None:
+        okfitcolors &= keep
+    x = gr[okfitcolors]
+    y = ri[okfitcolors]
+    if len(x) == 0:
+        return Struct(count=0, meanX=0.0, meanY=0.0, sxx=0.0, sxy=0.0, syy=0.0)
+    meanX = np.mean(x)
+    meanY = np.mean(y)
+    dx = x - meanX
+    dy = y - meanY
+    return Struct(count=len(x), meanX=meanX, meanY=meanY,
+                  sxx=np.dot(dx, dx), sxy=np.dot(dx, dy), syy=np.dot(dy, dy))
+
+
+def combineLocusFitStats(stats1, stats2):
+    """Merge the statistics of two disjoint chunks from `locusFitStats`.
+
+    The merge is associative and commutative (up to rounding), so chunks may
+    be processed and merged in any order, e.g. in parallel.
+    """
+    if stats1.count == 0:
+        return stats2
+    if stats2.count == 0:
+        return stats1
+    count = stats1.count + stats2.count
+    dx = stats2.meanX - stats1.meanX
+    dy = stats2.meanY - stats1.meanY
+    weight = stats1.count*stats2.count/count
+    return Struct(count=count,
+                  meanX=stats1.meanX + dx*stats2.count/count,
+                  meanY=stats1.meanY + dy*stats2.count/count,
+                  sxx=stats1.sxx + stats2.sxx + dx*dx*weight,
+                  sxy=stats1.sxy + stats2.sxy + dx*dy*weight,
+                  syy=stats1.syy + stats2.syy + dy*dy*weight)
+
+
+def locusCoeffsFromStats(stats):
+    """Return the P1 and P2 coefficients for merged `locusFitStats`.
+
+    See `locusCoeffsFromLinearFit` for the format of the coefficients.
+    """
+    slope = stats.sxy/stats.sxx
+    intercept = stats.meanY - slope*stats.meanX
+    return locusCoeffsFromLinearFit(slope, intercept)
+
+
+def stellarLocusResidStreaming(chunks, nSigmaToClip=3.0, binWidth=1e-4, histRange=(-1.0, 1.0)):
+    """Fit the stellar locus to a catalog supplied in chunks.
+
+    This follows `stellarLocusResid`: fit, clip P2 outliers, refit.  Only
+    the fit statistics and a fixed-resolution histogram of P2 are kept
+    between chunks, so memory does not grow with the number of chunks.
+
+    Parameters
+    ----------
+    chunks : iterable of `tuple` of `numpy.ndarray`
+        ``(gmags, rmags, imags)`` extinction-corrected magnitudes for each
+        chunk, e.g. one per patch.  The chunks are iterated over several
+        times, so this must be a sequence or another re-iterable.
+    nSigmaToClip : `float`, optional
+        Clipping threshold passed to `calcQuartileClippedStatsStreaming`.
+    binWidth : `float`, optional
+        Width of the P2 histogram bins [mag].
+    histRange : `tuple` of `float`, optional
+        Range of the P2 histogram [mag].
+
+    Returns
+    -------
+    result : `lsst.pipe.base.Struct`
+        Result struct with components:
+        - ``p1Coeffs``, ``p2Coeffs`` : final fit coefficients, as returned
+          by `stellarLocusResid`.
+        - ``p2Stats`` : quartile-clipped statistics of P2 for the stars
+          passing the P1 cut, from `calcQuartileClippedStatsStreaming`.
+        - ``count`` : number of stars passing the P1 cut.
+
+    Notes
+    -----
+    The fits are exact up to rounding.  The quartiles of P2 are interpolated
+    from the histogram, so ``p2Stats`` and the clipping threshold differ from
+    `calcQuartileClippedStats` by at most ``binWidth``.
+    """
+    statsList = [locusFitStats(g, r, i) for g, r, i in chunks]
+    p1coeffs, p2coeffs = locusCoeffsFromStats(functools.reduce(combineLocusFitStats, statsList))
+
+    clippedStats = calcQuartileClippedStatsStreaming(_LocusP2Chunks(chunks, p1coeffs, p2coeffs),
+                                                     nSigmaToClip, binWidth=binWidth,
+                                                     histRange=histRange)
+
+    statsList = []
+    for g, r, i in chunks:
+        p1, p2 = calcP1P2Pair([None, g, r, i, None], p1coeffs, p2coeffs)
+        keep = np.abs(p2) < clippedStats.clipValue
+        statsList.append(locusFitStats(g, r, i, keep=keep))
+    p1coeffs, p2coeffs = locusCoeffsFromStats(functools.reduce(combineLocusFitStats, statsList))
+
+    p2Chunks = _LocusP2Chunks(chunks, p1coeffs, p2coeffs)
+    count = sum(len(p2) for p2 in p2Chunks)
+    p2Stats = None
+    if count > 0:
+        p2Stats = calcQuartileClippedStatsStreaming(p2Chunks, nSigmaToClip, binWidth=binWidth,
+                                                    histRange=histRange)
+    return Struct(p1Coeffs=p1coeffs, p2Coeffs=p2coeffs, p2Stats=p2Stats, count=count)
+
+
+def stellarLocusBootstrap(gmags, rmags, imags, nBoot=100, randomSeed=None, chunkSize=20,
+                          nProcesses=1, nSigmaToClip=3.0):
+    """Bootstrap the quartile-clipped RMS of the stellar locus P2 residuals.
+
+    Each resample is refit exactly as in `stellarLocusResid` and the P2
+    width is measured as in ``WPerpTask``.  All resample indices are drawn
+    up front as one ``(nBoot, N)`` array, and the fits, projections and
+    clipped statistics are evaluated for ``chunkSize`` resamples at a time
+    with batched array operations.
+
+    Parameters
+    ----------
+    gmags, rmags, imags : `numpy.ndarray` of `float`
+        Extinction-corrected g, r and i magnitudes.
+    nBoot : `int`, optional
+        Number of bootstrap resamples.
+    randomSeed : `int`, optional
+        Seed for drawing the resamples.
+    chunkSize : `int`, optional
+        Number of resamples evaluated together; temporaries scale as
+        ``chunkSize*N``.
+    nProcesses : `int`, optional
+        Number of worker processes to spread the chunks over.  The result
+        does not depend on this, since the resamples are drawn beforehand.
+    nSigmaToClip : `float`, optional
+        Clipping threshold passed to the quartile-clipped statistics.
+
+    Returns
+    -------
+    p2Rms : `numpy.ndarray` of `float`
+        Quartile-clipped RMS of P2 for each resample [mag].
+
+    Raises
+    ------
+    ValueError
+        Raised if ``chunkSize`` is not positive.
+    """
+    if chunkSize < 1:
+        raise ValueError(f"chunkSize must be positive, not {chunkSize}.")
+    mags = np.stack([np.asarray(gmags, dtype=float), np.asarray(rmags, dtype=float),
+                     np.asarray(imags, dtype=float)])
+    rng = np.random.default_rng(randomSeed)
+    indices = rng.integers(0, mags.shape[1], size=(nBoot, mags.shape[1]))
+    chunks = [indices[start:start + chunkSize] for start in range(0, nBoot, chunkSize)]
+
+    if nProcesses > 1:
+        with concurrent.futures.ProcessPoolExecutor(max_workers=nProcesses) as executor:
+            results = list(executor.map(_bootstrapP2Rms, [mags]*len(chunks), chunks,
+                                        [nSigmaToClip]*len(chunks)))
+    else:
+        results = [_bootstrapP2Rms(mags, chunk, nSigmaToClip) for chunk in chunks]
+    return np.concatenate(results)
+
+
+def _bootstrapP2Rms(mags, indices, nSigmaToClip):
+    """Batched `stellarLocusResid` and clipped P2 RMS for a set of resamples.
+
+    ``mags`` has shape ``(3, N)`` for g, r and i; ``indices`` has shape
+    ``(nResamples, N)``.
+    """
+    gmags, rmags, imags = mags[:, indices]
+    gr = gmags - rmags
+    ri = rmags - imags
+    okfitcolors = ((gr < 1.1) & (gr > 0.3) & (np.abs(ri) < 1.0)
+                   & np.isfinite(gmags) & np.isfinite(rmags) & np.isfinite(imags))
+
+    p1, p2 = _batchedLocusProjections(gmags, rmags, imags, *_batchedLinearFit(gr, ri, okfitcolors))
+    okp1 = (p1 < 0.6) & (p1 > -0.2)
+    clipValue = _batchedQuartileClippedStats(p2, okp1, nSigmaToClip).clipValue
+    keep = np.abs(p2) < clipValue[:, np.newaxis]
+
+    p1, p2 = _batchedLocusProjections(gmags, rmags, imags,
+                                      *_batchedLinearFit(gr, ri, okfitcolors & keep))
+    okp1 = (p1 < 0.6) & (p1 > -0.2)
+    return _batchedQuartileClippedStats(p2, okp1, nSigmaToClip).rms
+
+
+def _batchedLinearFit(x, y, mask):
+    """Least-squares slope and intercept of y vs. x for each row of a mask."""
+    count = np.sum(mask, axis=1)
+    meanX = np.sum(x, axis=1, where=mask)/count
+    meanY = np.sum(y, axis=1, where=mask)/count
+    dx = x - meanX[:, np.newaxis]
+    dy = y - meanY[:, np.newaxis]
+    slope = np.sum(dx*dy, axis=1, where=mask)/np.sum(dx*dx, axis=1, where=mask)
+    return slope, meanY - slope*meanX
+
+
+def _batchedLocusProjections(gmags, rmags, imags, slope, intercept):
+    """P1 and P2 for each row, given per-row linear fit parameters."""
+    # p2p1CoeffsFromLinearFit broadcasts over arrays of slopes and intercepts.
+    p2p1coeffs = p2p1CoeffsFromLinearFit(slope, intercept, 0.3, slope*0.3 + intercept)
+    projections = []
+    for coeffs in (p2p1coeffs.p1Coeffs, p2p1coeffs.p2Coeffs):
+        cg, cr, ci, c0 = [np.asarray(c)[:, np.newaxis] for c in coeffs]
+        projections.append(cg*gmags + cr*rmags + ci*imags + c0)
+    return projections
+
+
+def _batchedQuartileClippedStats(dataArray, mask, nSigmaToClip=3.0):
+    """Row-wise `calcQuartileClippedStats` of the masked entries of a 2-d array.
+
+    Returns a `lsst.pipe.base.Struct` with ``median``, ``mean``, ``stdDev``,
+    ``rms`` and ``clipValue`` arrays, one entry per row; all are NaN for
+    rows without masked entries.
+    """
+    # Sorting puts the masked-out NaNs at the end of each row.
+    sortedData = np.sort(np.where(mask, dataArray, np.nan), axis=1)
+    count = np.sum(mask, axis=1)
+    empty = count == 0
+    quartiles = []
+    for fraction in (0.25, 0.5, 0.75):
+        # Linear interpolation between order statistics, as in np.percentile.
+        # Empty rows read their first element, and are set to NaN below.
+        position = fraction*(np.maximum(count, 1) - 1)
+        lower = np.floor(position).astype(int)
+        upper = np.minimum(lower + 1, np.maximum(count, 1) - 1)
+        lowerValue = np.take_along_axis(sortedData, lower[:, np.newaxis], axis=1)[:, 0]
+        upperValue = np.take_along_axis(sortedData, upper[:, np.newaxis], axis=1)[:, 0]
+        quartile = lowerValue + (upperValue - lowerValue)*(position - lower)
+        quartile[empty] = np.nan
+        quartiles.append(quartile)
+    median = quartiles[1]
+    clipValue = nSigmaToClip*0.74*(quartiles[2] - quartiles[0])
+    good = mask & np.logical_not(np.abs(dataArray - median[:, np.newaxis]) > clipValue[:, np.newaxis])
+    nGood = np.sum(good, axis=1)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean = np.sum(dataArray, axis=1, where=good)/nGood
+        meanSquare = np.sum(dataArray**2, axis=1, where=good)/nGood
+    mean[nGood == 0] = np.nan
+    meanSquare[nGood == 0] = np.nan
+    return Struct(
+        median=median,
+        mean=mean,
+        stdDev=np.sqrt(np.maximum(meanSquare - mean**2, 0.0)),
+        rms=np.sqrt(meanSquare),
+        clipValue=clipValue,
+    )
+
+
+class _LocusP2Chunks:
+    """Re-iterable of P2 per chunk, for stars passing the P1 cut."""
+
+    def __init__(self, chunks, p1coeffs, p2coeffs):
+        self.chunks = chunks
+        self.p1coeffs = p1coeffs
+        self.p2coeffs = p2coeffs
+
+    def __iter__(self):
+        for g, r, i in self.chunks:
+            p1, p2 = calcP1P2Pair([None, g, r, i, None], self.p1coeffs, self.p2coeffs)
+            yield p2[(p1 < 0.6) & (p1 > -0.2)]
 
 
 def calcP1P2(mags, coeffs):
@@ -59,6 +354,41 @@ def calcP1P2(mags, coeffs):
     return p1p2
 
 
+def calcP1P2Pair(mags, p1coeffs, p2coeffs):
+    """Compute P1 and P2 together, skipping bands with zero coefficients.
+
+    This is equivalent to calling `calcP1P2` once with each set of
+    coefficients, but accumulates both projections band by band into one
+    ``(N, 2)`` array, so the magnitudes are read once and no arrays are
+    needed for unused bands.  The additions are done in the same order as
+    in `calcP1P2`, so the results are identical.
+
+    Parameters
+    ----------
+    mags : `list` of `numpy.ndarray` or `None`
+        u, g, r, i and z magnitudes.  Bands whose P1 and P2 coefficients
+        are both zero may be `None`.
+    p1coeffs, p2coeffs : `list` of `float`
+        Six P1 and P2 coefficients, as for `calcP1P2`.
+
+    Returns
+    -------
+    p1, p2 : `numpy.ndarray` of `float`
+        The P1 and P2 projections.
+    """
+    coeffs = np.array([p1coeffs, p2coeffs], dtype=float).T
+    bands = [band for band in range(len(mags)) if np.any(coeffs[band] != 0.0)]
+    p1p2 = None
+    for band in bands:
+        term = np.multiply(np.asarray(mags[band], dtype=float)[:, np.newaxis], coeffs[band])
+        if p1p2 is None:
+            p1p2 = term
+        else:
+            p1p2 += term
+    p1p2 += coeffs[len(mags)]
+    return p1p2[:, 0], p1p2[:, 1]
+
+
 def getCoeffs():
     # Coefficients from the Ivezic+2004 paper. Warning - if possible, the Coefficients
     # should be derived from a fit to the stellar locus rather than these "fallback" values.
@@ -185,15 +515,18 @@ def calcQuartileClippedStats(dataArray, nSigmaToClip=3.0):
             used in the calculation of the statistics, where `False` indicates
             a clipped datapoint (`numpy.ndarray` of `bool`).
     """
+    dataArray = np.asarray(dataArray)
     quartiles = np.percentile(dataArray, [25, 50, 75])
     assert len(quartiles) == 3
     median = quartiles[1]
     interQuartileDistance = quartiles[2] - quartiles[0]
     clipValue = nSigmaToClip*0.74*interQuartileDistance
     good = np.logical_not(np.abs(dataArray - median) > clipValue)
-    quartileClippedMean = dataArray[good].mean()
-    quartileClippedStdDev = dataArray[good].std()
-    quartileClippedRms = np.sqrt(np.mean(dataArray[good]**2))
+    # Select the unclipped data once and reduce that copy.
+    goodData = dataArray[good]
+    quartileClippedMean = goodData.mean()
+    quartileClippedStdDev = goodData.std()
+    quartileClippedRms = np.sqrt(np.mean(goodData**2))
 
     return Struct(
         median=median,
@@ -203,3 +536,74 @@ def calcQuartileClippedStats(dataArray, nSigmaToClip=3.0):
         clipValue=clipValue,
         goodArray=good,
     )
+
+
+def calcQuartileClippedStatsStreaming(chunks, nSigmaToClip=3.0, binWidth=1e-4, histRange=(-1.0, 1.0)):
+    """Calculate quartile-based clipped statistics of data supplied in chunks.
+
+    This is the streaming counterpart of `calcQuartileClippedStats`.  The
+    quartiles are interpolated from a fixed-resolution histogram built in a
+    first pass; a second pass accumulates the clipped sums.
+
+    Parameters
+    ----------
+    chunks : iterable of `numpy.ndarray` of `float`
+        The data, in any number of chunks.  It is iterated over twice, so it
+        must be a sequence or another re-iterable.
+    nSigmaToClip : `float`, optional
+        Number of \"sigma\" outside of which to clip data when computing the
+        statistics.
+    binWidth : `float`, optional
+        Width of the histogram bins used to locate the quartiles.
+    histRange : `tuple` of `float`, optional
+        Range of the histogram.  Values outside the range are counted, but the
+        quartiles themselves must fall inside it.
+
+    Returns
+    -------
+    result : `lsst.pipe.base.Struct`
+        As for `calcQuartileClippedStats`, without ``goodArray``.  The
+        quartiles, and hence ``median`` and ``clipValue``, are accurate to
+        ``binWidth``.
+    """
+    nBins = int(np.ceil((histRange[1] - histRange[0])/binWidth))
+    counts = np.zeros(nBins + 2, dtype=np.int64)
+    for chunk in chunks:
+        chunk = np.asarray(chunk)
+        idx = np.floor((chunk[np.isfinite(chunk)] - histRange[0])/binWidth)
+        idx = np.clip(idx, -1, nBins).astype(np.int64) + 1
+        counts += np.bincount(idx, minlength=nBins + 2)
+
+    cumCounts = np.cumsum(counts)
+    total = cumCounts[-1]
+    quartiles = []
+    for fraction in (0.25, 0.5, 0.75):
+        target = fraction*total
+        idx = np.searchsorted(cumCounts, target)
+        if idx == 0 or idx == nBins + 1:
+            raise ValueError(f"Quartile {fraction} falls outside the histogram range {histRange}.")
+        below = cumCounts[idx - 1]
+        frac = (target - below)/counts[idx]
+        quartiles.append(histRange[0] + (idx - 1 + frac)*binWidth)
+    median = quartiles[1]
+    clipValue = nSigmaToClip*0.74*(quartiles[2] - quartiles[0])
+
+    count = 0
+    sumData = 0.0
+    sumSquares = 0.0
+    for chunk in chunks:
+        chunk = np.asarray(chunk)
+        good = chunk[np.logical_not(np.abs(chunk - median) > clipValue)]
+        count += len(good)
+        sumData += np.sum(good)
+        sumSquares += np.dot(good, good)
+    mean = sumData/count
+    meanSquare = sumSquares/count
+
+    return Struct(
+        median=median,
+        mean=mean,
+        stdDev=np.sqrt(max(meanSquare - mean**2, 0.0)),
+        rms=np.sqrt(meanSquare),
+        clipValue=clipValue,
+    )
@@ -0,0 +1,151 @@
+import numpy as np
+
+from lsst.afw.table import SimpleCatalog, SimpleTable
+
+
+def makeSyntheticMatchedCatalog(nObjects, visitsPerObject=(5, 20), nVisits=50, density=100.,
+                                ra0=150., dec0=2., magRange=(16., 25.), countSlope=0.3,
+                                m5=24.5, seeing=700., astromFloor=5., photomFloor=0.005,
+                                galaxyFraction=0.5, saturationMag=17., flagRate=0.01,
+                                primaryFraction=0.98, psfEllipticity=0.02, shapeNoise=0.005,
+                                filt=4, randomSeed=None):
+    """Generate a matched catalog with the schema of the matched-catalog
+    inputs of the metric tasks.
+
+    Parameters
+    ----------
+    nObjects : `int`
+        Number of distinct objects.
+    visitsPerObject : `int` or `tuple` [`int`, `int`], optional
+        Number of observations of each object, or the inclusive range from
+        which each object's number is drawn uniformly.
+    nVisits : `int`, optional
+        Number of distinct visits.
+    density : `float`, optional
+        Sky density of objects [arcmin^-2]; the objects are spread uniformly
+        over a square field of the corresponding size.
+    ra0, dec0 : `float`, optional
+        Center of the field [degrees].
+    magRange : `tuple` [`float`, `float`], optional
+        Range of true magnitudes.
+    countSlope : `float`, optional
+        Slope of the number counts, ``d log10 N / dm``.
+    m5 : `float`, optional
+        Magnitude at which a single observation has SNR 5.
+    seeing : `float`, optional
+        Seeing FWHM [mas]; the astrometric error of an observation is
+        ``seeing/SNR`` added in quadrature to ``astromFloor``.
+    astromFloor : `float`, optional
+        Astrometric systematic floor [mas].
+    photomFloor : `float`, optional
+        Photometric systematic floor [mag].
+    galaxyFraction : `float`, optional
+        Fraction of objects flagged as extended.
+    saturationMag : `float`, optional
+        Observations brighter than this are flagged as saturated.
+    flagRate : `float`, optional
+        Probability of each of the cosmic-ray, bad-pixel and edge flags
+        being set on an observation.
+    primaryFraction : `float`, optional
+        Probability of ``detect_isPrimary`` being set on an observation.
+    psfEllipticity : `float`, optional
+        Scatter of the per-visit PSF ellipticity components.
+    shapeNoise : `float`, optional
+        Scatter of the measured minus PSF ellipticity of stars.
+    filt : `int`, optional
+        Value of the ``filt`` field (e.g. 4 for i; see ``filter_dict`` in
+        `lsst.faro.measurement`).
+    randomSeed : `int`, optional
+        Seed for the random number generator; the same seed gives the same
+        catalog.
+
+    Returns
+    -------
+    catalog : `lsst.afw.table.SimpleCatalog`
+        Contiguous catalog with one row per observation, sorted by
+        ``object``, so it can be passed to
+        `lsst.afw.table.GroupView.build` and to the matched-catalog measure
+        tasks.
+    """
+    rng = np.random.default_rng(randomSeed)
+
+    # Objects: positions, true magnitudes and morphology.
+    side = np.sqrt(nObjects/density)/60.
+    objDec = dec0 + side*(rng.random(nObjects) - 0.5)
+    objRa = ra0 + side*(rng.random(nObjects) - 0.5)/np.cos(np.deg2rad(dec0))
+    # Inverse transform sampling of N(m) ~ 10**(countSlope*m).
+    lo, hi = (10**(countSlope*m) for m in magRange)
+    objMag = np.log10(lo + (hi - lo)*rng.random(nObjects))/countSlope
+    objGalaxy = rng.random(nObjects) < galaxyFraction
+
+    if np.isscalar(visitsPerObject):
+        nObs = np.full(nObjects, int(visitsPerObject))
+    else:
+        nObs = rng.integers(visitsPerObject[0], visitsPerObject[1] + 1, nObjects)
+    nObs = np.minimum(nObs, nVisits)
+    objIndex = np.repeat(np.arange(nObjects), nObs)
+    nRows = len(objIndex)
+
+    # Each object is observed in consecutive visits from a random start, so
+    # no visit appears twice for the same object.
+    starts = np.cumsum(nObs) - nObs
+    visitIndex = (rng.integers(0, nVisits, nObjects)[objIndex]
+                  + np.arange(nRows) - np.repeat(starts, nObs)) % nVisits
+    visitPsfE1 = psfEllipticity*rng.standard_normal(nVisits)
+    visitPsfE2 = psfEllipticity*rng.standard_normal(nVisits)
+
+    # Observations: photometric and astrometric noise depend on SNR.
+    trueMag = objMag[objIndex]
+    snr = 5*10**(-0.4*(trueMag - m5))
+    magErr = np.hypot(2.5/np.log(10)/snr, photomFloor)
+    mag = trueMag + magErr*rng.standard_normal(nRows)
+    posErr = np.deg2rad(np.hypot(seeing/snr, astromFloor)/3.6e6)
+    dec = np.deg2rad(objDec[objIndex]) + posErr*rng.standard_normal(nRows)
+    ra = np.deg2rad(objRa[objIndex]) + posErr*rng.standard_normal(nRows)/np.cos(dec)
+    psfE1 = visitPsfE1[visitIndex]
+    psfE2 = visitPsfE2[visitIndex]
+
+    schema = SimpleTable.makeMinimalSchema()
+    schema.addField('object', type='L', doc='Matched object ID')
+    schema.addField('visit', type='I', doc='Visit ID')
+    schema.addField('filt', type='I', doc='Filter number')
+    for name, doc in [('base_PsfFlux_mag', 'PSF magnitude'),
+                      ('base_PsfFlux_magErr', 'PSF magnitude error'),
+                      ('base_PsfFlux_snr', 'PSF flux SNR'),
+                      ('base_GaussianFlux_mag', 'Gaussian magnitude'),
+                      ('base_GaussianFlux_magErr', 'Gaussian magnitude error'),
+                      ('base_GaussianFlux_snr', 'Gaussian flux SNR'),
+                      ('base_ClassificationExtendedness_value', 'Extendedness'),
+                      ('e1', 'Ellipticity e1'), ('e2', 'Ellipticity e2'),
+                      ('psf_e1', 'PSF ellipticity e1'), ('psf_e2', 'PSF ellipticity e2')]:
+        schema.addField(name, type='D', doc=doc)
+    for name in ['base_PixelFlags_flag_saturated', 'base_PixelFlags_flag_cr',
+                 'base_PixelFlags_flag_bad', 'base_PixelFlags_flag_edge', 'detect_isPrimary']:
+        schema.addField(name, type='Flag', doc=name)
+    schema.getAliasMap().set('slot_PsfFlux', 'base_PsfFlux')
+    schema.getAliasMap().set('slot_ModelFlux', 'base_GaussianFlux')
+
+    catalog = SimpleCatalog(schema)
+    catalog.resize(nRows)
+    catalog['id'] = np.arange(1, nRows + 1)
+    catalog['coord_ra'] = ra
+    catalog['coord_dec'] = dec
+    catalog['object'] = objIndex + 1
+    catalog['visit'] = visitIndex + 1
+    catalog['filt'] = np.full(nRows, filt)
+    catalog['base_PsfFlux_mag'] = mag
+    catalog['base_PsfFlux_magErr'] = magErr
+    catalog['base_PsfFlux_snr'] = snr
+    catalog['base_GaussianFlux_mag'] = mag
+    catalog['base_GaussianFlux_magErr'] = magErr
+    catalog['base_GaussianFlux_snr'] = snr
+    catalog['base_ClassificationExtendedness_value'] = objGalaxy[objIndex].astype(float)
+    catalog['psf_e1'] = psfE1
+    catalog['psf_e2'] = psfE2
+    catalog['e1'] = psfE1 + shapeNoise*rng.standard_normal(nRows)
+    catalog['e2'] = psfE2 + shapeNoise*rng.standard_normal(nRows)
+    catalog['base_PixelFlags_flag_saturated'] = trueMag < saturationMag
+    for name in ['base_PixelFlags_flag_cr', 'base_PixelFlags_flag_bad', 'base_PixelFlags_flag_edge']:
+        catalog[name] = rng.random(nRows) < flagRate
+    catalog['detect_isPrimary'] = rng.random(nRows) < primaryFraction
+    return catalog
@@ -2,7 +2,6 @@ import operator
 
 import astropy.units as u
 import numpy as np
-import treecorr
 
 from lsst.faro.utils.coord_util import averageRaFromCat, averageDecFromCat
 
@@ -60,6 +59,8 @@ def correlation_function_ellipticity(ra, dec, e1_res, e2_res,
     r, xip, xip_err : each a np.array(dtype=float)
         - The bin centers, two-point correlation, and uncertainty.
     """
+    import treecorr
+
     # Translate to 'verbose_level' here to refer to the integer levels in TreeCorr
     # While 'verbose' is more generically what is being passed around
     #   for verbosity within 'validate_drp'
@@ -25,12 +25,16 @@
 import unittest
 import numpy as np
 import os
+import tempfile
 import astropy.units as u
 
 from lsst.utils import getPackageDir
 from astropy.table import Table
-from metric_pipeline_utils.stellar_locus import stellarLocusResid
-from metric_pipeline_utils.extinction_corr import extinction_corr
+from metric_pipeline_utils.stellar_locus import (stellarLocusResid, stellarLocusResidStreaming,
+                                                 calcQuartileClippedStats, calcP1P2, calcP1P2Pair,
+                                                 stellarLocusBootstrap, _batchedQuartileClippedStats)
+from metric_pipeline_utils.extinction_corr import (extinction_corr, ebvFromRaDec, getSfdDustMap,
+                                                   EbvHealpixTable, ebvTableFilename)
 from metric_pipeline_tasks import WPerpTask
 
 
@@ -58,6 +62,43 @@ class StellarLocusTest(unittest.TestCase):
         self.assertEqual(np.mean(ebvValues), expected_mean_ebv)
         self.assertEqual(len(ebvValues), expected_len_ebv)
 
+    def test_ebvFromRaDec(self):
+        """Test the batched E(B-V) lookup against extinction_corr."""
+        cat = self.load_data()
+        ext_vals = extinction_corr(cat, ['r', 'g', 'i'])
+        ebvValues = ebvFromRaDec(np.asarray(cat['coord_ra_r']), np.asarray(cat['coord_dec_r']))
+        np.testing.assert_allclose(ebvValues, ext_vals['E(B-V)'], rtol=1e-6)
+        # The map is loaded once per process.
+        self.assertIs(getSfdDustMap(), getSfdDustMap())
+
+    def test_ebvHealpixTable(self):
+        """Test the precomputed E(B-V) table against the SFD lookup."""
+        cat = self.load_data()
+        ext_vals = extinction_corr(cat, ['r', 'g', 'i'])
+        table = EbvHealpixTable.fromCoords(cat['coord_ra_r'], cat['coord_dec_r'])
+        with tempfile.TemporaryDirectory() as tmpdir:
+            filename = ebvTableFilename(tmpdir, 9813)
+            table.write(filename)
+            table = EbvHealpixTable.read(filename)
+        table_vals = extinction_corr(cat, ['r', 'g', 'i'], ebvTable=table)
+        self.assertTrue(np.all(np.isfinite(table_vals['E(B-V)'])))
+        # Tolerance documented in EbvHealpixTable.
+        np.testing.assert_allclose(table_vals['E(B-V)'], ext_vals['E(B-V)'], atol=1e-3)
+
+    def test_ebvHealpixTablePartialCoverage(self):
+        """Positions a table does not cover fall back to the SFD lookup."""
+        cat = self.load_data()
+        ext_vals = extinction_corr(cat, ['r', 'g', 'i'])
+        ra = np.asarray(cat['coord_ra_r'])
+        dec = np.asarray(cat['coord_dec_r'])
+        west = ra < np.median(ra)
+        table = EbvHealpixTable.fromCoords(ra[west], dec[west], padding=0.)
+        self.assertFalse(np.all(table.covers(ra, dec)))
+        table_vals = extinction_corr(cat, ['r', 'g', 'i'], ebvTable=table)
+        np.testing.assert_allclose(table_vals['E(B-V)'], ext_vals['E(B-V)'], atol=1e-3)
+        table = table.merge(EbvHealpixTable.fromCoords(ra[~west], dec[~west], padding=0.))
+        self.assertTrue(np.all(table.covers(ra, dec)))
+
     def test_wPerp(self):
         """Test calculation of wPerp (stellar locus metric) on a known catalog."""
         cat = self.load_data()
@@ -71,6 +112,53 @@ class StellarLocusTest(unittest.TestCase):
         result = task.calc_wPerp(cat, ext_vals, 'wPerp')
         self.assertEqual(result.measurement.quantity, expected_wperp)
 
+    def test_wPerpBootstrap(self):
+        """Test the bootstrap uncertainty on wPerp."""
+        cat = self.load_data()
+        ext_vals = extinction_corr(cat, ['r', 'g', 'i'])
+
+        config = WPerpTask.ConfigClass()
+        config.nBootstrap = 30
+        config.bootstrapChunkSize = 7
+        task = WPerpTask(config=config)
+        result = task.calc_wPerp(cat, ext_vals, 'wPerp')
+        self.assertEqual(result.measurement.quantity, 12.18208045737346 * u.mmag)
+        wPerpErr = result.measurement.extras['wPerp_err'].quantity
+        self.assertTrue(np.isfinite(wPerpErr))
+        self.assertGreater(wPerpErr, 0*u.mmag)
+        # The resamples are drawn up front, so the chunking does not matter.
+        config.bootstrapChunkSize = 30
+        task = WPerpTask(config=config)
+        result2 = task.calc_wPerp(cat, ext_vals, 'wPerp')
+        self.assertEqual(result2.measurement.extras['wPerp_err'].quantity, wPerpErr)
+
+        # A single resample has no spread, and chunks must hold resamples.
+        config = WPerpTask.ConfigClass()
+        config.nBootstrap = 1
+        with self.assertRaises(ValueError):
+            config.validate()
+        config = WPerpTask.ConfigClass()
+        config.bootstrapChunkSize = 0
+        with self.assertRaises(ValueError):
+            config.validate()
+        with self.assertRaises(ValueError):
+            stellarLocusBootstrap(cat['base_PsfFlux_mag_g'], cat['base_PsfFlux_mag_r'],
+                                  cat['base_PsfFlux_mag_i'], nBoot=5, chunkSize=0)
+
+    def test_batchedQuartileClippedStats(self):
+        """Test the row-wise clipped statistics, with a row without data."""
+        rng = np.random.default_rng(1)
+        data = rng.normal(size=(3, 40))
+        mask = rng.random((3, 40)) > 0.3
+        mask[1] = False
+        result = _batchedQuartileClippedStats(data, mask)
+        for row in (0, 2):
+            expected = calcQuartileClippedStats(data[row][mask[row]])
+            for name in ('median', 'mean', 'stdDev', 'rms', 'clipValue'):
+                self.assertAlmostEqual(getattr(result, name)[row], getattr(expected, name))
+        for name in ('median', 'mean', 'stdDev', 'rms', 'clipValue'):
+            self.assertTrue(np.isnan(getattr(result, name)[1]))
+
     def test_stellarLocusResid(self):
         """Test calculation of stellar locus residuals on a known catalog."""
         cat = self.load_data()
@@ -92,6 +180,39 @@ class StellarLocusTest(unittest.TestCase):
         self.assertEqual(p1coeffs, expected_p1coeffs)
         self.assertEqual(p2coeffs, expected_p2coeffs)
 
+    def test_stellarLocusResidStreaming(self):
+        """Test the chunked stellar locus fit against the in-memory fit."""
+        cat = self.load_data()
+        bands = ['r', 'g', 'i']
+        ext_vals = extinction_corr(cat, bands)
+        gmags = np.asarray(cat['base_PsfFlux_mag_g']-ext_vals['A_g'])
+        rmags = np.asarray(cat['base_PsfFlux_mag_r']-ext_vals['A_r'])
+        imags = np.asarray(cat['base_PsfFlux_mag_i']-ext_vals['A_i'])
+
+        p1, p2, p1coeffs, p2coeffs = stellarLocusResid(gmags, rmags, imags)
+        chunks = [(gmags[start:start+50], rmags[start:start+50], imags[start:start+50])
+                  for start in range(0, len(gmags), 50)]
+        result = stellarLocusResidStreaming(chunks)
+
+        np.testing.assert_allclose(result.p1Coeffs, p1coeffs, atol=1e-12)
+        np.testing.assert_allclose(result.p2Coeffs, p2coeffs, atol=1e-12)
+        self.assertEqual(result.count, len(p2))
+        # Quartiles are interpolated from histograms with 1e-4 mag bins.
+        self.assertAlmostEqual(result.p2Stats.rms, calcQuartileClippedStats(p2).rms, delta=1e-4)
+
+    def test_calcP1P2Pair(self):
+        """Test that the combined P1/P2 projection matches calcP1P2."""
+        cat = self.load_data()
+        mags = [cat[f'base_PsfFlux_mag_{band}'] for band in 'gri']
+        zeros = np.zeros(len(cat))
+        p1coeffs = [0.0, 0.8865855025842218, -0.424020754027349, -0.46256474855687274,
+                    0.0, -0.3073194572752734]
+        p2coeffs = [0.0, -0.2754432193878283, 0.8033778833591981, -0.5279346639713699,
+                    0.0, 0.03544642888292535]
+        p1, p2 = calcP1P2Pair([None] + mags + [None], p1coeffs, p2coeffs)
+        np.testing.assert_array_equal(p1, calcP1P2([zeros] + mags + [zeros], p1coeffs))
+        np.testing.assert_array_equal(p2, calcP1P2([zeros] + mags + [zeros], p2coeffs))
+
 
 if __name__ == "__main__":
     unittest.main()
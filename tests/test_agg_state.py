@@ -0,0 +1,71 @@
+# This file is part of <REPLACE WHEN RENAMED>.
+#
+# Developed for the LSST Data Management System.
+# This product includes software developed by the LSST Project
+# (http://www.lsst.org).
+# See the COPYRIGHT file at the top-level directory of this distribution
+# for details of code ownership.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Unit tests for the metrics measurement system.
+"""
+
+import os
+import tempfile
+import unittest
+import numpy as np
+
+from lsst.faro.utils.agg_state import (makeAggState, updateAggState, aggStateSummary,
+                                       readAggState, writeAggState)
+
+
+class AggStateTest(unittest.TestCase):
+
+    def setUp(self):
+        rng = np.random.default_rng(12345)
+        self.batches = [rng.normal(5., 2., size) for size in (1, 10, 0, 300, 57)]
+        self.values = np.concatenate(self.batches)
+
+    def test_incremental(self):
+        """Test that folding batches in one at a time, with a round trip
+        through the state file, matches statistics of all the values."""
+        state = makeAggState('mmag')
+        with tempfile.TemporaryDirectory() as tempdir:
+            filename = os.path.join(tempdir, 'state.json')
+            for i, batch in enumerate(self.batches):
+                state = updateAggState(state, [f'patch={i}'], batch)
+                writeAggState(state, filename)
+                state = readAggState(filename)
+        self.assertEqual(state['seen'], [f'patch={i}' for i in range(len(self.batches))])
+        self.assertEqual(aggStateSummary(state, 'count'), len(self.values))
+        self.assertAlmostEqual(aggStateSummary(state, 'mean'), np.mean(self.values), places=12)
+        self.assertAlmostEqual(aggStateSummary(state, 'std'), np.std(self.values), places=12)
+        self.assertAlmostEqual(aggStateSummary(state, 'sum'), np.sum(self.values), places=9)
+        self.assertEqual(aggStateSummary(state, 'min'), np.min(self.values))
+        self.assertEqual(aggStateSummary(state, 'max'), np.max(self.values))
+        self.assertAlmostEqual(aggStateSummary(state, 'median'), np.median(self.values), delta=0.05)
+
+    def test_empty(self):
+        """Test summaries of a state with no values."""
+        state = makeAggState('mmag')
+        self.assertIsNone(readAggState('/nonexistent/state.json'))
+        self.assertEqual(aggStateSummary(state, 'count'), 0)
+        self.assertTrue(np.isnan(aggStateSummary(state, 'median')))
+        with self.assertRaises(ValueError):
+            aggStateSummary(updateAggState(state, ['a'], [1.]), 'mode')
+
+
+if __name__ == "__main__":
+    unittest.main()
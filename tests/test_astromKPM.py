@@ -78,6 +78,33 @@ class AmxTest(unittest.TestCase):
             self.assertTrue(u.allclose(result.measurement.extras['values'].quantity,
                             expected.extras['values'].quantity))
 
+    def test_am1_approximate(self):
+        """Test am1 computed from a sample of the pairs of objects."""
+        config = AMxTask.ConfigClass()
+        config.annulus_r = 5.0
+        config.doApproximate = True
+        task = AMxTask(config=config)
+        catalog, expected = self.load_data(('AM1', 'i'))
+        # All pairs are used when there are fewer than maxPairs.
+        result = task.run(catalog, 'AM1')
+        extras = result.measurement.extras
+        self.assertEqual(result.measurement.quantity, expected.quantity)
+        self.assertEqual(extras['pairs_sampled'].quantity, extras['pairs_total'].quantity)
+        low, high = extras['median_ci'].quantity
+        self.assertLessEqual(low, result.measurement.quantity)
+        self.assertGreaterEqual(high, result.measurement.quantity)
+
+        config.maxPairs = int(extras['pairs_total'].quantity.value) // 4
+        task = AMxTask(config=config)
+        result = task.run(catalog, 'AM1')
+        extras = result.measurement.extras
+        self.assertEqual(extras['pairs_sampled'].quantity.value, config.maxPairs)
+        low, high = extras['median_ci'].quantity
+        self.assertLessEqual(low, result.measurement.quantity)
+        self.assertGreaterEqual(high, result.measurement.quantity)
+        # The sample depends only on the seed.
+        self.assertEqual(task.run(catalog, 'AM1').measurement, result.measurement)
+
     def test_af1(self):
         """Test calculation of af1 on a known catalog."""
         config = AFxTask.ConfigClass()
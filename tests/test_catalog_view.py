@@ -0,0 +1,138 @@
+# This file is part of <REPLACE WHEN RENAMED>.
+#
+# Developed for the LSST Data Management System.
+# This product includes software developed by the LSST Project
+# (http://www.lsst.org).
+# See the COPYRIGHT file at the top-level directory of this distribution
+# for details of code ownership.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Unit tests for the metrics measurement system.
+"""
+
+import unittest
+import os
+import numpy as np
+from types import SimpleNamespace
+
+from lsst.utils import getPackageDir
+from lsst.afw.table import SimpleCatalog
+from lsst.faro.utils.catalog_view import (MultiCatalogView, RowCountCatalog, readRowCount,
+                                          readCatalog, projectCatalog)
+from lsst.faro.utils.filtermatches import filterMatchesColumns
+from lsst.faro.utils.phot_repeat import photRepeat
+
+
+DATADIR = os.path.join(getPackageDir('metric_pipeline_tasks'), 'tests', 'data')
+
+
+class MultiCatalogViewTest(unittest.TestCase):
+    """Test the lazy multi-catalog view."""
+
+    def setUp(self):
+        cat_file = 'matchedCatalogTract_0_i.fits.gz'
+        self.catalog = SimpleCatalog.readFits(os.path.join(DATADIR, cat_file))
+        # Split into uneven pieces, including an empty one.
+        edges = [0, 10, 10, len(self.catalog)//3, len(self.catalog)]
+        self.pieces = [self.catalog[start:end] for start, end in zip(edges[:-1], edges[1:])]
+        self.view = MultiCatalogView(self.pieces)
+
+    def test_length_and_iteration(self):
+        self.assertEqual(len(self.view), len(self.catalog))
+        self.assertEqual([rec.getId() for rec in self.view], list(self.catalog['id']))
+        self.assertEqual(self.view[12].getId(), self.catalog[12].getId())
+        self.assertEqual(self.view[-1].getId(), self.catalog[-1].getId())
+        with self.assertRaises(IndexError):
+            self.view[len(self.catalog)]
+
+    def test_columns(self):
+        self.assertEqual(self.view.schema, self.catalog.schema)
+        key = self.catalog.schema.find('slot_PsfFlux_mag').key
+        np.testing.assert_array_equal(self.view.get('slot_PsfFlux_mag'), self.catalog['slot_PsfFlux_mag'])
+        np.testing.assert_array_equal(self.view[key], self.catalog[key])
+
+    def test_copy(self):
+        copy = self.view.copy(deep=True)
+        self.assertTrue(copy.isContiguous())
+        np.testing.assert_array_equal(copy['id'], self.catalog['id'])
+
+
+class ProjectCatalogTest(unittest.TestCase):
+    """Test column projection of catalogs."""
+
+    def test_projectCatalog(self):
+        catalog = SimpleCatalog.readFits(os.path.join(DATADIR, 'matchedCatalogTract_0_i.fits.gz'))
+        projected = projectCatalog(catalog, filterMatchesColumns + ('not_a_column',))
+        self.assertLess(len(projected.schema.getNames()), len(catalog.schema.getNames()))
+        self.assertTrue(projected.isContiguous())
+        # Aliases still resolve in the projected catalog.
+        np.testing.assert_array_equal(projected['slot_PsfFlux_mag'], catalog['slot_PsfFlux_mag'])
+        np.testing.assert_array_equal(projected['coord_ra'], catalog['coord_ra'])
+        # Measurements using only the projected columns are unchanged.
+        expected = photRepeat(catalog, randomSeed=12345)
+        result = photRepeat(projected, randomSeed=12345)
+        self.assertEqual(result['repeatability'], expected['repeatability'])
+
+    def test_readCatalogUnprojected(self):
+        """Catalogs that cannot be read column by column are not copied."""
+        catalog = SimpleCatalog.readFits(os.path.join(DATADIR, 'matchedCatalogTract_0_i.fits.gz'))
+        self.assertIs(readCatalog(MockCatalogHandle(catalog, 'SimpleCatalog'), filterMatchesColumns),
+                      catalog)
+
+
+class MockURI:
+    def __init__(self, path):
+        self.ospath = path
+        self.isLocal = True
+
+
+class MockButler:
+    def getURI(self, ref):
+        return MockURI(ref)
+
+
+class MockHandle:
+    def __init__(self, path):
+        self.butler = MockButler()
+        self.ref = path
+
+    def get(self):
+        raise AssertionError("The catalog should not be read.")
+
+
+class MockCatalogHandle:
+    def __init__(self, catalog, storageClassName):
+        self.catalog = catalog
+        self.butler = None
+        self.ref = SimpleNamespace(datasetType=SimpleNamespace(
+            storageClass=SimpleNamespace(name=storageClassName)))
+
+    def get(self):
+        return self.catalog
+
+
+class RowCountTest(unittest.TestCase):
+    """Test reading catalog lengths from FITS headers."""
+
+    def test_readRowCount(self):
+        filename = os.path.join(DATADIR, 'matchedCatalogTract_0_i.fits.gz')
+        expected = len(SimpleCatalog.readFits(filename))
+        self.assertEqual(readRowCount(MockHandle(filename)), expected)
+        view = MultiCatalogView([RowCountCatalog(expected), RowCountCatalog(3)])
+        self.assertEqual(len(view), expected + 3)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,82 @@
+# This file is part of <REPLACE WHEN RENAMED>.
+#
+# Developed for the LSST Data Management System.
+# This product includes software developed by the LSST Project
+# (http://www.lsst.org).
+# See the COPYRIGHT file at the top-level directory of this distribution
+# for details of code ownership.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Unit tests for filterMatches.
+"""
+
+import unittest
+import os
+import numpy as np
+
+from lsst.utils import getPackageDir
+from lsst.afw.table import SimpleCatalog
+from lsst.daf.base import PropertyList
+from lsst.faro.utils import filtermatches
+from lsst.faro.utils.filtermatches import filterMatches, filterStatsToMetadata
+
+
+DATADIR = os.path.join(getPackageDir('metric_pipeline_tasks'), 'tests', 'data')
+
+
+class FilterMatchesTest(unittest.TestCase):
+    """Test the selection counters and adaptive ordering of filterMatches."""
+
+    def setUp(self):
+        self.catalog = SimpleCatalog.readFits(os.path.join(DATADIR, 'matchedCatalogTract_0_i.fits.gz'))
+        self.expected = filterMatches(self.catalog)
+
+    def test_stats(self):
+        stats = {}
+        filtered = filterMatches(self.catalog, stats=stats)
+        np.testing.assert_array_equal(filtered.ids, self.expected.ids)
+        self.assertEqual(list(stats), ['nMatch', 'snr', 'ptsrc', 'flag', 'isPrimary'])
+        # Every group is evaluated by the first criterion, and each criterion
+        # sees the groups that passed the previous ones.
+        nGroups = len(np.unique(self.catalog['object']))
+        self.assertEqual(stats['nMatch']['evaluated'], nGroups)
+        names = list(stats)
+        for previous, name in zip(names[:-1], names[1:]):
+            self.assertEqual(stats[name]['evaluated'],
+                             stats[previous]['evaluated'] - stats[previous]['rejected'])
+        self.assertEqual(stats['isPrimary']['evaluated'] - stats['isPrimary']['rejected'],
+                         filtered.count)
+
+        metadata = PropertyList()
+        filterStatsToMetadata(stats, metadata)
+        self.assertEqual(metadata.getScalar('filterSnrRejected'), stats['snr']['rejected'])
+
+    def test_adaptiveOrder(self):
+        """Reordering the criteria does not change the selection."""
+        sampleSize = filtermatches.adaptiveSampleSize
+        filtermatches.adaptiveSampleSize = 20
+        try:
+            stats = {}
+            filtered = filterMatches(self.catalog, stats=stats, adaptiveOrder=True)
+        finally:
+            filtermatches.adaptiveSampleSize = sampleSize
+        np.testing.assert_array_equal(filtered.ids, self.expected.ids)
+        self.assertEqual(len(filtered), len(self.expected))
+        for record in stats.values():
+            self.assertGreaterEqual(record['evaluated'], 20)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -26,8 +26,7 @@ import unittest
 import numpy as np
 import astropy.units as u
 
-from lsst.faro.measurement import HistMedianTask
-from lsst.pex.config import Config
+from lsst.faro.measurement import HistMedianTask, HistMedianTaskConfig
 
 
 class MockMeas:
@@ -44,7 +43,7 @@ class HistMedianTest(unittest.TestCase):
 
     def test_hist_mode(self):
         """Test the aggregator that takes the mode of a histogram."""
-        task = HistMedianTask(config=Config())
+        task = HistMedianTask(config=HistMedianTaskConfig())
         values = np.array([0, 2, 4, 6, 8, 10, 14, 12, 16, 12, 8, 4, 0])*u.count
         bins = np.array([(i+1)*0.3 for i in range(len(values)+1)])*u.m
         expected = 2.5*u.m
@@ -57,6 +56,33 @@ class HistMedianTest(unittest.TestCase):
         result = task.run(mock_meas_arr, 'test', 'info', 'mock')
         self.assertEqual(expected, result.measurement.quantity)
 
+    def test_hist_quantiles(self):
+        """Test extra quantiles, including ones falling in the first bin."""
+        config = HistMedianTaskConfig()
+        config.extraQuantiles = [0.1, 0.9]
+        task = HistMedianTask(config=config)
+        values = np.array([10, 0, 0, 10])*u.count
+        bins = np.array([0., 1., 2., 3., 4.])*u.m
+        original = values.copy()
+        mock_meas_arr = [MockMeas({'values': MockExtra(values), 'bins': MockExtra(bins)})
+                         for i in range(3)]
+        result = task.run(mock_meas_arr, 'test', 'info', 'mock')
+        self.assertEqual(result.measurement.quantity, 1.*u.m)
+        self.assertAlmostEqual(result.measurement.extras['q0.1'].quantity.to_value(u.m), 0.2)
+        self.assertAlmostEqual(result.measurement.extras['q0.9'].quantity.to_value(u.m), 3.8)
+        # The inputs are not modified.
+        np.testing.assert_array_equal(values, original)
+
+    def test_hist_rebin(self):
+        """Test merging histograms with different bin edges."""
+        task = HistMedianTask(config=HistMedianTaskConfig())
+        coarse = MockMeas({'values': MockExtra(np.array([4, 4])*u.count),
+                           'bins': MockExtra(np.array([0., 2., 4.])*u.m)})
+        fine = MockMeas({'values': MockExtra(np.array([1, 1, 1, 1, 1, 1, 1, 1])*u.count),
+                         'bins': MockExtra(np.arange(0., 450., 50.)*u.cm)})
+        result = task.run([coarse, fine], 'test', 'info', 'mock')
+        self.assertAlmostEqual(result.measurement.quantity.to_value(u.m), 2.)
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -22,8 +22,46 @@
 """Unit tests for the metrics measurement system.
 """
 
+import subprocess
+import sys
 import unittest
 
+# Modules that should only be imported when a metric that needs them runs.
+LAZY_MODULES = ['treecorr', 'dustmaps', 'healpy', 'scipy.stats', 'astropy.table', 'astropy.coordinates']
+
+# LSST stack packages imported by lsst.faro.
+STACK_MODULES = ['lsst.afw.table', 'lsst.daf.butler', 'lsst.pex.config', 'lsst.pipe.base', 'lsst.verify',
+                 'lsst.verify.tasks']
+
+FARO_MODULES = ['lsst.faro.base', 'lsst.faro.measurement', 'lsst.faro.preparation', 'lsst.faro.scripts']
+
+IMPORT_SCRIPT = """
+import importlib
+import sys
+before = set(sys.modules)
+for name in sys.argv[1:]:
+    importlib.import_module(name)
+print(' '.join(sorted(set(sys.modules) - before)))
+"""
+
+
+def importInFreshInterpreter(modules):
+    """Import modules in a new interpreter.
+
+    Parameters
+    ----------
+    modules : `list` [`str`]
+        Names of the modules to import.
+
+    Returns
+    -------
+    loaded : `set` [`str`]
+        Names of all the modules loaded by the imports.
+    """
+    output = subprocess.run([sys.executable, '-c', IMPORT_SCRIPT] + modules, check=True,
+                            stdout=subprocess.PIPE, universal_newlines=True).stdout
+    return set(output.split())
+
 
 class ImportTest(unittest.TestCase):
 
@@ -42,6 +80,18 @@ class ImportTest(unittest.TestCase):
         dir(su)
         dir(u)
 
+    def test_lazy_imports(self):
+        """Test that heavy optional dependencies are not imported with the
+        package.  The import time is measured by
+        ``benchmarks/benchmark_import.py``."""
+        stackLoaded = importInFreshInterpreter(STACK_MODULES)
+        faroLoaded = importInFreshInterpreter(STACK_MODULES + FARO_MODULES)
+        for module in LAZY_MODULES:
+            if module in stackLoaded:
+                # The stack loads it anyway; lsst.faro cannot avoid it.
+                continue
+            self.assertNotIn(module, faroLoaded)
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,124 @@
+# This file is part of <REPLACE WHEN RENAMED>.
+#
+# Developed for the LSST Data Management System.
+# This product includes software developed by the LSST Project
+# (http://www.lsst.org).
+# See the COPYRIGHT file at the top-level directory of this distribution
+# for details of code ownership.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Unit tests for the metrics measurement system.
+"""
+
+import os
+import tempfile
+import unittest
+import numpy as np
+import astropy.units as u
+
+from lsst.pipe.base import Struct
+from lsst.faro.summary.MatchedCatalogsAggregation import MatchedCatalogsAggregationTask
+
+
+class MockMeas:
+    def __init__(self, quantity):
+        self.quantity = quantity
+
+
+class MockDataId(dict):
+    def byName(self):
+        return dict(self)
+
+
+class MockRef:
+    def __init__(self, id, run, dataId):
+        self.id = id
+        self.run = run
+        self.dataId = MockDataId(dataId)
+
+
+class MockButlerQC:
+    """Butler holding input measurements by dataset ID, and recording the
+    inputs read and the outputs written."""
+
+    def __init__(self, measurements):
+        self.measurements = measurements
+        self.read = []
+        self.written = []
+
+    def get(self, ref):
+        self.read.append(ref.id)
+        return self.measurements[ref.id]
+
+    def put(self, struct, outputRefs):
+        self.written.append(struct.measurement)
+
+
+class IncrementalAggregationTest(unittest.TestCase):
+
+    def setUp(self):
+        rng = np.random.default_rng(12345)
+        self.values = rng.normal(10., 2., 20)
+        self.measurements = {i: MockMeas(value*u.mmag) for i, value in enumerate(self.values)}
+        self.tempdir = tempfile.TemporaryDirectory()
+        config = MatchedCatalogsAggregationTask.ConfigClass()
+        config.connections.agg_name = 'mean'
+        config.connections.package = 'info'
+        config.connections.metric = 'mock'
+        config.doIncremental = True
+        config.stateDir = self.tempdir.name
+        self.task = MatchedCatalogsAggregationTask(config=config)
+
+    def tearDown(self):
+        self.tempdir.cleanup()
+
+    def runQuantum(self, ids, run):
+        butlerQC = MockButlerQC(self.measurements)
+        dataId = {'instrument': 'HSC', 'tract': 0, 'band': 'r'}
+        inputRefs = Struct(measurements=[MockRef(i, 'input', dict(dataId, patch=i)) for i in ids])
+        outputRefs = Struct(measurement=MockRef(1000 + len(ids), run, dataId))
+        self.task.runQuantum(butlerQC, inputRefs, outputRefs)
+        return butlerQC
+
+    def test_state_reused_across_runs(self):
+        """Test that an invocation into a new run, as with --replace-run,
+        reads only the new measurements."""
+        first = self.runQuantum(range(10), 'meanPA1/20210101T000000Z')
+        self.assertEqual(first.read, list(range(10)))
+        second = self.runQuantum(range(20), 'meanPA1/20210102T000000Z')
+        self.assertEqual(second.read, list(range(10, 20)))
+        self.assertAlmostEqual(second.written[0].quantity.to_value(u.mmag), np.mean(self.values),
+                               places=12)
+        # A state including measurements that are no longer inputs is
+        # rebuilt from all the inputs.
+        third = self.runQuantum(range(5), 'meanPA1/20210103T000000Z')
+        self.assertEqual(third.read, list(range(5)))
+        self.assertAlmostEqual(third.written[0].quantity.to_value(u.mmag), np.mean(self.values[:5]),
+                               places=12)
+
+    def test_no_state_without_measurements(self):
+        """Test that no state is written until a measurement provides its
+        unit."""
+        empty = self.runQuantum([], 'meanPA1/20210101T000000Z')
+        self.assertTrue(np.isnan(empty.written[0].quantity))
+        self.assertEqual(os.listdir(self.tempdir.name), [])
+        second = self.runQuantum(range(10), 'meanPA1/20210102T000000Z')
+        self.assertEqual(second.written[0].quantity.unit, u.mmag)
+        self.assertAlmostEqual(second.written[0].quantity.to_value(u.mmag), np.mean(self.values[:10]),
+                               places=12)
+
+
+if __name__ == "__main__":
+    unittest.main()
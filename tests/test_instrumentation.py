@@ -0,0 +1,81 @@
+# This file is part of <REPLACE WHEN RENAMED>.
+#
+# Developed for the LSST Data Management System.
+# This product includes software developed by the LSST Project
+# (http://www.lsst.org).
+# See the COPYRIGHT file at the top-level directory of this distribution
+# for details of code ownership.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Unit tests for the stage instrumentation.
+"""
+
+import unittest
+import numpy as np
+
+import astropy.units as u
+from lsst.daf.base import PropertyList
+
+from lsst.faro.utils.instrumentation import StageTimer, getStageTimer
+
+
+class StageTimerTest(unittest.TestCase):
+    """Test the per-stage timing and memory records."""
+
+    def test_stages(self):
+        timer = StageTimer()
+        with timer.stage('sum', rows=1000) as stage:
+            stage['groups'] = 10
+            np.sum(np.ones(1000))
+        with timer.stage('sum', rows=500):
+            pass
+        record = timer.stages['sum']
+        self.assertEqual(record['rows'], 1500)
+        self.assertEqual(record['groups'], 10)
+        self.assertGreaterEqual(record['wallTime'], 0.0)
+        self.assertGreaterEqual(record['cpuTime'], 0.0)
+        self.assertGreaterEqual(record['maxRssDelta'], 0)
+
+        metadata = PropertyList()
+        timer.toMetadata(metadata)
+        self.assertEqual(metadata.getScalar('sumRows'), 1500)
+        self.assertEqual(metadata.getScalar('sumWallTime'), record['wallTime'])
+
+        extras = timer.toExtras()
+        self.assertEqual(extras['stage_sum_rows'].quantity, 1500*u.count)
+        self.assertEqual(extras['stage_sum_wallTime'].quantity.unit, u.s)
+
+        timer.reset()
+        self.assertEqual(timer.stages, {})
+
+    def test_disabled(self):
+        timer = StageTimer(enabled=False)
+        with timer.stage('sum', rows=10) as stage:
+            stage['groups'] = 1
+        self.assertEqual(timer.stages, {})
+        # Tasks without a timer get a disabled one.
+        self.assertFalse(getStageTimer(object()).enabled)
+
+    def test_exception(self):
+        """A stage that raises is still recorded."""
+        timer = StageTimer()
+        with self.assertRaises(RuntimeError):
+            with timer.stage('fail'):
+                raise RuntimeError('failed')
+        self.assertIn('fail', timer.stages)
+
+
+if __name__ == "__main__":
+    unittest.main()
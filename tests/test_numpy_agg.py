@@ -0,0 +1,77 @@
+# This file is part of <REPLACE WHEN RENAMED>.
+#
+# Developed for the LSST Data Management System.
+# This product includes software developed by the LSST Project
+# (http://www.lsst.org).
+# See the COPYRIGHT file at the top-level directory of this distribution
+# for details of code ownership.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Unit tests for the metrics measurement system.
+"""
+
+import unittest
+import numpy as np
+import astropy.units as u
+
+from lsst.faro.base.BaseSubTasks import NumpyAggTask, NumpyAggTaskConfig
+
+
+class MockMeas:
+    def __init__(self, quantity):
+        self.quantity = quantity
+
+
+class NumpyAggTest(unittest.TestCase):
+
+    def setUp(self):
+        rng = np.random.default_rng(12345)
+        self.values = rng.normal(10., 2., 1000)
+        self.values[::100] = np.nan
+        self.measurements = [MockMeas(value*u.mmag) for value in self.values]
+        # Convertible units are converted to the unit of the first measurement.
+        self.measurements[1] = MockMeas(self.values[1]/1000.*u.mag)
+
+    def test_summary(self):
+        """Test that the fast path matches a reduction over a Quantity list."""
+        task = NumpyAggTask(config=NumpyAggTaskConfig())
+        result = task.run(self.measurements, 'summary', 'info', 'mock')
+        expected = np.median(u.Quantity([x.quantity for x in self.measurements
+                                         if np.isfinite(x.quantity)]))
+        self.assertEqual(result.measurement.quantity.unit, u.mmag)
+        self.assertAlmostEqual(result.measurement.quantity.value, expected.to_value(u.mmag), places=12)
+
+    def test_extra_stats(self):
+        """Test computing several statistics from one load."""
+        config = NumpyAggTaskConfig()
+        config.extraStats = ['mean', 'std', 'p10', 'p90']
+        task = NumpyAggTask(config=config)
+        result = task.run(self.measurements, 'mean', 'info', 'mock')
+        finite = self.values[np.isfinite(self.values)]
+        extras = result.measurement.extras
+        self.assertAlmostEqual(extras['mean'].quantity.to_value(u.mmag), np.mean(finite), places=12)
+        self.assertAlmostEqual(extras['std'].quantity.to_value(u.mmag), np.std(finite), places=12)
+        self.assertAlmostEqual(extras['p10'].quantity.to_value(u.mmag), np.percentile(finite, 10), places=12)
+        self.assertAlmostEqual(extras['p90'].quantity.to_value(u.mmag), np.percentile(finite, 90), places=12)
+
+    def test_empty(self):
+        """Test that an empty list gives NaN."""
+        task = NumpyAggTask(config=NumpyAggTaskConfig())
+        result = task.run([], 'summary', 'info', 'mock')
+        self.assertTrue(np.isnan(result.measurement.quantity))
+
+
+if __name__ == "__main__":
+    unittest.main()
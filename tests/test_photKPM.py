@@ -26,10 +26,17 @@ import unittest
 import yaml
 import os
 import random
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import astropy.units as u
 
 from lsst.utils import getPackageDir
 from lsst.afw.table import SimpleCatalog
 from lsst.faro.measurement import PA1Task, PA2Task, PF1Task
+from lsst.faro.utils.filtermatches import filterMatches
+from lsst.faro.utils.phot_repeat import AbsDiffHistogram, calcPhotRepeat
+from lsst.faro.utils.quantile_sketch import tdigestFromExtras, tdigestQuantile
 
 # Make sure measurements are deterministic
 random.seed(8675309)
@@ -78,6 +85,99 @@ class Pa1Test(unittest.TestCase):
             result = task.run(catalog, 'PA1')
             self.assertEqual(result.measurement, expected)
 
+    def test_pa1_spawned_streams(self):
+        """Test pa1 with one random stream per shuffle."""
+        config = PA1Task.ConfigClass()
+        config.randomStreams = 'spawn'
+        task = PA1Task(config=config)
+        catalog, expected = self.load_data(('PA1', 'i'))
+        result = task.run(catalog, 'PA1')
+        # A different, but statistically equivalent, sample of pairs.
+        self.assertAlmostEqual(result.measurement.quantity.value, expected.quantity.value,
+                               delta=0.1*expected.quantity.value)
+
+    def test_pa1_repeatability_curve(self):
+        """Test the repeatability curve stored with pa1."""
+        config = PA1Task.ConfigClass()
+        config.doRepeatabilityCurve = True
+        config.curveBinEdges = [20., 50., np.inf]
+        config.validate()
+        task = PA1Task(config=config)
+        catalog, expected = self.load_data(('PA1', 'i'))
+        result = task.run(catalog, 'PA1')
+        # A different, but statistically equivalent, sample of pairs.
+        self.assertAlmostEqual(result.measurement.quantity.value, expected.quantity.value,
+                               delta=0.1*expected.quantity.value)
+        extras = result.measurement.extras
+        counts = extras['curve_count'].quantity.value
+        self.assertEqual(counts[1], filterMatches(catalog).count)
+        self.assertEqual(counts.sum(), filterMatches(catalog, snrMin=20.).count)
+        # The bright bin holds the objects of pa1, from the same shuffles.
+        self.assertAlmostEqual(extras['curve_repeatability'].quantity[1].value,
+                               result.measurement.quantity.value, places=10)
+
+        # The curve honours the random streams.
+        config.randomStreams = 'spawn'
+        config.shuffleChunkSize = 10
+        spawned = PA1Task(config=config).run(catalog, 'PA1').measurement
+        config.numProcesses = 2
+        parallel = PA1Task(config=config).run(catalog, 'PA1').measurement
+        self.assertEqual(parallel.quantity, spawned.quantity)
+        np.testing.assert_array_equal(parallel.extras['curve_repeatability'].quantity,
+                                      spawned.extras['curve_repeatability'].quantity)
+
+        config.curveBinEdges = [50., 20.]
+        with self.assertRaises(ValueError):
+            config.validate()
+
+    def test_spawned_streams_reproducible(self):
+        """The spawned streams do not depend on how the shuffles are run."""
+        catalog, _ = self.load_data(('PA1', 'i'))
+        matches = filterMatches(catalog)
+        magKey = matches.schema.find('slot_PsfFlux_mag').key
+        serial = calcPhotRepeat(matches, magKey, numRandomShuffles=7, randomSeed=1,
+                                randomStreams='spawn', chunkSize=10)
+        with ThreadPoolExecutor(max_workers=3) as executor:
+            parallel = calcPhotRepeat(matches, magKey, numRandomShuffles=7, randomSeed=1,
+                                      randomStreams='spawn', chunkSize=10, executor=executor)
+        self.assertEqual(serial['magDiff'].shape, (7, matches.count))
+        np.testing.assert_array_equal(serial['magDiff'], parallel['magDiff'])
+        # The first shuffles do not depend on the number of shuffles.
+        fewer = calcPhotRepeat(matches, magKey, numRandomShuffles=3, randomSeed=1,
+                               randomStreams='spawn', chunkSize=10)
+        np.testing.assert_array_equal(fewer['magDiff'], serial['magDiff'][:3])
+
+        with self.assertRaises(ValueError):
+            calcPhotRepeat(matches, magKey, numRandomShuffles=3, randomSeed=1,
+                           randomStreams='spawn', chunkSize=-10)
+        config = PA2Task.ConfigClass()
+        config.shuffleChunkSize = -10
+        with self.assertRaises(ValueError):
+            config.validate()
+
+    def test_spawned_streams_processes(self):
+        """Shuffles computed in a process pool match those computed in
+        process.
+        """
+        catalog, _ = self.load_data(('PA1', 'i'))
+        matches = filterMatches(catalog)
+        magKey = matches.schema.find('slot_PsfFlux_mag').key
+        expected = calcPhotRepeat(matches, magKey, numRandomShuffles=5, randomSeed=1,
+                                  randomStreams='spawn')
+        result = calcPhotRepeat(matches, magKey, numRandomShuffles=5, randomSeed=1,
+                                randomStreams='spawn', numProcesses=2)
+        np.testing.assert_array_equal(result['magDiff'], expected['magDiff'])
+        np.testing.assert_array_equal(result['iqr'], expected['iqr'])
+        widths = calcPhotRepeat(matches, magKey, numRandomShuffles=5, randomSeed=1,
+                                randomStreams='spawn', numProcesses=2, returnMagDiffs=False)
+        self.assertEqual(widths['magDiff'].shape, (5, 0))
+        self.assertEqual(widths['repeatability'], expected['repeatability'])
+
+        config = PA1Task.ConfigClass()
+        config.numProcesses = 2
+        with self.assertRaises(ValueError):
+            config.validate()
+
     def test_pa2(self):
         """Test calculation of pa2 on a known catalog."""
         config = PA2Task.ConfigClass()
@@ -96,6 +196,48 @@ class Pa1Test(unittest.TestCase):
             result = task.run(catalog, 'PF1')
             self.assertEqual(result.measurement, expected)
 
+    def test_pa2_pf1_streaming(self):
+        """Test pa2 and pf1 computed from a histogram of the differences."""
+        config = PA2Task.ConfigClass()
+        config.doStreaming = True
+        pa2Task = PA2Task(config=config)
+        pf1Task = PF1Task(config=config)
+        for band in ('i', 'r'):
+            catalog, expected = self.load_data(('PA2', band))
+            result = pa2Task.run(catalog, 'PA2')
+            self.assertAlmostEqual(result.measurement.quantity.value, expected.quantity.value,
+                                   delta=config.streamingBinWidth)
+            catalog, expected = self.load_data(('PF1', band))
+            result = pf1Task.run(catalog, 'PF1')
+            self.assertAlmostEqual(result.measurement.quantity.value, expected.quantity.value,
+                                   places=10)
+
+    def test_pa2_sketch(self):
+        """Test the sketch of the absolute differences attached to pa2."""
+        config = PA2Task.ConfigClass()
+        config.doSketch = True
+        catalog, expected = self.load_data(('PA2', 'i'))
+        for doStreaming in (False, True):
+            config.doStreaming = doStreaming
+            result = PA2Task(config=config).run(catalog, 'PA2')
+            digest = tdigestFromExtras(result.measurement.extras, u.mmag)
+            self.assertAlmostEqual(tdigestQuantile(digest, 1 - config.threshPF1/100), expected.quantity.value,
+                                   delta=0.05*expected.quantity.value)
+
+    def test_abs_diff_histogram(self):
+        """Histogram percentiles are within a bin width of the exact ones."""
+        rng = np.random.default_rng(3)
+        values = rng.standard_t(3, size=10000)*10
+        histogram = AbsDiffHistogram(0.1, 50., threshold=15.)
+        for chunk in np.array_split(values, 7):
+            part = AbsDiffHistogram(0.1, 50., threshold=15.)
+            part.add(chunk)
+            histogram.merge(part)
+        self.assertEqual(histogram.count, len(values))
+        self.assertEqual(histogram.numAbove, np.count_nonzero(np.abs(values) > 15.))
+        for q in (5, 50, 90, 99.9):
+            self.assertAlmostEqual(histogram.percentile(q), np.percentile(np.abs(values), q), delta=0.1)
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,94 @@
+# This file is part of <REPLACE WHEN RENAMED>.
+#
+# Developed for the LSST Data Management System.
+# This product includes software developed by the LSST Project
+# (http://www.lsst.org).
+# See the COPYRIGHT file at the top-level directory of this distribution
+# for details of code ownership.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Unit tests for the metrics measurement system.
+"""
+
+import unittest
+import numpy as np
+import astropy.units as u
+
+from lsst.faro.measurement import TDigestAggTask, TDigestAggTaskConfig
+from lsst.faro.utils.quantile_sketch import (makeTDigest, mergeTDigests, tdigestQuantile,
+                                             tdigestToExtras)
+
+
+class MockMeas:
+    def __init__(self, quantity, extras=None):
+        self.quantity = quantity
+        self.extras = extras if extras is not None else {}
+
+
+class QuantileSketchTest(unittest.TestCase):
+
+    def setUp(self):
+        rng = np.random.default_rng(12345)
+        self.chunks = [rng.lognormal(0., 1., size) for size in rng.integers(10, 5000, 50)]
+        self.values = np.concatenate(self.chunks)
+        self.quantiles = np.array([0.01, 0.1, 0.25, 0.5, 0.75, 0.9, 0.99])
+
+    def checkRankError(self, digest, tol):
+        estimates = tdigestQuantile(digest, self.quantiles)
+        ranks = np.array([np.mean(self.values < estimate) for estimate in estimates])
+        np.testing.assert_allclose(ranks, self.quantiles, atol=tol)
+
+    def test_tdigest(self):
+        """Test quantiles of a single t-digest."""
+        digest = makeTDigest(self.values)
+        self.assertLessEqual(len(digest.means), 100)
+        self.assertEqual(np.sum(digest.weights), len(self.values))
+        self.assertEqual(tdigestQuantile(digest, 0.), self.values.min())
+        self.assertEqual(tdigestQuantile(digest, 1.), self.values.max())
+        self.checkRankError(digest, 5e-3)
+
+    def test_merge(self):
+        """Test that hierarchically merged t-digests match the full data."""
+        digests = [makeTDigest(chunk) for chunk in self.chunks]
+        merged = mergeTDigests([mergeTDigests(digests[:20]), mergeTDigests(digests[20:])])
+        self.assertEqual(np.sum(merged.weights), len(self.values))
+        self.checkRankError(merged, 5e-3)
+
+    def test_empty(self):
+        """Test that empty and non-finite inputs give a NaN quantile."""
+        digest = makeTDigest([np.nan])
+        self.assertTrue(np.isnan(tdigestQuantile(digest, 0.5)))
+        merged = mergeTDigests([digest, makeTDigest([3.])])
+        self.assertEqual(tdigestQuantile(merged, 0.5), 3.)
+
+    def test_tdigest_agg(self):
+        """Test the aggregator that merges sketches from measurements."""
+        task = TDigestAggTask(config=TDigestAggTaskConfig())
+        measurements = []
+        for chunk in self.chunks:
+            extras = tdigestToExtras(makeTDigest(chunk*1000.), u.marcsec)
+            measurements.append(MockMeas(np.median(chunk)*u.arcsec, extras))
+        # A measurement without a sketch counts as a single value.
+        measurements.append(MockMeas(1.*u.arcsec))
+        with self.assertLogs(level='WARNING'):
+            result = task.run(measurements, 'summary', 'info', 'mock')
+        self.assertEqual(result.measurement.quantity.unit, u.arcsec)
+        self.assertAlmostEqual(result.measurement.quantity.value, np.median(self.values), delta=0.02)
+        self.assertEqual(np.sum(result.measurement.extras['sketch_weights'].quantity.value),
+                         len(self.values) + 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
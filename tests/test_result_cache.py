@@ -0,0 +1,163 @@
+# This file is part of <REPLACE WHEN RENAMED>.
+#
+# Developed for the LSST Data Management System.
+# This product includes software developed by the LSST Project
+# (http://www.lsst.org).
+# See the COPYRIGHT file at the top-level directory of this distribution
+# for details of code ownership.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Unit tests for the measurement result cache.
+"""
+
+import unittest
+import os
+import tempfile
+
+import astropy.units as u
+from lsst.pipe.base import Struct
+from lsst.verify import Measurement, Datum
+
+from lsst.faro.base import CatalogAnalysisBaseTask
+from lsst.faro.measurement import PA1TaskConfig
+from lsst.faro.utils.result_cache import (codeVersion, configDigest, datasetDigest, fileDigest,
+                                          makeResultCacheKey, readCachedResult, writeCachedResult)
+
+
+class MockURI:
+    def __init__(self, path):
+        self.ospath = path
+        self.isLocal = True
+
+
+class MockRef:
+    def __init__(self, id, dataId=None):
+        self.id = id
+        self.dataId = dataId
+
+
+class MockButler:
+    """Butler storing each dataset in the file named by its dataset ID."""
+
+    def __init__(self, directory):
+        self.directory = directory
+
+    def getURI(self, ref):
+        return MockURI(os.path.join(self.directory, ref.id))
+
+
+class MockHandle:
+    """Deferred handle counting the reads of its dataset."""
+
+    def __init__(self, butler, ref, dataset):
+        self.butler = butler
+        self.ref = ref
+        self.dataset = dataset
+        self.reads = 0
+
+    def get(self):
+        self.reads += 1
+        return self.dataset
+
+
+class MockButlerQC:
+    def __init__(self, inputs):
+        self.inputs = inputs
+        self.written = []
+
+    def get(self, inputRefs):
+        return dict(self.inputs)
+
+    def put(self, outputs, outputRefs):
+        self.written.append(outputs.measurement)
+
+
+class ResultCacheTest(unittest.TestCase):
+    """Test the content-addressed measurement cache."""
+
+    def test_keys(self):
+        self.assertNotEqual(makeResultCacheKey('ab', 'c'), makeResultCacheKey('a', 'bc'))
+        self.assertEqual(makeResultCacheKey('a', 'b'), makeResultCacheKey('a', 'b'))
+        self.assertEqual(codeVersion(), codeVersion())
+
+        config = PA1TaskConfig()
+        digest = configDigest(config)
+        self.assertEqual(configDigest(PA1TaskConfig()), digest)
+        config.randomSeed += 1
+        self.assertNotEqual(configDigest(config), digest)
+
+    def test_round_trip(self):
+        measurement = Measurement('PA1', 5.0*u.mmag,
+                                  extras={'count': Datum(10*u.count, label='count', description='count')})
+        with tempfile.TemporaryDirectory() as cacheDir:
+            key = makeResultCacheKey('input', 'config')
+            self.assertIsNone(readCachedResult(cacheDir, key))
+            writeCachedResult(cacheDir, key, measurement)
+            cached = readCachedResult(cacheDir, key)
+            self.assertEqual(cached.quantity, measurement.quantity)
+            self.assertEqual(cached.extras['count'].quantity, 10*u.count)
+            # No temporary files are left behind.
+            self.assertEqual([os.path.splitext(f)[1] for f in os.listdir(os.path.join(cacheDir, key[:2]))],
+                             ['.pickle'])
+
+    def test_fileDigest(self):
+        with tempfile.TemporaryDirectory() as tmpDir:
+            first = os.path.join(tmpDir, 'first.fits')
+            second = os.path.join(tmpDir, 'second.fits')
+            for filename in (first, second):
+                with open(filename, 'wb') as f:
+                    f.write(b'\0'*(3*2**20 + 5))
+            self.assertEqual(fileDigest(first), fileDigest(second))
+            with open(second, 'ab') as f:
+                f.write(b'\1')
+            self.assertNotEqual(fileDigest(first), fileDigest(second))
+
+    def test_datasetDigest(self):
+        """Byte-identical inputs with different dataset IDs share a digest."""
+        with tempfile.TemporaryDirectory() as tmpDir:
+            for id, contents in (('a', b'catalog'), ('b', b'catalog'), ('c', b'other')):
+                with open(os.path.join(tmpDir, id), 'wb') as f:
+                    f.write(contents)
+            butler = MockButler(tmpDir)
+            self.assertEqual(datasetDigest(MockRef('a'), butler), datasetDigest(MockRef('b'), butler))
+            self.assertNotEqual(datasetDigest(MockRef('a'), butler), datasetDigest(MockRef('c'), butler))
+            self.assertEqual(datasetDigest(MockRef('a')), 'id:a')
+
+    def test_runQuantum_cache_hit(self):
+        """A re-run on identical inputs with new dataset IDs writes the cached
+        measurement without reading the catalog."""
+        with tempfile.TemporaryDirectory() as tmpDir:
+            config = CatalogAnalysisBaseTask.ConfigClass()
+            config.connections.package = 'info'
+            config.connections.metric = 'nsrcMeas'
+            config.resultCacheDir = os.path.join(tmpDir, 'cache')
+            task = CatalogAnalysisBaseTask(config=config)
+            butler = MockButler(tmpDir)
+            outputRefs = Struct(measurement=MockRef('out', dataId={'tract': 0}))
+            handles = []
+            for id in ('first', 'second'):
+                with open(os.path.join(tmpDir, id), 'wb') as f:
+                    f.write(b'catalog')
+                handle = MockHandle(butler, MockRef(id), [1, 2, 3])
+                butlerQC = MockButlerQC({'cat': handle})
+                task.runQuantum(butlerQC, Struct(cat=handle.ref), outputRefs)
+                self.assertEqual(butlerQC.written[0].quantity, 3*u.count)
+                handles.append(handle)
+            self.assertEqual(handles[0].reads, 1)
+            self.assertEqual(handles[1].reads, 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,68 @@
+# This file is part of <REPLACE WHEN RENAMED>.
+#
+# Developed for the LSST Data Management System.
+# This product includes software developed by the LSST Project
+# (http://www.lsst.org).
+# See the COPYRIGHT file at the top-level directory of this distribution
+# for details of code ownership.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Unit tests for the metrics measurement system.
+"""
+
+import unittest
+import numpy as np
+
+from lsst.faro.utils.filtermatches import filterMatches, filterMatchesColumns
+from lsst.faro.utils.phot_repeat import calcPhotRepeat
+from lsst.faro.utils.synthetic import makeSyntheticMatchedCatalog
+
+
+class SyntheticMatchedCatalogTest(unittest.TestCase):
+    """Test the synthetic matched-catalog generator."""
+
+    def test_schema_and_size(self):
+        catalog = makeSyntheticMatchedCatalog(200, visitsPerObject=(3, 6), nVisits=10, randomSeed=1)
+        for column in filterMatchesColumns:
+            catalog.schema.find(column)
+        self.assertTrue(catalog.isContiguous())
+        nObs = np.bincount(catalog['object'])[1:]
+        self.assertEqual(len(nObs), 200)
+        self.assertTrue(np.all((nObs >= 3) & (nObs <= 6)))
+        self.assertEqual(len(catalog), np.sum(nObs))
+        # Objects are sorted and no object is observed twice in a visit.
+        self.assertTrue(np.all(np.diff(catalog['object']) >= 0))
+        pairs = catalog['object'].astype(np.int64)*100 + catalog['visit']
+        self.assertEqual(len(np.unique(pairs)), len(catalog))
+
+    def test_seed(self):
+        first = makeSyntheticMatchedCatalog(100, randomSeed=12345)
+        second = makeSyntheticMatchedCatalog(100, randomSeed=12345)
+        np.testing.assert_array_equal(first['slot_PsfFlux_mag'], second['slot_PsfFlux_mag'])
+        np.testing.assert_array_equal(first['coord_ra'], second['coord_ra'])
+
+    def test_photometric_noise(self):
+        """The repeatability of bright stars recovers the photometric floor."""
+        catalog = makeSyntheticMatchedCatalog(2000, visitsPerObject=5, m5=40., photomFloor=0.005,
+                                              flagRate=0., primaryFraction=1., randomSeed=2)
+        filtered = filterMatches(catalog)
+        self.assertGreater(filtered.count, 500)
+        magKey = filtered.schema.find('slot_PsfFlux_mag').key
+        result = calcPhotRepeat(filtered, magKey, numRandomShuffles=5, randomSeed=3)
+        self.assertAlmostEqual(result['repeatability'].value, 5.0, delta=0.5)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -24,9 +24,10 @@
 
 import unittest
 
+from lsst.faro.base import CatalogAggregationBaseTaskConfig
 from lsst.faro.measurement import (AMxTask, ADxTask, AFxTask,
                                    PA1Task, PA2Task, PF1Task,
-                                   TExTask, AB1Task, WPerpTask)
+                                   TExTask, AB1Task, WPerpTask, HistMedianTask)
 
 
 class ConfigTest(unittest.TestCase):
@@ -164,6 +165,25 @@ class ConfigTest(unittest.TestCase):
         task = WPerpTask(config=expected)
         self.check_config(task, expected, default, field_list)
 
+    def test_incremental_aggregation_config(self):
+        """Incremental aggregation requires a summary the state supports."""
+        config = CatalogAggregationBaseTaskConfig()
+        config.connections.agg_name = 'summary'
+        config.doIncremental = True
+        config.stateDir = 'state'
+        config.validate()
+        config.agg.summary = 'nanmedian'
+        with self.assertRaises(ValueError):
+            config.validate()
+        config.agg.summary = 'median'
+        config.agg.extraStats = ['p90']
+        with self.assertRaises(ValueError):
+            config.validate()
+        config.agg.extraStats = []
+        config.agg.retarget(HistMedianTask)
+        with self.assertRaises(ValueError):
+            config.validate()
+
 
 if __name__ == "__main__":
     unittest.main()